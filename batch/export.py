@@ -0,0 +1,229 @@
+"""
+Headless export of activities and monthly totals for many athletes
+
+Athletes come from a JSON file of stored refresh tokens, either a list or one
+object per line, each with 'athlete_id' and 'refresh_token'. Each athlete's
+token is refreshed and new activities are synced into the activity store on a
+bounded thread pool, sharing the Strava client's rate limiter. As each sync
+finishes, formatting and aggregation for that athlete runs on a process pool
+and writes its own Parquet partitions, so processing scales with cores and
+overlaps the remaining fetches:
+
+    <output>/activities/athlete_id=<id>/part-0.parquet   formatted activities
+    <output>/monthly/athlete_id=<id>/part-0.parquet      totals per sport type and month
+    <output>/athletes.parquet                            one row per athlete
+
+Strava rotates refresh tokens, so the tokens file is rewritten with the new
+ones. Set STRAVA_BASE_URL to run against a local fake API, e.g. one started
+with python -m benchmarks.fake_strava
+
+Usage:
+    python -m batch.export --tokens tokens.json [--output export]
+        [--client-id ID] [--client-secret SECRET] [--fetch-workers 4] [--workers N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from utils import auth
+from utils import activity_store
+from utils.strava_client import SYNC_WORKERS
+from utils import data_utils as dutil
+from utils.aggregates import ActivityCube
+
+def load_tokens(path):
+    """
+    Parameters:
+        path: String, JSON list or JSON lines of {'athlete_id', 'refresh_token'}
+
+    Returns:
+        athletes: List of Dict
+    """
+    with open(path) as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def save_tokens(path, athletes):
+    """
+    Rewrites the tokens file atomically, as a JSON list
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(athletes, f, indent=2)
+    os.replace(tmp_path, path)
+
+def sync_athlete(athlete, client_id, client_secret):
+    """
+    Refreshes an athlete's token and syncs new activities into the activity
+    store. Runs on the fetch threads
+
+    Returns:
+        result: Dict with 'athlete_id', 'refresh_token', 'fetch_s' and 'error'
+    """
+    athlete_id = athlete["athlete_id"]
+    result = {"athlete_id": athlete_id, "refresh_token": athlete["refresh_token"], "error": None}
+    start = time.perf_counter()
+    try:
+        token = auth.refresh_access_token(client_id, client_secret, athlete["refresh_token"])
+        if 'access_token' not in token:
+            raise ValueError(f"token refresh failed: {token}")
+        result["refresh_token"] = token.get("refresh_token", athlete["refresh_token"])
+        dutil.get_activity_data(token["access_token"], athlete_id)
+    except Exception as e:
+        print(f"\nError syncing athlete {athlete_id}: {e}")
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["fetch_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+def monthly_totals(cube):
+    """
+    Totals per sport type and calendar month, answered from an ActivityCube
+
+    Parameters:
+        cube: ActivityCube
+
+    Returns:
+        monthly: DataFrame
+    """
+    if not cube.sport_types:
+        return pd.DataFrame()
+    first = cube.first_day.astype("datetime64[M]")
+    last = (cube.first_day + cube.n_days - 1).astype("datetime64[M]")
+    months = np.arange(first, last + 1)
+
+    rows = []
+    for sport_type in cube.sport_types:
+        for month in months:
+            start_date = month.astype("datetime64[D]")
+            end_date = (month + 1).astype("datetime64[D]") - 1
+            totals = cube.query([sport_type], start_date, end_date)
+            if totals["count"]:
+                rows.append({
+                    "Sport Type": sport_type,
+                    "Month": pd.Timestamp(start_date),
+                    "Activities": totals["count"],
+                    "Moving Time (s)": totals["moving_time"],
+                    "Distance (km)": totals["distance"],
+                    "Elevation Gain (m)": totals["elevation"],
+                    "Average Speed (km/h)": totals["average_speed_mean"],
+                    "Max Speed (km/h)": totals["max_speed"],
+                })
+    return pd.DataFrame(rows)
+
+def _write_partition(df, output_dir, dataset, athlete_id):
+    directory = os.path.join(output_dir, dataset, f"athlete_id={athlete_id}")
+    os.makedirs(directory, exist_ok=True)
+    df.to_parquet(os.path.join(directory, "part-0.parquet"), index=False)
+
+def process_athlete(athlete_id, output_dir):
+    """
+    Formats and aggregates an athlete's stored activities and writes their
+    partitions. Runs on the process pool; the raw activities are read from the
+    activity store rather than sent between processes
+
+    Returns:
+        summary: Dict
+    """
+    start = time.perf_counter()
+    raw_df = pd.DataFrame(activity_store.load_activities(athlete_id))
+    summary = {"athlete_id": athlete_id, "activities": len(raw_df), "data_version": dutil.get_data_version(raw_df)}
+    if raw_df.empty:
+        summary["process_s"] = round(time.perf_counter() - start, 3)
+        return summary
+
+    df = dutil.format_data(raw_df)
+    cube = ActivityCube(df)
+    totals = cube.query()
+    _write_partition(df, output_dir, "activities", athlete_id)
+    _write_partition(monthly_totals(cube), output_dir, "monthly", athlete_id)
+
+    summary.update({
+        "first_date": df['Start Date'].min(),
+        "last_date": df['Start Date'].max(),
+        "moving_time_s": totals["moving_time"],
+        "distance_km": totals["distance"],
+        "elevation_m": totals["elevation"],
+        "process_s": round(time.perf_counter() - start, 3),
+    })
+    return summary
+
+def run(athletes, client_id, client_secret, output_dir, fetch_workers=SYNC_WORKERS, workers=None):
+    """
+    Syncs every athlete and processes each one as soon as its sync finishes
+
+    Parameters:
+        athletes: List of Dict from load_tokens
+        client_id: String
+        client_secret: String
+        output_dir: String
+        fetch_workers: int, concurrent Strava syncs
+        workers: int, processes, defaults to the number of cores
+
+    Returns:
+        results: List of Dict, one per athlete in input order
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    results = {}
+
+    # Spawned, so workers don't inherit the fetch threads or open connections
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="batch-fetch") as fetcher, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as processor:
+        syncs = [fetcher.submit(sync_athlete, athlete, client_id, client_secret) for athlete in athletes]
+        processing = {}
+        for future in concurrent.futures.as_completed(syncs):
+            result = future.result()
+            results[result["athlete_id"]] = result
+            if result["error"] is None:
+                processing[processor.submit(process_athlete, result["athlete_id"], output_dir)] = result["athlete_id"]
+
+        for future in concurrent.futures.as_completed(processing):
+            athlete_id = processing[future]
+            try:
+                results[athlete_id].update(future.result())
+            except Exception as e:
+                print(f"\nError processing athlete {athlete_id}: {e}")
+                results[athlete_id]["error"] = f"{type(e).__name__}: {e}"
+            else:
+                print(f"\nExported athlete {athlete_id} ({results[athlete_id]['activities']} activities)")
+
+    return [results[athlete["athlete_id"]] for athlete in athletes]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", required=True, help="JSON file of athlete ids and refresh tokens")
+    parser.add_argument("--output", default="export")
+    parser.add_argument("--client-id", default=os.environ.get("STRAVA_CLIENT_ID"))
+    parser.add_argument("--client-secret", default=os.environ.get("STRAVA_CLIENT_SECRET"))
+    parser.add_argument("--fetch-workers", type=int, default=SYNC_WORKERS, help="athletes synced with Strava at once")
+    parser.add_argument("--workers", type=int, help="processes formatting and aggregating, defaults to the number of cores")
+    args = parser.parse_args(argv)
+    if not args.client_id or not args.client_secret:
+        parser.error("--client-id and --client-secret (or STRAVA_CLIENT_ID and STRAVA_CLIENT_SECRET) are required")
+
+    athletes = load_tokens(args.tokens)
+    start = time.perf_counter()
+    results = run(athletes, args.client_id, args.client_secret, args.output, args.fetch_workers, args.workers)
+
+    # Keep the rotated refresh tokens for the next run
+    tokens = {r["athlete_id"]: r["refresh_token"] for r in results}
+    save_tokens(args.tokens, [dict(athlete, refresh_token=tokens[athlete["athlete_id"]]) for athlete in athletes])
+
+    summary = pd.DataFrame(results).drop(columns=["refresh_token"])
+    summary.to_parquet(os.path.join(args.output, "athletes.parquet"), index=False)
+    failed = int(summary["error"].notna().sum())
+    print(f"\nExported {len(results) - failed} of {len(results)} athletes to {args.output} in {time.perf_counter() - start:.1f} s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Benchmark of batch polyline decoding against the original per-row implementation
+
+Usage:
+    python -m benchmarks.bench_polylines [n_activities] [points_per_route]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+import polyline
+from utils import data_utils as dutil
+from utils.route_utils import RouteCache
+
+def legacy_get_polylines(df):
+    """
+    get_polylines as it was before batch decoding, kept as the baseline
+    """
+    rows = []
+    for index, row in df.iterrows():
+        map_data = pd.DataFrame([row['map']])
+        polylines = map_data["summary_polyline"].values
+        if pd.isna(polylines[0]) or polylines[0] == '':
+            continue
+        coordinates = polyline.decode(polylines[0])
+        activity_name = row["name"]
+        distance = round(row["distance"] / 1000, 1)
+        elevation = round(row["total_elevation_gain"])
+        description = f"{activity_name}\n{distance} km\n{elevation} m"
+        path = [[coord[1], coord[0]] for coord in coordinates]
+        rows.append({
+            "name": map_data["id"].values[0],
+            "description": description,
+            "path": path
+        })
+    polylines_df = pd.DataFrame(rows)
+    return polylines_df if not polylines_df.empty else None
+
+def make_activities(n_activities, points_per_route, seed=0):
+    """
+    Synthetic raw activity frame with random-walk routes
+    """
+    rng = np.random.default_rng(seed)
+    activities = []
+    for i in range(n_activities):
+        start = rng.uniform([-60, -150], [60, 150])
+        route = start + np.cumsum(rng.normal(0, 0.0005, size=(points_per_route, 2)), axis=0)
+        activities.append({
+            "id": i,
+            "name": f"Activity {i}",
+            "distance": float(rng.uniform(1000, 100000)),
+            "total_elevation_gain": float(rng.uniform(0, 2000)),
+            "map": {"id": f"a{i}", "summary_polyline": polyline.encode([tuple(p) for p in route]) if i % 10 else ""},
+        })
+    return pd.DataFrame(activities)
+
+def best_of(fn, df, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+if __name__ == "__main__":
+    n_activities = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    points_per_route = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    df = make_activities(n_activities, points_per_route)
+
+    legacy_time, legacy = best_of(legacy_get_polylines, df)
+    batch = lambda df: dutil.get_polylines(dutil.get_route_info(df), df['id'], RouteCache())
+    batch_time, batch = best_of(batch, df)
+
+    assert legacy['name'].tolist() == ("a" + batch['name'].astype(str)).tolist()
+    assert legacy['description'].tolist() == batch['description'].tolist()
+    for old, new in zip(legacy['path'], batch['path']):
+        assert np.allclose(old, new)
+
+    print(f"{n_activities} activities x {points_per_route} points")
+    print(f"legacy get_polylines: {legacy_time * 1000:.1f} ms")
+    print(f"batch get_polylines:  {batch_time * 1000:.1f} ms ({legacy_time / batch_time:.1f}x)")
@@ -0,0 +1,241 @@
+"""
+Benchmarks of the data pipeline hot paths against a local fake Strava API
+
+Each athlete size runs in a fresh process, against its own fake server, store
+and cache directories, so peak RSS and request counts belong to that size
+alone. Every stage reports wall time, the process's peak RSS so far, and the
+requests the fake server handled during it. Results are written as JSON;
+pass a previous run as --baseline to flag stages that got slower
+
+Usage:
+    python -m benchmarks.bench_suite [--sizes 100 1000 5000 20000] [--latency 0.05]
+        [--max-per-page 200] [--throttle-rate 0.0] [--output bench_results.json]
+        [--baseline previous.json] [--threshold 0.2]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import contextlib
+import multiprocessing
+import concurrent.futures
+from benchmarks.fake_strava import FakeStrava
+from benchmarks.synthetic import make_athlete
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, or None where unsupported
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class Recorder:
+    """
+    Times named stages and attributes fake server requests to them
+    """
+    def __init__(self, server):
+        self.server = server
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        gc.collect()
+        before = self.server.snapshot()
+        start = time.perf_counter()
+        yield
+        wall = time.perf_counter() - start
+        after = self.server.snapshot()
+        self.stages[name] = {
+            "wall_s": round(wall, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "requests": after["requests"] - before["requests"],
+            "throttled": after["throttled"] - before["throttled"],
+        }
+        print(f"\t{name:<32} {wall * 1000:>10.1f} ms  {self.stages[name]['requests']:>4} requests")
+
+def run_athlete(n_activities, latency=0.0, max_per_page=200, throttle_rate=0.0, seed=0):
+    """
+    Runs every stage for one synthetic athlete. Meant to run in its own process:
+    the app modules read their environment at import time
+
+    Returns:
+        result: Dict
+    """
+    start = time.perf_counter()
+    activities = make_athlete(n_activities, seed=seed)
+    generate_s = time.perf_counter() - start
+    workdir = tempfile.mkdtemp(prefix="activedata-bench-")
+
+    with FakeStrava(activities, latency=latency, max_per_page=max_per_page, throttle_rate=throttle_rate, seed=seed) as server:
+        os.environ["STRAVA_BASE_URL"] = server.url
+        os.environ["ACTIVEDATA_STORE_PATH"] = os.path.join(workdir, "activities.db")
+        os.environ["ACTIVEDATA_CACHE_DIR"] = os.path.join(workdir, "cache")
+        os.environ["ACTIVEDATA_STREAMS_DIR"] = os.path.join(workdir, "streams")
+
+        from utils import auth
+        from utils import data_utils as dutil
+        from utils import plot_utils as putil
+        from utils.route_utils import RouteCache
+        from utils.activity_index import ActivityIndex
+        from utils.aggregates import ActivityCube, calendar_grid
+
+        print(f"\n{n_activities} activities (generated in {generate_s:.1f} s)")
+        recorder = Recorder(server)
+        athlete_id = 1
+
+        with recorder.stage("request_access_token"):
+            token = auth.request_access_token("bench-client", "bench-secret", "bench-code")
+        access_token = token["access_token"]
+
+        with recorder.stage("get_athlete"):
+            dutil.get_athlete(access_token)
+
+        with recorder.stage("get_activity_data"):
+            raw_df = dutil.get_activity_data(access_token, athlete_id)
+
+        with recorder.stage("get_activity_data_incremental"):
+            dutil.get_activity_data(access_token, athlete_id)
+
+        with recorder.stage("format_data"):
+            df = dutil.format_data(raw_df)
+
+        with recorder.stage("get_route_info"):
+            route_info = dutil.get_route_info(raw_df)
+
+        route_cache = RouteCache()
+        with recorder.stage("get_polylines"):
+            dutil.get_polylines(route_info, df['Activity ID'], route_cache)
+
+        with recorder.stage("get_polylines_cached_zoomed_out"):
+            dutil.get_polylines(route_info, df['Activity ID'], route_cache, zoom=3)
+
+        with recorder.stage("get_density_map"):
+            dutil.get_density_map(route_info, df['Activity ID'], route_cache, {})
+
+        with recorder.stage("activity_index"):
+            activity_index = ActivityIndex(df)
+            sport_types = activity_index.sport_types
+            start_date = activity_index.first_date()
+            for sport_type in sport_types:
+                activity_index.filter([sport_type], start_date, None)
+
+        with recorder.stage("activity_cube"):
+            activity_cube = ActivityCube(df)
+
+        with recorder.stage("activity_cube_queries"):
+            for sport_type in sport_types:
+                activity_cube.query([sport_type], start_date, None)
+            totals = activity_cube.query(None, start_date, None)
+
+        with recorder.stage("calendar_grid"):
+            days, distances = activity_cube.daily("distance")
+            year = int(str(days.max())[:4]) if len(days) else datetime.date.today().year
+            grid = calendar_grid(days, distances, year)
+
+        bins = max(totals["count"] // 3, 1)
+        with recorder.stage("render_histograms"):
+            for column_name in ["Distance (km)", "Elevation Gain (m)", "Average Speed (km/h)"]:
+                putil.render_histogram(putil.histogram_values(df, column_name), column_name, bins)
+
+        with recorder.stage("render_calendar_heatmap"):
+            putil.render_calendar_heatmap(grid)
+
+        total_requests = server.snapshot()
+
+    return {
+        "activities": n_activities,
+        "activities_fetched": int(len(raw_df)),
+        "routes": int(len(route_info)),
+        "generate_s": round(generate_s, 3),
+        "total_requests": total_requests,
+        "stages": recorder.stages,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    """
+    Prints each stage's wall time against a previous run and flags regressions
+
+    Returns:
+        regressions: int
+    """
+    previous = {athlete["activities"]: athlete["stages"] for athlete in baseline["athletes"]}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} (threshold {threshold:.0%}):")
+    regressions = 0
+    for athlete in results["athletes"]:
+        old_stages = previous.get(athlete["activities"])
+        if old_stages is None:
+            continue
+        for name, stage in athlete["stages"].items():
+            if name not in old_stages:
+                continue
+            old, new = old_stages[name]["wall_s"], stage["wall_s"]
+            # Stages under 10 ms are mostly noise
+            slower = old > 0.01 and new > old * (1 + threshold)
+            regressions += slower
+            ratio = f"{new / old:.2f}x" if old else "-"
+            flag = "  REGRESSION" if slower else ""
+            print(f"\t{athlete['activities']:>6} {name:<32} {old * 1000:>10.1f} -> {new * 1000:>10.1f} ms  {ratio}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 20000])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every fake API response")
+    parser.add_argument("--max-per-page", type=int, default=200)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of activity requests answered with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    athletes = []
+    for n_activities in args.sizes:
+        # A fresh process per size keeps peak RSS and imports independent
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            athletes.append(executor.submit(
+                run_athlete, n_activities, args.latency, args.max_per_page, args.throttle_rate, args.seed,
+            ).result())
+
+    results = {
+        "commit": git_commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "athletes": athletes,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Local stand-in for the parts of the Strava API the app uses, for benchmarks
+
+Serves /api/v3/athlete, /api/v3/athlete/activities, /api/v3/activities/{id}/streams
+and /oauth/token from an in-memory list of activities, with configurable
+latency, page size cap and 429 injection, and counts every request it handles.
+Streams are synthesized per activity; manual activities and unknown ids get a 404
+
+Run on its own to serve synthetic activities, e.g. for the batch export:
+    python -m benchmarks.fake_strava [--activities 1000] [--port 8000]
+"""
+import json
+import time
+import calendar
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from benchmarks.synthetic import make_athlete, make_streams
+
+class FakeStrava:
+    """
+    Parameters:
+        activities: List of Dict, sorted by start_date_local descending like Strava
+        athlete: Dict
+        latency: float, seconds added to every response
+        max_per_page: int, Strava caps per_page at 200
+        throttle_rate: float, fraction of activity and stream requests answered with a 429
+        throttle_next: int, activity and stream requests answered with a 429 before
+            throttle_rate applies
+        rate_limit: (short, daily) quota reported in X-RateLimit headers, or None
+        seed: int, for the 429 injection
+        port: int, 0 for any free port
+    """
+    def __init__(self, activities, athlete=None, latency=0.0, max_per_page=200, throttle_rate=0.0,
+                 throttle_next=0, rate_limit=(600, 30000), seed=0, port=0):
+        self.activities = activities
+        self.athlete = athlete or {"id": 1, "firstname": "Bench", "lastname": "Mark", "profile": "avatar/athlete/large.png"}
+        self.latency = latency
+        self.max_per_page = max_per_page
+        self.throttle_rate = throttle_rate
+        self.throttle_next = throttle_next
+        self.rate_limit = rate_limit
+        self.port = port
+        self.stats = {"requests": 0, "throttled": 0, "streams": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        # Strava applies 'after' to UTC start times
+        self._start_epochs = [_epoch(a["start_date"]) for a in activities]
+        self._by_id = {a["id"]: a for a in activities}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle(self, "GET")
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake._handle(self, "POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _handle(self, handler, method):
+        with self._lock:
+            self.stats["requests"] += 1
+            usage = self.stats["requests"]
+            throttle = self.throttle_rate > 0 and self._random.random() < self.throttle_rate
+            if self.throttle_next > 0 and (handler.path.startswith("/api/v3/athlete/activities") or "/streams" in handler.path):
+                self.throttle_next -= 1
+                throttle = True
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        if method == "POST" and url.path == "/oauth/token":
+            status, body = 200, {
+                "token_type": "Bearer",
+                "access_token": "bench-access-token",
+                "refresh_token": "bench-refresh-token",
+                "expires_at": int(time.time()) + 6 * 60 * 60,
+                "athlete": self.athlete,
+            }
+        elif method == "GET" and url.path == "/api/v3/athlete":
+            status, body = 200, self.athlete
+        elif method == "GET" and url.path == "/api/v3/athlete/activities":
+            if throttle:
+                status, body = self._throttled()
+            else:
+                status, body = 200, self._page(query)
+        elif method == "GET" and url.path.startswith("/api/v3/activities/") and url.path.endswith("/streams"):
+            with self._lock:
+                self.stats["streams"] += 1
+            activity = self._by_id.get(_path_id(url.path))
+            if throttle:
+                status, body = self._throttled()
+            elif activity is None or activity.get("manual"):
+                status, body = 404, {"message": "Record Not Found"}
+            else:
+                keys = query["keys"][0].split(",") if "keys" in query else None
+                status, body = 200, make_streams(activity, keys)
+        else:
+            status, body = 404, {"message": "Record Not Found"}
+
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        if status == 429:
+            handler.send_header("Retry-After", "0")
+        if self.rate_limit is not None:
+            handler.send_header("X-RateLimit-Limit", f"{self.rate_limit[0]},{self.rate_limit[1]}")
+            handler.send_header("X-RateLimit-Usage", f"{min(usage, self.rate_limit[0])},{usage}")
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _throttled(self):
+        with self._lock:
+            self.stats["throttled"] += 1
+        return 429, {"message": "Rate Limit Exceeded"}
+
+    def _page(self, query):
+        page = int(query.get("page", ["1"])[0])
+        per_page = min(int(query.get("per_page", ["30"])[0]), self.max_per_page)
+        activities = self.activities
+        if "after" in query:
+            # Strava returns activities after an epoch oldest first
+            after = int(query["after"][0])
+            activities = [a for a, epoch in zip(self.activities, self._start_epochs) if epoch > after][::-1]
+        return activities[(page - 1) * per_page:page * per_page]
+
+def _path_id(path):
+    try:
+        return int(path.split("/")[4])
+    except ValueError:
+        return None
+
+def _epoch(timestamp):
+    return calendar.timegm(time.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves synthetic activities until interrupted")
+    parser.add_argument("--activities", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    fake = FakeStrava(make_athlete(args.activities, seed=args.seed), latency=args.latency, seed=args.seed, port=args.port)
+    with fake:
+        print(f"\nServing {args.activities} activities on {fake.url}; set STRAVA_BASE_URL to use it")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Synthetic Strava athletes for benchmarks: summary activities shaped like the
+/athlete/activities response, with routes encoded as real polylines
+"""
+import time
+import numpy as np
+
+# (sport_type, share, has_route, speed range m/s, distance range km)
+SPORTS = [
+    ("Ride", 0.40, True, (6.0, 10.0), (15, 120)),
+    ("Run", 0.30, True, (2.5, 4.5), (3, 25)),
+    ("Hike", 0.08, True, (1.0, 1.6), (4, 25)),
+    ("AlpineSki", 0.05, True, (3.0, 12.0), (10, 60)),
+    ("VirtualRide", 0.09, False, (7.0, 10.0), (15, 80)),
+    ("Swim", 0.05, False, (0.7, 1.2), (1, 4)),
+    ("WeightTraining", 0.03, False, (0.0, 0.0), (0, 0)),
+]
+
+def encode_polylines(routes):
+    """
+    Encodes routes with Google's polyline algorithm at 1e-5 precision, all
+    routes in one vectorized pass
+
+    Parameters:
+        routes: List of float arrays of shape (n, 2) holding [lat, lon]
+
+    Returns:
+        encoded: List of String
+    """
+    if not routes:
+        return []
+    lengths = np.array([len(route) for route in routes])
+    scaled = np.rint(np.concatenate(routes) * 1e5).astype(np.int64)
+
+    # Each route is delta encoded from its own first point
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    deltas[starts[1:]] = scaled[starts[1:]]
+    values = deltas.ravel()
+
+    values = np.where(values < 0, ~(values << 1), values << 1)
+    # Up to seven 5-bit chunks per value, least significant first
+    chunks = (values[:, None] >> (5 * np.arange(7))) & 0x1F
+    n_chunks = np.maximum(1, (np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) // 5) + 1)
+    n_chunks[values == 0] = 1
+    used = np.arange(7) < n_chunks[:, None]
+    more = np.arange(7) < (n_chunks[:, None] - 1)
+    chars = (chunks | (more * 0x20)) + 63
+
+    text = chars[used].astype(np.uint8).tobytes().decode("ascii")
+    # Two values per point, so each route spans sum(n_chunks) over its 2 * n values
+    chars_per_route = np.add.reduceat(n_chunks, 2 * starts)
+    bounds = np.concatenate(([0], np.cumsum(chars_per_route)))
+    return [text[bounds[i]:bounds[i + 1]] for i in range(len(routes))]
+
+def make_route(rng, start, distance_km, step_m=80.0, max_points=400):
+    """
+    Random walk with smoothly changing heading, sampled like a summary polyline
+
+    Returns:
+        route: float array of shape (n, 2) holding [lat, lon]
+    """
+    n = int(np.clip(distance_km * 1000 / step_m, 10, max_points))
+    step = distance_km * 1000 / n
+    heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, 0.25, n))
+    north = np.cumsum(np.cos(heading) * step) / 111_320
+    east = np.cumsum(np.sin(heading) * step) / (111_320 * np.cos(np.radians(start[0])))
+    return start + np.column_stack((north, east))
+
+def make_athlete(n_activities, seed=0, athlete_id=1, per_day=None):
+    """
+    Synthetic summary activities for one athlete, most recent first
+
+    Parameters:
+        n_activities: int
+        seed: int
+        athlete_id: int
+        per_day: float, average activities per day, which sets the date span.
+            Defaults to one a day, spread over at most ten years
+
+    Returns:
+        activities: List of Dict
+    """
+    rng = np.random.default_rng(seed)
+    shares = np.array([sport[1] for sport in SPORTS])
+    sport_index = rng.choice(len(SPORTS), size=n_activities, p=shares / shares.sum())
+
+    # A few home bases, so routes overlap like a real athlete's
+    homes = rng.uniform([-45, -120], [60, 150], size=(3, 2))
+    per_day = per_day or max(1.0, n_activities / 3650)
+    now = time.time()
+    ages = np.sort(rng.uniform(0, n_activities / per_day * 86400, n_activities))
+
+    activities = []
+    routes, route_rows = [], []
+    for i in range(n_activities):
+        sport_type, _, has_route, speed_range, distance_range = SPORTS[sport_index[i]]
+        distance_km = float(rng.uniform(*distance_range))
+        average_speed = float(rng.uniform(*speed_range))
+        moving_time = int(distance_km * 1000 / average_speed) if average_speed else int(rng.uniform(1800, 5400))
+        start = time.gmtime(now - ages[i])
+        has_power = sport_type in ("Ride", "VirtualRide") and rng.random() < 0.6
+        has_heartrate = rng.random() < 0.8
+        elev_low = float(rng.uniform(0, 1500))
+        elevation_gain = float(distance_km * rng.uniform(2, 25)) if has_route else 0.0
+
+        activity_id = athlete_id * 10_000_000 + n_activities - i
+        activities.append({
+            "id": activity_id,
+            "name": f"{sport_type} {n_activities - i}",
+            "distance": distance_km * 1000,
+            "moving_time": moving_time,
+            "elapsed_time": int(moving_time * rng.uniform(1.0, 1.4)),
+            "total_elevation_gain": elevation_gain,
+            "sport_type": sport_type,
+            "type": sport_type,
+            "start_date": time.strftime("%Y-%m-%dT%H:%M:%SZ", start),
+            "start_date_local": time.strftime("%Y-%m-%dT%H:%M:%SZ", start),
+            "timezone": "(GMT+00:00) UTC",
+            "average_speed": average_speed,
+            "max_speed": average_speed * float(rng.uniform(1.2, 2.5)),
+            "average_cadence": float(rng.uniform(70, 95)) if sport_type in ("Ride", "Run") else None,
+            "average_watts": float(rng.uniform(120, 280)) if has_power else None,
+            "max_watts": int(rng.uniform(400, 1200)) if has_power else None,
+            "kilojoules": float(moving_time * rng.uniform(0.12, 0.28)) if has_power else None,
+            "average_heartrate": float(rng.uniform(110, 165)) if has_heartrate else None,
+            "max_heartrate": float(rng.uniform(165, 195)) if has_heartrate else None,
+            "elev_high": elev_low + elevation_gain / 4,
+            "elev_low": elev_low,
+            "total_photo_count": int(rng.poisson(0.5)),
+            "commute": bool(sport_type == "Ride" and rng.random() < 0.1),
+            # Entered by hand rather than recorded, so there are no streams
+            "manual": sport_type == "WeightTraining",
+            "map": {"id": f"a{activity_id}", "summary_polyline": "", "resource_state": 2},
+        })
+        if has_route:
+            home = homes[rng.integers(len(homes))]
+            start_point = home + rng.normal(0, 0.05, 2)
+            routes.append(make_route(rng, start_point, distance_km))
+            route_rows.append(i)
+
+    for i, encoded in zip(route_rows, encode_polylines(routes)):
+        activities[i]["map"]["summary_polyline"] = encoded
+    return activities
+
+def make_streams(activity, keys=None, max_points=2000):
+    """
+    Synthetic streams for a summary activity, shaped like the key_by_type
+    /activities/{id}/streams response. Heart rate and power are only present
+    when the activity reports them, and power has a gap of nulls like a
+    dropped sensor
+
+    Parameters:
+        activity: Dict from make_athlete
+        keys: iterable of String, stream types to include (all by default)
+        max_points: int
+
+    Returns:
+        streams: Dict of stream type -> {'data', 'series_type', 'original_size', 'resolution'}
+    """
+    rng = np.random.default_rng(activity["id"])
+    n = max(min(int(activity["elapsed_time"]), max_points), 2)
+    time_s = np.linspace(0, activity["elapsed_time"], n).round().astype(int)
+    step = rng.uniform(0.5, 1.5, n)
+    distance = np.cumsum(step) / step.sum() * activity["distance"]
+    data = {
+        "time": time_s.tolist(),
+        "distance": distance.round(1).tolist(),
+        "latlng": (np.array([51.05, -114.07]) + np.cumsum(rng.normal(0, 1e-4, (n, 2)), axis=0)).round(6).tolist(),
+    }
+    if activity.get("average_heartrate") is not None:
+        data["heartrate"] = np.clip(activity["average_heartrate"] + rng.normal(0, 8, n), 60, 200).round().astype(int).tolist()
+    if activity.get("average_watts") is not None:
+        watts = np.clip(activity["average_watts"] + np.cumsum(rng.normal(0, 5, n)), 0, 1500).round().astype(int).tolist()
+        gap = int(rng.integers(0, max(n - 10, 1)))
+        watts[gap:gap + 5] = [None] * len(watts[gap:gap + 5])
+        data["watts"] = watts
+
+    keys = set(data) if keys is None else set(keys)
+    return {
+        stream_type: {"data": values, "series_type": "distance", "original_size": n, "resolution": "high"}
+        for stream_type, values in data.items()
+        if stream_type in keys
+    }
@@ -1,4 +1,7 @@
+import time
+import uuid
 import streamlit as st
+from utils.telemetry import telemetry, estimate_bytes
 
 try:
     st.set_page_config(layout='wide')
@@ -13,18 +16,49 @@ if "athlete" not in st.session_state:
     st.session_state.athlete = None
 if 'all_data_page' not in st.session_state:
     st.session_state.all_data_page = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+if 'session_bytes' not in st.session_state:
+    st.session_state.session_bytes = None
+
+# Walking the whole session state is too slow to do on every rerun
+SESSION_SAMPLE_S = 10
+
+def is_admin():
+    athlete = st.session_state.athlete
+    return athlete is not None and athlete.get('id') in st.secrets.get("ADMIN_ATHLETE_IDS", [])
 
 login = st.Page("page/account/login.py", title="Log In", icon=":material/login:")
 st.session_state.all_data_page = st.Page("page/data/data_view.py", title="All Data", icon=":material/analytics:", default=True)
 
 if st.session_state.logged_in:
-    
-    pg = st.navigation(
-            {
-                "Data": [st.session_state.all_data_page],
-            }
-        )
+    pages = {"Data": [st.session_state.all_data_page]}
+    if is_admin():
+        pages["Admin"] = [st.Page("page/admin/telemetry.py", title="Telemetry", icon=":material/monitoring:")]
+    pg = st.navigation(pages)
 else:
     pg = st.navigation([login])
 
-pg.run()
\ No newline at end of file
+# Every rerun is one span, tagged with the session so its stages can be grouped
+telemetry.set_session(st.session_state.session_id)
+rerun_span = telemetry.start_span("rerun", page=pg.title)
+error = None
+try:
+    pg.run()
+except Exception as e:
+    error = e
+    raise
+finally:
+    # st.rerun() and st.stop() raise control-flow exceptions, which aren't errors
+    telemetry.finish_span(rerun_span, error=error)
+    # Indexes and tables hold the same activity frame, so it's only counted once.
+    # Between samples the last estimate is recorded again to keep the session live
+    sampled = st.session_state.session_bytes
+    if sampled is None or time.time() - sampled[1] > SESSION_SAMPLE_S:
+        seen = set()
+        nbytes = sum(
+            estimate_bytes(value, seen) for key, value in st.session_state.items()
+            if key not in ('all_data_page', 'session_bytes')
+        )
+        sampled = st.session_state.session_bytes = (nbytes, time.time())
+    telemetry.record_session(st.session_state.session_id, sampled[0])
\ No newline at end of file
@@ -1,8 +1,10 @@
 import streamlit as st
 import utils.auth as auth
-import utils.data_utils as dutil
+from utils.assets import read_asset, get_base64_image
+from utils.prefetch import get_prefetcher
 
-strava_login_button = dutil.get_base64_image("assets/btn_strava_connectwith_orange@2x.png")
+# Only auth and cached assets are needed here; the data modules load once logged in
+strava_login_button = get_base64_image("assets/btn_strava_connectwith_orange@2x.png")
 
 client_id = st.secrets["CLIENT_ID"]
 client_secret = st.secrets["CLIENT_SECRET"]
@@ -28,10 +30,12 @@ if st.session_state.auth_code is not None:
             except:
                 st.warning("Something went wrong! This happens from time to time. Try refreshing the page and logging in again.")
             else:
+                # Start loading activities before the data page even runs
+                get_prefetcher().start(st.session_state.access_token, client_id, client_secret)
                 st.session_state.logged_in = True
                 st.rerun()
 
-st.image("assets/logo.png", width=250)
+st.image(read_asset("assets/logo.png"), width=250)
 
 st.write("""
          This web app can connect to your Strava account and display your activity data through various visualizations. 
@@ -47,7 +51,7 @@ strava_html = f"""
 st.markdown(strava_html, unsafe_allow_html=True)
 
 st.container(height=200, border=False)
-st.image("assets/api_logo_pwrdBy_strava_stack_light.png", width=130)
+st.image(read_asset("assets/api_logo_pwrdBy_strava_stack_light.png"), width=130)
 
 github_html = f"""
 [![Created by chrisbrunet](https://img.shields.io/badge/Created_by-chrisbrunet-a1abb3?logo=github)](https://github.com/chrisbrunet/ActiveData)
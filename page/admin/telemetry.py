@@ -0,0 +1,64 @@
+import json
+import streamlit as st
+import pandas as pd
+from utils.telemetry import telemetry, peak_rss_bytes
+
+st.header("Telemetry")
+st.button("Refresh")
+
+summary = pd.DataFrame(telemetry.summary())
+recent = telemetry.recent(limit=500)
+sessions = telemetry.session_memory()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Spans Recorded", f"{int(summary['count'].sum()) if not summary.empty else 0:,}")
+col2.metric("Active Sessions", f"{len(sessions):,}")
+col3.metric("Session Memory (MB)", f"{sum(s['bytes'] for s in sessions.values()) / 1e6:,.1f}")
+peak_rss = peak_rss_bytes()
+col4.metric("Peak RSS (MB)", f"{peak_rss / 1e6:,.1f}" if peak_rss is not None else "-")
+
+# STAGES
+st.subheader("Stages")
+if summary.empty:
+    st.write("No Spans Recorded Yet")
+else:
+    st.dataframe(summary.sort_values("p95_ms", ascending=False), hide_index=True)
+
+# GAUGES
+gauges = telemetry.gauges()
+if gauges:
+    st.subheader("Gauges")
+    gauges_df = pd.DataFrame([
+        {"Gauge": gauge["name"], "Labels": ", ".join(f"{k}={v}" for k, v in gauge["labels"].items()), "Value": gauge["value"]}
+        for gauge in gauges
+    ])
+    st.dataframe(gauges_df, hide_index=True)
+
+# SESSIONS
+st.subheader("Sessions")
+if sessions:
+    sessions_df = pd.DataFrame([
+        {"Session": session_id, "Memory (MB)": info["bytes"] / 1e6, "Last Seen": pd.Timestamp(info["last_seen"], unit="s")}
+        for session_id, info in sessions.items()
+    ])
+    st.dataframe(sessions_df.sort_values("Memory (MB)", ascending=False), hide_index=True)
+
+# RECENT SPANS
+st.subheader("Recent Spans")
+if recent:
+    names = sorted({span["name"] for span in recent})
+    selected = st.multiselect("Span", names)
+    recent_df = pd.DataFrame([
+        {
+            "Start": pd.Timestamp(span["start"], unit="s"),
+            "Span": span["name"],
+            "Duration (ms)": span["duration_ms"],
+            "Session": span["session"],
+            "Thread": span["thread"],
+            "Attributes": json.dumps(span["attrs"], default=str),
+            "Error": span.get("error"),
+        }
+        for span in reversed(recent)
+        if not selected or span["name"] in selected
+    ])
+    st.dataframe(recent_df, hide_index=True)
@@ -1,14 +1,41 @@
 import streamlit as st
-import pymongo
+import time
+import hashlib
 import datetime
-import pydeck as pdk
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
 from utils import data_utils as dutil
-from streamlit_geolocation import streamlit_geolocation
+from utils import plot_utils as putil
+from utils.strava_client import StravaAPIError
+from utils.prefetch import get_prefetcher
+from utils.db import get_writer
+from utils.route_utils import RouteCache
+from utils.spatial_index import get_route_index, viewport_bounds
+from utils.activity_index import ActivityIndex
+from utils.activity_table import ActivityTable
+from utils.aggregates import ActivityCube, calendar_grid
+from utils.streams import StreamStore, get_streams
+from utils.curves import activity_curves, best_curve, PACE_SPORT_TYPES
 
 if 'data' not in st.session_state:
     st.session_state.data = None
-if 'polylines' not in st.session_state:
-    st.session_state.polylines = None
+if 'data_version' not in st.session_state:
+    st.session_state.data_version = None
+if 'activity_index' not in st.session_state:
+    st.session_state.activity_index = None
+if 'activity_cube' not in st.session_state:
+    st.session_state.activity_cube = None
+if 'activity_table' not in st.session_state:
+    st.session_state.activity_table = None
+if 'route_info' not in st.session_state:
+    st.session_state.route_info = None
+if 'route_cache' not in st.session_state:
+    st.session_state.route_cache = RouteCache()
+if 'density_cache' not in st.session_state:
+    st.session_state.density_cache = OrderedDict()
+if 'best_curve' not in st.session_state:
+    st.session_state.best_curve = None
 
 def logout():
     print('Logging out...')
@@ -22,25 +49,130 @@ athlete = st.session_state.athlete
 athlete_id = athlete['id']
 athlete_link = f'https://www.strava.com/athletes/{athlete_id}'
 
+# Rows and routes shown while the rest of the activities are still arriving
+PREVIEW_ROUTES = 100
+PREVIEW_ROWS = 200
+PREVIEW_INTERVAL_S = 0.5
+# Activities whose streams are fetched per click
+STREAM_BATCH = 100
+TABLE_PAGE_SIZES = [25, 50, 100, 250]
+
+def add_preview_chunk(state, formatted_chunk, route_chunk, incremental):
+    """
+    Folds a page of activities into the preview: totals are kept as running
+    sums, and only the chunks holding the newest rows and routes are kept
+    """
+    state["incremental"] = incremental
+    state["count"] += len(formatted_chunk)
+    for column in ('Moving Time (s)', 'Distance (km)', 'Elevation Gain (m)'):
+        state[column] += float(formatted_chunk[column].sum())
+    if state["rows"] < PREVIEW_ROWS:
+        state["frames"].append(formatted_chunk.head(PREVIEW_ROWS - state["rows"]))
+        state["rows"] += len(state["frames"][-1])
+    if state["n_routes"] < PREVIEW_ROUTES:
+        state["routes"].append(route_chunk.head(PREVIEW_ROUTES - state["n_routes"]))
+        state["n_routes"] += len(state["routes"][-1])
+
+def show_preview(preview, state):
+    """
+    Renders totals, the newest routes and a table from the pages fetched so far
+    """
+    partial = pd.concat(state["frames"], ignore_index=True)
+    partial_routes = pd.concat(state["routes"])
+
+    with preview.container():
+        # An incremental sync only fetches what's new since the last visit
+        if state["incremental"]:
+            st.caption(f"Found {state['count']:,} new activities since your last visit, loading the rest...")
+            label = "New"
+        else:
+            st.caption(f"Showing your {state['count']:,} most recent activities while the rest load...")
+            label = "Total"
+
+        with st.container(border=True):
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric(f"{label} Activities", f"{state['count']:,}")
+            col2.metric(f"{label} Time (hrs)", f"{round(state['Moving Time (s)']/60/60, 1):,}")
+            col3.metric(f"{label} Distance (km)", f"{round(state['Distance (km)'], 1):,}")
+            col4.metric(f"{label} Elevation (m)", f"{round(state['Elevation Gain (m)'], 1):,}")
+
+        newest_polylines = dutil.get_polylines(
+            partial_routes, partial_routes.index, st.session_state.route_cache,
+        )
+        if newest_polylines is not None:
+            import pydeck as pdk
+            longitude, latitude = newest_polylines['path'].iloc[0][0]
+            path_layer = pdk.Layer(
+                "PathLayer",
+                data=newest_polylines,
+                get_path="path",
+                get_width=5,
+                width_min_pixels=1,
+                get_color=[255, 0, 0],
+                pickable=True,
+            )
+            view_state = pdk.ViewState(latitude=latitude, longitude=longitude, controller=True, zoom=9)
+            st.pydeck_chart(pdk.Deck(layers=path_layer, initial_view_state=view_state, map_style="light", tooltip={'text': '{description}'}))
+
+        display_data = dutil.add_activity_links(partial).drop(columns=['Activity ID', 'Photos'])
+        st.dataframe(
+            display_data,
+            column_config={
+                "Start Date": st.column_config.DateColumn(),
+                "Activity Link": st.column_config.LinkColumn()
+            }
+        )
+
 if st.session_state.data is None:
     with st.spinner("Getting Data..."):
         access_code = st.session_state.access_token['access_token']
-        st.session_state.data = dutil.get_activity_data(access_code)
-        st.session_state.polylines = dutil.get_polylines(st.session_state.data)
-
-        CONNECTION_STRING = st.secrets["MONGODB_CONNECTION_STRING"]
-        client = pymongo.MongoClient(CONNECTION_STRING)
-        signins_collection = dutil.connect_to_db(client, collection_name="signins")
+        preview = st.empty()
+        preview_state = {
+            "incremental": False, "count": 0, "Moving Time (s)": 0.0, "Distance (km)": 0.0, "Elevation Gain (m)": 0.0,
+            "frames": [], "rows": 0, "routes": [], "n_routes": 0, "shown_at": None,
+        }
+
+        def on_chunk(*chunk):
+            add_preview_chunk(preview_state, *chunk)
+            # Pages can arrive faster than the preview renders, so redraw at most a few times a second
+            now = time.monotonic()
+            if preview_state["shown_at"] is None or now - preview_state["shown_at"] >= PREVIEW_INTERVAL_S:
+                show_preview(preview, preview_state)
+                preview_state["shown_at"] = now
+
+        try:
+            # Usually already loading, started by the login page as soon as the token arrived
+            prefetched = get_prefetcher().result(athlete_id, on_chunk=on_chunk)
+            if prefetched is not None:
+                data_version, formatted_data, route_info = prefetched
+            else:
+                data_version, formatted_data, route_info = dutil.load_athlete_data(
+                    access_code, athlete_id, status_placeholder=st.empty(), on_chunk=on_chunk,
+                )
+        except StravaAPIError as e:
+            print(f"\nError getting activity data: {e}")
+            st.error("Strava is not responding right now. Try refreshing the page in a few minutes.")
+            st.stop()
+        preview.empty()
+
+        # Index and aggregate once per data version; reruns only look up filters
+        st.session_state.data = formatted_data
+        st.session_state.data_version = data_version
+        st.session_state.route_info = route_info
+        st.session_state.activity_index = ActivityIndex(formatted_data)
+        st.session_state.activity_cube = ActivityCube(formatted_data)
+        st.session_state.activity_table = ActivityTable(formatted_data)
 
         now = datetime.datetime.now()
         login_details = st.session_state.athlete.copy()
         login_details['login_time'] = now
         login_details['athlete_id'] = login_details.pop('id')
 
-        dutil.add_to_db(signins_collection, login_details)
+        # Written behind the request by a shared, pooled writer
+        get_writer(st.secrets["MONGODB_CONNECTION_STRING"], collection_name="signins").add(login_details)
 
 if not st.session_state.data.empty:
-    formatted_data = dutil.format_data(st.session_state.data)
+    activity_index = st.session_state.activity_index
 
     # PROFILE & FILTERS SIDEBAR
     with st.sidebar:
@@ -65,22 +197,17 @@ if not st.session_state.data.empty:
 
         st.divider()
 
-        sport_types = formatted_data['Sport Type'].unique().tolist()
+        sport_types = activity_index.sport_types
         sport_type = st.multiselect("Sport Type", sport_types)
 
-        if not sport_type:
-            filtered_df = formatted_data
-        else:
-            filtered_df = formatted_data[formatted_data['Sport Type'].isin(sport_type)]
-
-        start_date_default = filtered_df['Start Date'].min()
+        start_date_default = activity_index.first_date(sport_type)
         col1, col2 = st.columns(2)
         with col1:
             start_date = st.date_input("Start Date", start_date_default)
         with col2:
             end_date = st.date_input("End Date")
         
-        filtered_df = filtered_df[(filtered_df['Start Date'] >= start_date) & (filtered_df['Start Date'] <= end_date)]
+        filtered_df = activity_index.filter(sport_type, start_date, end_date)
 
         if "AlpineSki" in sport_types:
             include_apline_skis = st.checkbox("Include Alpine Skis in Elevation")
@@ -101,40 +228,41 @@ if not st.session_state.data.empty:
     # TOTALS CONTAINER
     with st.container(border=True):
 
+        activity_cube = st.session_state.activity_cube
+        totals = activity_cube.query(sport_type or None, start_date, end_date)
+
+        if "AlpineSki" in sport_types and not include_apline_skis:
+            elevation_sports = [s for s in (sport_type or sport_types) if s != "AlpineSki"]
+            elevation_totals = activity_cube.query(elevation_sports, start_date, end_date)
+        else:
+            elevation_totals = totals
+
         col1, col2, col3, col4 = st.columns(4)
 
         with col1:
-            total_activities = filtered_df["Name"].count()
-            total_time = filtered_df["Moving Time (s)"].sum()
+            total_activities = totals["count"]
+            total_time = totals["moving_time"]
 
             st.metric("Total Activities", f"{total_activities:,}")
             st.metric("Total Time (hrs)", f"{round(total_time/60/60, 1):,}")
 
         with col2:
-            total_dist = filtered_df["Distance (km)"].sum()
-            avg_dist = filtered_df["Distance (km)"].mean()
+            total_dist = totals["distance"]
+            avg_dist = totals["distance_mean"]
 
             st.metric("Total Distance (km)", f"{round(total_dist, 1):,}")
             st.metric("Average Distance (km)", f"{round(avg_dist, 1):,}")
 
         with col3:
-            try:
-                if include_apline_skis:
-                    total_elevation = filtered_df["Elevation Gain (m)"].sum()
-                    avg_elevation = filtered_df["Elevation Gain (m)"].mean()
-                else:
-                    total_elevation = filtered_df[filtered_df["Sport Type"] != "AlpineSki"]["Elevation Gain (m)"].sum()
-                    avg_elevation = filtered_df[filtered_df["Sport Type"] != "AlpineSki"]["Elevation Gain (m)"].mean()
-            except: 
-                total_elevation = filtered_df["Elevation Gain (m)"].sum()
-                avg_elevation = filtered_df["Elevation Gain (m)"].mean()
+            total_elevation = elevation_totals["elevation"]
+            avg_elevation = elevation_totals["elevation_mean"]
 
             st.metric("Total Elevation (m)", f"{round(total_elevation, 1):,}")
             st.metric("Average Elevation (m)", f"{round(avg_elevation, 1):,}")
 
         with col4:
-            max_speed = filtered_df["Max Speed (km/h)"].max()
-            avg_speed = filtered_df["Average Speed (km/h)"].mean()
+            max_speed = totals["max_speed"]
+            avg_speed = totals["average_speed_mean"]
 
             st.metric("Max Speed (km/h)", f"{round(max_speed, 1):,}")
             st.metric("Average Speed (km/h)", f"{round(avg_speed, 1):,}")
@@ -145,45 +273,96 @@ if not st.session_state.data.empty:
             st.write("Not Enough Data :(")
         else:
             bins = total_activities // 3
-            col1, col2, col3 = st.columns(3)
-
-            with col1:
-                dutil.plot_histogram(filtered_df, "Distance (km)", bins)
-
-            with col2:
-                dutil.plot_histogram(filtered_df, "Elevation Gain (m)", bins)
+            filter_fingerprint = (st.session_state.data_version, tuple(sport_type), start_date, end_date)
+
+            # Submit every plot before waiting on any so they render in parallel
+            histogram_columns = ["Distance (km)", "Elevation Gain (m)", "Average Speed (km/h)"]
+            histograms = [
+                putil.get_png(
+                    ("histogram", column_name, bins, filter_fingerprint),
+                    putil.render_histogram, putil.histogram_values(filtered_df, column_name), column_name, bins,
+                )
+                for column_name in histogram_columns
+            ]
 
-            with col3: 
-                dutil.plot_histogram(filtered_df, "Average Speed (km/h)", bins)
+            for col, histogram in zip(st.columns(3), histograms):
+                with col:
+                    st.image(histogram.result())
             
-            selectbox_years = sorted({d.year for d in filtered_df['Start Date'].unique()}, reverse=True)
+            selectbox_years = sorted(filtered_df['Start Date'].dt.year.unique().tolist(), reverse=True)
             selected_year = st.selectbox("Select Year for Calendar Heatmap", selectbox_years)
-            dutil.plot_calendar_heatmap(filtered_df, selected_year)
 
-    # MAP
-    with st.expander("Map"):
+            days, distances = st.session_state.activity_cube.daily("distance", sport_type or None, start_date, end_date)
+            heatmap = putil.get_png(
+                ("calendar", selected_year, filter_fingerprint),
+                putil.render_calendar_heatmap, calendar_grid(days, distances, selected_year),
+            )
+            st.image(heatmap.result())
+
+            # Streams are rate limited, so they are fetched in batches on request and kept
+            curve_label = st.radio("Best Efforts", ["Power", "Pace"], horizontal=True)
+            curve_kind = "power" if curve_label == "Power" else "speed"
+            # Candidates, cached streams and the curve only change with the filter or when
+            # streams are saved, so they are worked out once per change, not every rerun
+            stream_store = StreamStore(athlete_id)
+            curve_key = (filter_fingerprint, curve_kind, stream_store.version())
+            if st.session_state.best_curve is None or st.session_state.best_curve['key'] != curve_key:
+                if curve_kind == "power":
+                    candidates = filtered_df.loc[filtered_df['Average Watts'].notna(), 'Activity ID'].tolist()
+                else:
+                    runs = filtered_df['Sport Type'].isin(PACE_SPORT_TYPES) & (filtered_df['Distance (km)'] > 0)
+                    candidates = filtered_df.loc[runs, 'Activity ID'].tolist()
+                cached_ids = stream_store.ids()
+                fetched = [a for a in candidates if a in cached_ids]
+                best = None
+                if fetched:
+                    activity_streams = {a: stream_store.load(a) for a in fetched}
+                    try:
+                        durations, values = best_curve(activity_curves(athlete_id, activity_streams), curve_kind)
+                    finally:
+                        for streams in activity_streams.values():
+                            streams.close()
+                    best = (durations, values, hashlib.sha1(np.sort(fetched).tobytes()).hexdigest())
+                st.session_state.best_curve = {
+                    'key': curve_key,
+                    'candidates': len(candidates),
+                    'uncached': [a for a in candidates if a not in cached_ids],
+                    'fetched': len(fetched),
+                    'best': best,
+                }
+            curve_state = st.session_state.best_curve
+
+            uncached = curve_state['uncached']
+            if uncached and st.button(f"Fetch Streams for {min(len(uncached), STREAM_BATCH)} More Activities"):
+                with st.spinner("Fetching Streams..."):
+                    get_streams(access_token, athlete_id, uncached[:STREAM_BATCH])
+                st.rerun()
+
+            if curve_state['best'] is None:
+                st.write("No Activity Streams Fetched Yet")
+            else:
+                durations, values, streams_fingerprint = curve_state['best']
+                curve = putil.get_png(
+                    ("curve", curve_kind, athlete_id, streams_fingerprint),
+                    putil.render_curve, durations, values, curve_kind,
+                )
+                st.caption(f"Best efforts across {curve_state['fetched']:,} of {curve_state['candidates']:,} activities")
+                st.image(curve.result())
 
-        id_list = filtered_df['Map'].apply(lambda x: x['id']).tolist()
-        filtered_polylines = st.session_state.polylines[st.session_state.polylines['name'].isin(id_list)]
+    # MAP
+    # Routes are only decoded while the expander is open, and only for the filtered activities.
+    # With a location, only routes near it and in view are sent to the map. The map
+    # libraries are imported the first time it's opened
+    map_expander = st.expander("Map", key="map_expander", on_change="rerun")
+    with map_expander:
+        if map_expander.open:
+            import pydeck as pdk
+            from streamlit_geolocation import streamlit_geolocation
 
-        if filtered_polylines is not None:
             st.write("Click to use current location:")
             location = streamlit_geolocation()
 
-            path_layer = pdk.Layer(
-                "PathLayer",
-                data=filtered_polylines,
-                get_path="path",
-                get_width=5,
-                # width_scale=10,
-                width_min_pixels=1,
-                get_color=[255, 0, 0],
-                highlight_color=[255, 255, 0],
-                picking_radius=15,
-                auto_highlight=True,
-                pickable=True,
-            )
-
+            map_ids = filtered_df['Activity ID']
             if location["latitude"] is None:
                 view_state = pdk.ViewState(
                     latitude=0, longitude=0, controller=True, zoom=2,
@@ -193,19 +372,108 @@ if not st.session_state.data.empty:
                     latitude=location["latitude"], longitude=location["longitude"], controller=True, zoom=9,
                 )
 
-            chart = pdk.Deck(layers=path_layer, initial_view_state=view_state, map_style="light", tooltip={'text': '{description}'})
-            event = st.pydeck_chart(chart)
-        else:
-            st.write("No Map Data For This Activity :(")  
+                # Built over every route once per data version and shared across sessions,
+                # then queried per rerun
+                route_index = get_route_index(
+                    athlete_id, st.session_state.data_version, st.session_state.route_info['polyline'],
+                )
+
+                radius_km = st.slider("Show Activities Within (km)", 1, 200, 50)
+                near_ids = route_index.near(view_state.latitude, view_state.longitude, radius_km)
+                visible_ids = route_index.in_bbox(viewport_bounds(view_state.latitude, view_state.longitude, view_state.zoom))
+                map_ids = map_ids[map_ids.isin(near_ids) & map_ids.isin(visible_ids)]
+
+            map_mode = st.radio("Map Mode", ["Routes", "Density"], horizontal=True)
+
+            if map_mode == "Density":
+                density_map = dutil.get_density_map(
+                    st.session_state.route_info, map_ids,
+                    st.session_state.route_cache, st.session_state.density_cache,
+                )
+
+                if density_map is not None:
+                    bitmap_layer = pdk.Layer(
+                        "BitmapLayer",
+                        data=None,
+                        image=density_map["image"],
+                        bounds=density_map["bounds"],
+                    )
+
+                    chart = pdk.Deck(layers=bitmap_layer, initial_view_state=view_state, map_style="light")
+                    event = st.pydeck_chart(chart)
+                else:
+                    st.write("No Map Data For This Activity :(")
+
+            else:
+                filtered_polylines = dutil.get_polylines(
+                    st.session_state.route_info, map_ids, st.session_state.route_cache,
+                    zoom=view_state.zoom, latitude=view_state.latitude,
+                )
+
+                if filtered_polylines is not None:
+                    path_layer = pdk.Layer(
+                        "PathLayer",
+                        data=filtered_polylines,
+                        get_path="path",
+                        get_width=5,
+                        # width_scale=10,
+                        width_min_pixels=1,
+                        get_color=[255, 0, 0],
+                        highlight_color=[255, 255, 0],
+                        picking_radius=15,
+                        auto_highlight=True,
+                        pickable=True,
+                    )
+
+                    chart = pdk.Deck(layers=path_layer, initial_view_state=view_state, map_style="light", tooltip={'text': '{description}'})
+                    event = st.pydeck_chart(chart)
+                else:
+                    st.write("No Map Data For This Activity :(")  
 
     # ALL DATA TABLE
+    # Search, sort and paging run server side; only the visible page is sent
     with st.expander("Activities Info Table"):
-        display_data = filtered_df
-        columns_to_drop = ['Activity ID', 'Map', 'Photos']
-        display_data = display_data.drop(columns=columns_to_drop)
+        activity_table = st.session_state.activity_table
+        col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+        with col1:
+            search = st.text_input("Search Names")
+        with col2:
+            sort_by = st.selectbox("Sort By", activity_table.sort_columns, index=activity_table.sort_columns.index("Start Date"))
+        with col3:
+            ascending = st.selectbox("Order", ["Descending", "Ascending"]) == "Ascending"
+        with col4:
+            page_size = st.selectbox("Rows Per Page", TABLE_PAGE_SIZES, index=1)
+
+        filter_key = (st.session_state.data_version, tuple(sport_type), start_date, end_date)
+        rows_key = (filter_key, search, sort_by, ascending)
+        rows = activity_table.rows(filter_key, activity_index.positions(sport_type, start_date, end_date), search, sort_by, ascending)
+        n_pages = max(-(-len(rows) // page_size), 1)
+
+        page = st.number_input("Page", min_value=1, max_value=n_pages, value=1)
         st.dataframe(
-            display_data,
+            activity_table.page(rows_key, rows, page - 1, page_size),
             column_config={
+                "Start Date": st.column_config.DateColumn(),
                 "Activity Link": st.column_config.LinkColumn()
-            }
-        )
\ No newline at end of file
+            },
+            hide_index=True,
+        )
+        first_row = min((page - 1) * page_size + 1, len(rows))
+        st.caption(f"Rows {first_row:,}-{min(page * page_size, len(rows)):,} of {len(rows):,} (Page {page} of {n_pages})")
+
+        # Exports are only built when a button is clicked, in chunks
+        col5, col6 = st.columns(2)
+        with col5:
+            st.download_button(
+                "Download CSV",
+                data=lambda: activity_table.export(rows, "csv"),
+                file_name="activities.csv",
+                mime="text/csv",
+            )
+        with col6:
+            st.download_button(
+                "Download Parquet",
+                data=lambda: activity_table.export(rows, "parquet"),
+                file_name="activities.parquet",
+                mime="application/octet-stream",
+            )
@@ -0,0 +1,20 @@
+"""
+Starts the curve worker pool, then serves the app with Streamlit
+
+Workers are spawned here, before Streamlit runs any script, so none of them
+re-runs the app. Extra arguments are passed on to streamlit run
+
+Usage:
+    python serve.py [--server.port=8501] [--server.address=0.0.0.0]
+"""
+import sys
+from utils import curves
+
+def main(argv=None):
+    curves.start_pool()
+    # Imported here so the spawned workers, which re-run this file, skip it
+    from streamlit.web import cli
+    cli.main(["run", "myApp.py", *(sys.argv[1:] if argv is None else argv)], prog_name="streamlit")
+
+if __name__ == "__main__":
+    main()
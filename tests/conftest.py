@@ -0,0 +1,17 @@
+import pytest
+from benchmarks.fake_strava import FakeStrava
+from benchmarks.synthetic import make_athlete
+from utils import strava_client
+
+@pytest.fixture
+def fake_strava(monkeypatch):
+    """
+    Local fake Strava API with the client pointed at it
+    """
+    with FakeStrava(make_athlete(40, seed=1)) as server:
+        # A fresh rate limiter, and 429s resent without the production backoff
+        monkeypatch.setattr(strava_client, "rate_limiter", strava_client.RateLimiter())
+        monkeypatch.setattr(strava_client, "RATE_LIMIT_BACKOFF_S", 0.0)
+        monkeypatch.setattr(strava_client, "API_URL", server.url + "/api/v3")
+        monkeypatch.setattr(strava_client, "OAUTH_URL", server.url + "/oauth")
+        yield server
@@ -0,0 +1,60 @@
+import calendar
+import time
+import pytest
+from utils import activity_store
+from utils import data_utils as dutil
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "activities.db")
+    monkeypatch.setenv("ACTIVEDATA_STORE_PATH", path)
+    return path
+
+def activity(activity_id, start, name="Ride"):
+    return {"id": activity_id, "start_date_local": start, "name": name}
+
+def test_watermark_is_newest_start_and_never_moves_back(store_path):
+    assert activity_store.get_watermark(1) is None
+    activity_store.save_activities(1, [activity(1, "2024-05-01T08:00:00Z"), activity(2, "2024-05-03T08:00:00Z")])
+    assert activity_store.get_watermark(1) == "2024-05-03T08:00:00Z"
+
+    # An older activity, or an empty sync, leaves it where it was
+    assert activity_store.save_activities(1, [activity(3, "2024-04-01T08:00:00Z")]) == "2024-05-03T08:00:00Z"
+    assert activity_store.save_activities(1, []) == "2024-05-03T08:00:00Z"
+    assert activity_store.get_watermark(2) is None
+
+def test_overlapping_sync_upserts(store_path):
+    activity_store.save_activities(1, [activity(1, "2024-05-01T08:00:00Z"), activity(2, "2024-05-03T08:00:00Z")])
+    # The overlap window fetches activity 2 again, renamed since
+    activity_store.save_activities(1, [activity(2, "2024-05-03T08:00:00Z", "Renamed"), activity(4, "2024-05-04T08:00:00Z")])
+    stored = activity_store.load_activities(1)
+    assert [a["id"] for a in stored] == [4, 2, 1]
+    assert stored[1]["name"] == "Renamed"
+
+def test_watermark_to_epoch_steps_back_by_the_overlap():
+    start = calendar.timegm((2024, 5, 3, 8, 0, 0))
+    assert activity_store.watermark_to_epoch("2024-05-03T08:00:00Z") == start - activity_store.WATERMARK_OVERLAP_S
+    assert activity_store.watermark_to_epoch("2024-05-03T08:00:00") == start - activity_store.WATERMARK_OVERLAP_S
+
+def test_incremental_sync_fetches_only_after_the_watermark(fake_strava, store_path):
+    # Activities are newest first; the ten newest haven't been synced yet
+    activity_store.save_activities(1, fake_strava.activities[10:])
+    after = activity_store.watermark_to_epoch(activity_store.get_watermark(1))
+
+    sync = dutil.stream_activity_data("token", 1)
+    fetched = []
+    while True:
+        try:
+            fetched.extend(next(sync))
+        except StopIteration as done:
+            df = done.value
+            break
+
+    fetched_ids = {a["id"] for a in fetched}
+    assert {a["id"] for a in fake_strava.activities[:10]} <= fetched_ids
+    assert all(calendar.timegm(time.strptime(a["start_date"], "%Y-%m-%dT%H:%M:%SZ")) > after for a in fetched)
+    assert len(fetched) < len(fake_strava.activities)
+    # One short page, and the overlap stored once
+    assert fake_strava.stats["requests"] == 1
+    assert len(df) == len(fake_strava.activities)
+    assert activity_store.get_watermark(1) == fake_strava.activities[0]["start_date_local"]
@@ -0,0 +1,51 @@
+import io
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+from benchmarks.synthetic import make_athlete
+from utils import data_utils as dutil
+from utils.activity_table import ActivityTable
+
+@pytest.fixture(scope="module")
+def table():
+    return ActivityTable(dutil.format_data(pd.DataFrame(make_athlete(250))))
+
+def all_rows(table):
+    return table.rows("all", np.arange(len(table.df)))
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_export_is_accepted_by_download_button(table, file_format):
+    rows = all_rows(table)
+    data, _ = convert_data_to_bytes_and_infer_mime(
+        table.export(rows, file_format, chunk_rows=100), unsupported_error=RuntimeError("unsupported")
+    )
+    if file_format == "csv":
+        exported = pd.read_csv(io.BytesIO(data))
+    else:
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        assert parquet.num_row_groups == 3
+        exported = parquet.read().to_pandas()
+    assert len(exported) == len(rows)
+    assert list(exported.columns) == table.columns
+    assert exported["Name"].tolist() == table.df["Name"].iloc[rows].tolist()
+
+def test_export_empty_selection(table):
+    rows = all_rows(table)[:0]
+    assert len(pd.read_csv(io.BytesIO(table.export(rows, "csv")))) == 0
+    assert pq.read_table(io.BytesIO(table.export(rows, "parquet"))).num_rows == 0
+
+def test_rows_search_and_sort(table):
+    name = table.df["Name"].iloc[0]
+    rows = table.rows("all", np.arange(len(table.df)), search=name.upper(), sort_by="Distance (km)", ascending=True)
+    assert len(rows) >= 1
+    assert all(name.lower() in n.lower() for n in table.df["Name"].iloc[rows])
+    assert table.df["Distance (km)"].iloc[rows].is_monotonic_increasing
+
+def test_page_slices(table):
+    rows = all_rows(table)
+    page = table.page("all", rows, 1, 50)
+    assert page.num_rows == 50
+    assert page.column("Name").to_pylist() == table.df["Name"].iloc[rows[50:100]].tolist()
+    assert table.page("all", rows, 1, 50) is page
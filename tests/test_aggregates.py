@@ -0,0 +1,77 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import make_athlete
+from utils import data_utils as dutil
+from utils.aggregates import ActivityCube, calendar_grid
+
+@pytest.fixture(scope="module")
+def df():
+    return dutil.format_data(pd.DataFrame(make_athlete(800, seed=4)))
+
+def expected(df, sport_types, start_date, end_date):
+    dates = df['Start Date'].dt.date
+    mask = pd.Series(True, index=df.index)
+    if sport_types is not None:
+        mask &= df['Sport Type'].isin(sport_types)
+    if start_date is not None:
+        mask &= dates >= start_date
+    if end_date is not None:
+        mask &= dates <= end_date
+    return df[mask]
+
+def ranges(df):
+    first, last = df['Start Date'].min().date(), df['Start Date'].max().date()
+    middle = first + (last - first) / 2
+    yield None, None
+    yield first, last
+    yield middle, None
+    yield None, middle
+    yield middle, middle + datetime.timedelta(days=3)
+    yield middle, middle + datetime.timedelta(days=75)
+    yield last + datetime.timedelta(days=1), None
+    yield middle, middle - datetime.timedelta(days=1)
+
+def test_query_matches_pandas(df):
+    cube = ActivityCube(df)
+    sport_types = df['Sport Type'].unique().tolist()
+    for selected in (None, sport_types[:1], sport_types[1:3], ["Unknown"]):
+        for start_date, end_date in ranges(df):
+            rows = expected(df, selected, start_date, end_date)
+            totals = cube.query(selected, start_date, end_date)
+            assert totals["count"] == len(rows)
+            assert totals["moving_time"] == pytest.approx(rows['Moving Time (s)'].sum())
+            assert totals["distance"] == pytest.approx(rows['Distance (km)'].sum())
+            assert totals["elevation"] == pytest.approx(rows['Elevation Gain (m)'].sum(), rel=1e-5)
+            if len(rows):
+                assert totals["distance_mean"] == pytest.approx(rows['Distance (km)'].mean())
+                assert totals["average_speed_mean"] == pytest.approx(rows['Average Speed (km/h)'].mean(), rel=1e-5)
+                assert totals["max_speed"] == pytest.approx(rows['Max Speed (km/h)'].max(), rel=1e-6)
+            else:
+                assert np.isnan(totals["max_speed"])
+
+def test_means_skip_missing_values(df):
+    df = df.copy()
+    df.loc[df.index[::2], 'Elevation Gain (m)'] = np.nan
+    totals = ActivityCube(df).query()
+    assert totals["elevation_mean"] == pytest.approx(df['Elevation Gain (m)'].mean(), rel=1e-5)
+
+def test_daily_feeds_calendar_grid(df):
+    cube = ActivityCube(df)
+    year = int(df['Start Date'].dt.year.max())
+    days, values = cube.daily("distance")
+    grid = calendar_grid(days, values, year)
+
+    in_year = df[df['Start Date'].dt.year == year]
+    assert grid.sum() == pytest.approx(in_year['Distance (km)'].sum())
+    first = in_year['Start Date'].min()
+    on_first = in_year[in_year['Start Date'] == first]['Distance (km)'].sum()
+    assert grid[first.month - 1, first.day - 1] == pytest.approx(on_first)
+
+def test_empty_frame():
+    cube = ActivityCube(dutil.format_data(pd.DataFrame(make_athlete(0))))
+    totals = cube.query()
+    assert totals["count"] == 0 and np.isnan(totals["max_speed"])
+    days, values = cube.daily("distance")
+    assert len(days) == 0 and len(values) == 0
@@ -0,0 +1,61 @@
+import os
+import time
+from utils.cache import DiskCache, MemoryCache
+
+def payload_files(directory):
+    return [name for name in os.listdir(directory) if "." not in name]
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("a", b"value")
+    assert cache.get("a") == b"value"
+    assert cache.get("missing") is None
+
+def test_disk_cache_deletes_expired_entries_on_read(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("a", b"value", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert os.listdir(tmp_path) == []
+    assert cache.nbytes == 0
+
+def test_disk_cache_evicts_oldest_past_max_bytes(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    for i in range(5):
+        cache.set(f"k{i}", bytes(300))
+        # Distinct modification times so age order is well defined
+        os.utime(cache._path(f"k{i}"), (i, i))
+    assert cache.nbytes <= 900
+    assert cache.get("k0") is None and cache.get("k1") is None
+    assert cache.get("k4") == bytes(300)
+    assert len(payload_files(tmp_path)) == 3
+
+def test_disk_cache_cleanup_removes_expired_first(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000)
+    cache.set("old", b"x" * 100)
+    cache.set("expired", b"x" * 100, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.cleanup() == 1
+    assert cache.get("old") == b"x" * 100
+    assert cache.nbytes == 100
+
+def test_disk_cache_counts_existing_files(tmp_path):
+    DiskCache(str(tmp_path)).set("a", bytes(123))
+    assert DiskCache(str(tmp_path)).nbytes == 123
+
+def test_disk_cache_overwrite_replaces_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    for _ in range(10):
+        cache.set("a", bytes(300))
+    cache.set("a", bytes(200))
+    assert cache.nbytes == 200
+    assert cache.get("a") == bytes(200)
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.get("a")
+    cache.set("c", b"12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
@@ -0,0 +1,84 @@
+import sys
+import types
+import numpy as np
+import pytest
+from utils import cache as ucache
+from utils import curves as ucurves
+from utils.streams import StreamStore
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(ucache, "_cache", ucache.TieredCache([ucache.MemoryCache()]))
+
+def test_mean_max_matches_sliding_window():
+    values = np.random.default_rng(0).uniform(0, 400, 500)
+    durations = np.array([1, 7, 60, 499, 500, 501])
+    curve = ucurves.mean_max(values, durations)
+    for duration, best in zip(durations[:-1], curve[:-1]):
+        expected = max(values[i:i + duration].mean() for i in range(len(values) - duration + 1))
+        assert best == pytest.approx(expected)
+    assert np.isnan(curve[-1])
+
+def save_streams(store, activity_ids, rng):
+    for activity_id in activity_ids:
+        n = 600 + 100 * activity_id
+        store.save(activity_id, {
+            "time": np.arange(n, dtype=np.int32),
+            "distance": np.cumsum(rng.uniform(2, 4, n)).astype(np.float32),
+            "watts": rng.uniform(100, 300, n).astype(np.float32),
+        })
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ucurves, "_pool", None)
+    pool = ucurves.start_pool(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+def test_activity_curves_in_pool_match_inline(tmp_path, memory_cache, pool):
+    assert len(pool._processes) == 2
+    store = StreamStore(1, directory=str(tmp_path))
+    save_streams(store, range(6), np.random.default_rng(1))
+    streams = {a: store.load(a) for a in range(6)}
+
+    # Chunks of two go through the process pool
+    curves = ucurves.activity_curves(1, streams, chunk_size=2)
+    for activity_id, curve in curves.items():
+        np.testing.assert_allclose(curve, ucurves.compute_curves(streams[activity_id]))
+
+    # Cached now, and a later batch reuses the same pool and workers
+    workers = set(pool._processes)
+    assert ucurves.activity_curves(1, streams, chunk_size=2).keys() == curves.keys()
+    store.save(10, {"time": np.arange(100, dtype=np.int32), "distance": np.arange(100, dtype=np.float32)})
+    store.save(11, {"time": np.arange(100, dtype=np.int32), "distance": np.arange(100, dtype=np.float32)})
+    streams.update({10: store.load(10), 11: store.load(11)})
+    ucurves.activity_curves(2, {a: streams[a] for a in (10, 11, 0)}, chunk_size=1)
+    assert ucurves._pool is pool
+    assert set(pool._processes) == workers
+    assert pool._mp_context.get_start_method() == "spawn"
+
+def test_activity_curves_without_pool_compute_inline(tmp_path, memory_cache, monkeypatch):
+    monkeypatch.setattr(ucurves, "_pool", None)
+    store = StreamStore(2, directory=str(tmp_path))
+    save_streams(store, range(3), np.random.default_rng(3))
+    streams = {a: store.load(a) for a in range(3)}
+    curves = ucurves.activity_curves(2, streams, chunk_size=1)
+    assert len(curves) == 3
+    assert ucurves._pool is None
+
+def test_workers_do_not_run_the_app_script(tmp_path, memory_cache, monkeypatch, pool):
+    # Streamlit installs the app script as __main__ while it runs, after the
+    # pool was started
+    marker = tmp_path / "ran"
+    script = tmp_path / "app.py"
+    script.write_text(f"open({str(marker)!r}, 'w').close()\n")
+    app = types.ModuleType("__main__")
+    app.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", app)
+
+    store = StreamStore(3, directory=str(tmp_path / "streams"))
+    save_streams(store, range(4), np.random.default_rng(2))
+    curves = ucurves.activity_curves(3, {a: store.load(a) for a in range(4)}, chunk_size=1)
+    assert len(curves) == 4
+    assert not marker.exists()
+    assert sys.modules["__main__"] is app
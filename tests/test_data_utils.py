@@ -0,0 +1,47 @@
+import copy
+import pandas as pd
+from benchmarks.synthetic import make_athlete
+from utils import data_utils as dutil
+from utils import activity_store
+
+def test_data_version_ignores_row_order():
+    df = pd.DataFrame(make_athlete(50))
+    assert dutil.get_data_version(df) == dutil.get_data_version(df.iloc[::-1].reset_index(drop=True))
+
+def test_data_version_changes_when_an_activity_is_edited():
+    activities = make_athlete(50)
+    version = dutil.get_data_version(pd.DataFrame(activities))
+    for field, value in [("name", "Renamed"), ("sport_type", "Hike"), ("distance", 1.0)]:
+        edited = copy.deepcopy(activities)
+        edited[3][field] = value
+        assert dutil.get_data_version(pd.DataFrame(edited)) != version
+
+    edited = copy.deepcopy(activities)
+    edited[3]["map"]["summary_polyline"] = "_p~iF~ps|U_ulLnnqC"
+    assert dutil.get_data_version(pd.DataFrame(edited)) != version
+
+def test_data_version_ignores_unused_fields():
+    activities = make_athlete(50)
+    edited = copy.deepcopy(activities)
+    edited[3]["kudos_count"] = 99
+    assert dutil.get_data_version(pd.DataFrame(edited)) == dutil.get_data_version(pd.DataFrame(activities))
+
+def sync_chunks(athlete_id):
+    chunks = []
+    dutil.load_athlete_data("token", athlete_id, force=True, on_chunk=lambda *chunk: chunks.append(chunk))
+    return chunks
+
+def test_chunks_flag_incremental_syncs(fake_strava, tmp_path, monkeypatch):
+    monkeypatch.setenv("ACTIVEDATA_STORE_PATH", str(tmp_path / "activities.db"))
+    monkeypatch.setenv("ACTIVEDATA_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr("utils.cache._cache", None)
+
+    chunks = sync_chunks(1)
+    assert sum(len(formatted) for formatted, _, _ in chunks) == len(fake_strava.activities)
+    assert not any(incremental for _, _, incremental in chunks)
+
+    # Only activities around and after the newest stored one are fetched again
+    activity_store.save_activities(2, fake_strava.activities[10:])
+    chunks = sync_chunks(2)
+    assert 10 <= sum(len(formatted) for formatted, _, _ in chunks) < len(fake_strava.activities)
+    assert all(incremental for _, _, incremental in chunks)
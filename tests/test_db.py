@@ -0,0 +1,137 @@
+import time
+import threading
+import mongomock
+import pymongo
+import pytest
+from utils.db import BatchWriter
+from utils.telemetry import telemetry
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().get_database("activedata").get_collection("signins")
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+class Recording:
+    """
+    Collection wrapper recording the size of every insert_many
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.batches = []
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(len(documents))
+        return self.collection.insert_many(documents, ordered=ordered)
+
+def test_flushes_once_a_batch_is_full(collection):
+    recording = Recording(collection)
+    writer = BatchWriter(recording, batch_size=5, flush_interval=60)
+    for i in range(4):
+        writer.add({"i": i})
+    time.sleep(0.3)
+    # Below batch_size, nothing is written until the interval
+    assert recording.batches == []
+    for i in range(4, 12):
+        writer.add({"i": i})
+    assert wait_for(lambda: collection.count_documents({}) == 12)
+    assert max(recording.batches) == 5
+    assert writer.stats["flushes"] == len(recording.batches)
+    writer.close()
+
+def test_flushes_partial_batch_after_interval(collection):
+    writer = BatchWriter(collection, batch_size=100, flush_interval=0.2)
+    for i in range(3):
+        writer.add({"i": i})
+    assert collection.count_documents({}) == 0
+    assert wait_for(lambda: collection.count_documents({}) == 3)
+    writer.close()
+
+def test_close_drains_queue(collection):
+    writer = BatchWriter(collection, batch_size=100, flush_interval=60)
+    for i in range(7):
+        writer.add({"i": i})
+    writer.close()
+    assert collection.count_documents({}) == 7
+    assert writer.depth == 0
+    assert writer.add({"i": 7}) is False
+    assert writer.stats["dropped"] == 1
+
+def test_drops_when_full(collection):
+    writer = BatchWriter(collection, batch_size=100, flush_interval=60, max_queue=3)
+    assert [writer.add({"i": i}) for i in range(5)] == [True, True, True, False, False]
+    assert writer.stats["queued"] == 3
+    assert writer.stats["dropped"] == 2
+    writer.close()
+    assert collection.count_documents({}) == 3
+
+def test_counts_failed_inserts():
+    class Failing:
+        name = "failing"
+
+        def insert_many(self, documents, ordered=True):
+            raise RuntimeError("unavailable")
+
+    writer = BatchWriter(Failing(), batch_size=2, flush_interval=60)
+    writer.add({"i": 0})
+    writer.add({"i": 1})
+    assert wait_for(lambda: writer.stats["failed"] == 2)
+    writer.close()
+
+def test_counters_from_many_threads(collection):
+    writer = BatchWriter(collection, batch_size=50, flush_interval=0.05)
+    threads = [threading.Thread(target=lambda: [writer.add({"n": n}) for n in range(500)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+    assert writer.stats["queued"] == 4000
+    assert writer.stats["inserted"] == 4000
+    assert collection.count_documents({}) == 4000
+
+def test_exposes_gauges(collection):
+    writer = BatchWriter(collection, batch_size=100, flush_interval=60)
+    writer.add({"i": 0})
+    gauges = {(g["name"], g["labels"].get("state")): g["value"] for g in telemetry.gauges() if g["labels"].get("collection") == "signins"}
+    assert gauges[("mongo_queue_depth", None)] == 1
+    assert gauges[("mongo_documents", "queued")] == 1
+    assert 'activedata_mongo_queue_depth{collection="signins"} 1' in telemetry.prometheus()
+    writer.close()
+    assert telemetry.gauges() and 'activedata_mongo_last_flush_seconds{collection="signins"}' in telemetry.prometheus()
+
+def test_partial_batch_failure_counts_only_failed_documents():
+    class PartlyFailing:
+        name = "partly_failing"
+
+        def insert_many(self, documents, ordered=True):
+            raise pymongo.errors.BulkWriteError({"nInserted": 2, "writeErrors": [
+                # Written by an earlier flush
+                {"index": 1, "code": 11000, "errmsg": "E11000 duplicate key error"},
+                {"index": 3, "code": 121, "errmsg": "Document failed validation"},
+            ]})
+
+    writer = BatchWriter(PartlyFailing(), batch_size=100, flush_interval=60)
+    for i in range(4):
+        writer.add({"_id": i})
+    assert writer.flush() == 3
+    assert writer.stats["inserted"] == 3
+    assert writer.stats["failed"] == 1
+    writer.close()
+
+def test_duplicate_keys_count_as_written(collection):
+    collection.insert_one({"_id": 1})
+    writer = BatchWriter(collection, batch_size=100, flush_interval=60)
+    for i in range(3):
+        writer.add({"_id": i})
+    assert writer.flush() == 3
+    assert writer.stats["failed"] == 0
+    assert collection.count_documents({}) == 3
+    writer.close()
@@ -0,0 +1,42 @@
+import json
+import pandas as pd
+import pytest
+from batch import export
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    # Environment, so the spawned processing workers read the same store
+    monkeypatch.setenv("ACTIVEDATA_STORE_PATH", str(tmp_path / "activities.db"))
+    monkeypatch.setenv("ACTIVEDATA_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr("utils.cache._cache", None)
+
+def test_export_writes_partitions_and_summary(fake_strava, stores, tmp_path):
+    tokens = tmp_path / "tokens.json"
+    tokens.write_text("\n".join(json.dumps({"athlete_id": i, "refresh_token": f"old-{i}"}) for i in (1, 2)))
+    output = tmp_path / "export"
+
+    assert export.main(["--tokens", str(tokens), "--output", str(output), "--client-id", "id",
+                        "--client-secret", "secret", "--fetch-workers", "2", "--workers", "2"]) == 0
+
+    for athlete_id in (1, 2):
+        activities = pd.read_parquet(output / "activities" / f"athlete_id={athlete_id}" / "part-0.parquet")
+        assert len(activities) == len(fake_strava.activities)
+        monthly = pd.read_parquet(output / "monthly" / f"athlete_id={athlete_id}" / "part-0.parquet")
+        assert monthly["Activities"].sum() == len(fake_strava.activities)
+        assert monthly.groupby("Sport Type")["Distance (km)"].sum().to_dict() == pytest.approx(
+            activities.groupby("Sport Type")["Distance (km)"].sum().to_dict()
+        )
+
+    summary = pd.read_parquet(output / "athletes.parquet")
+    assert summary["athlete_id"].tolist() == [1, 2]
+    assert summary["error"].isna().all()
+    assert (summary["activities"] == len(fake_strava.activities)).all()
+    # Rotated refresh tokens are kept for the next run
+    assert [a["refresh_token"] for a in export.load_tokens(str(tokens))] == ["bench-refresh-token"] * 2
+
+def test_failed_sync_is_reported_not_exported(fake_strava, stores, tmp_path, monkeypatch):
+    monkeypatch.setattr(export.auth, "refresh_access_token", lambda *args: {"message": "Bad Request"})
+    results = export.run([{"athlete_id": 1, "refresh_token": "old"}], "id", "secret", str(tmp_path / "export"), workers=1)
+    assert results[0]["error"].startswith("ValueError")
+    assert results[0]["refresh_token"] == "old"
+    assert not (tmp_path / "export" / "activities").exists()
@@ -0,0 +1,59 @@
+import time
+import threading
+import pytest
+from benchmarks.synthetic import make_athlete
+from utils import data_utils as dutil
+from utils.pagination import fetch_pages
+
+class Pages:
+    """
+    Fetch function over a fixed number of results, recording requested pages.
+    Earlier pages answer slowest, so results arrive out of order
+    """
+    def __init__(self, total, per_page):
+        self.total = total
+        self.per_page = per_page
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def __call__(self, page_num):
+        with self._lock:
+            self.requested.append(page_num)
+        time.sleep(0.02 / page_num)
+        start = (page_num - 1) * self.per_page
+        return list(range(start, min(start + self.per_page, self.total)))
+
+@pytest.mark.parametrize("total", [0, 5, 10, 95, 100, 500])
+def test_yields_every_page_in_order(total):
+    pages = Pages(total, per_page=10)
+    stats = {}
+    results = list(fetch_pages(pages, per_page=10, stats=stats))
+    assert [page_num for page_num, _ in results] == list(range(1, len(results) + 1))
+    assert [item for _, page in results for item in page] == list(range(total))
+    assert stats["pages"] == len(results)
+    assert stats["requests"] == len(pages.requested)
+
+def test_window_doubles_up_to_max():
+    pages = Pages(1000, per_page=10)
+    list(fetch_pages(pages, per_page=10, initial_window=2, max_window=8))
+    # Windows of 2, 4, 8, 8, ... pages, so pages 1-2, 3-6, 7-14, 15-22, ...
+    assert max(pages.requested[:2]) == 2
+    assert sorted(pages.requested[2:6]) == [3, 4, 5, 6]
+    assert sorted(pages.requested[6:14]) == list(range(7, 15))
+    assert sorted(pages.requested[14:22]) == list(range(15, 23))
+
+def test_stops_at_the_first_short_page():
+    pages = Pages(25, per_page=10)
+    results = list(fetch_pages(pages, per_page=10, initial_window=4))
+    assert [len(page) for _, page in results] == [10, 10, 5]
+    # The one window already in flight is all that is requested
+    assert sorted(pages.requested) == [1, 2, 3, 4]
+
+def test_activity_pages_from_fake_server(fake_strava):
+    # Three pages of 200, the last one short
+    fake_strava.activities = make_athlete(450, seed=2)
+    pages = list(dutil.stream_activities("token"))
+    assert [len(page) for page in pages] == [200, 200, 50]
+    assert [a["id"] for page in pages for a in page] == [a["id"] for a in fake_strava.activities]
+    # Windows of 2 then 4 pages
+    assert fake_strava.stats["requests"] == 6
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import make_athlete
+from utils.route_utils import RouteCache, RouteGeometry, decode_polylines_e5, simplification_ranks
+
+@pytest.fixture(scope="module")
+def encoded():
+    activities = make_athlete(80, seed=5)
+    series = pd.Series({a["id"]: a["map"]["summary_polyline"] for a in activities}, name="polyline")
+    return series[series != ""]
+
+def decoded_routes(encoded):
+    coords, offsets = decode_polylines_e5(encoded)
+    return {activity_id: coords[offsets[i]:offsets[i + 1]] for i, activity_id in enumerate(encoded.index)}
+
+def assert_routes(geometry, expected, ids):
+    assert geometry.ids.tolist() == list(ids)
+    for activity_id, route in zip(ids, geometry.routes()):
+        np.testing.assert_array_equal(route, expected[activity_id])
+
+def test_geometry_lookup_and_take(encoded):
+    geometry = RouteGeometry.from_encoded(encoded)
+    expected = decoded_routes(encoded)
+    ids = encoded.index.tolist()
+
+    route = geometry.route(ids[3])
+    np.testing.assert_array_equal(route, expected[ids[3]])
+    assert np.shares_memory(route, geometry.coords)
+    assert geometry.route(-1) is None
+    assert geometry.positions([ids[5], -1, ids[0]]).tolist() == [5, 0]
+
+    # Consecutive routes stay views of the buffer, anything else is gathered
+    run = geometry.take(ids[2:6])
+    assert_routes(run, expected, ids[2:6])
+    assert np.shares_memory(run.coords, geometry.coords)
+    shuffled = [ids[7], ids[1], ids[4]]
+    assert_routes(geometry.take(shuffled), expected, shuffled)
+
+def test_cache_returns_views_for_stored_runs(encoded):
+    cache = RouteCache()
+    expected = decoded_routes(encoded)
+    ids = encoded.index.tolist()
+
+    first = cache.get(encoded)
+    assert_routes(first, expected, ids)
+    assert np.shares_memory(first.coords, cache._coords)
+
+    again = cache.get(encoded.iloc[10:20])
+    assert_routes(again, expected, ids[10:20])
+    assert np.shares_memory(again.coords, cache._coords)
+
+    picked = encoded.iloc[[15, 2, 30]]
+    assert_routes(cache.get(picked), expected, picked.index)
+
+def test_cache_levels_of_detail(encoded):
+    cache = RouteCache()
+    coords, offsets = decode_polylines_e5(encoded)
+    ranks = simplification_ranks(coords, offsets)
+    geometry = cache.get(encoded, level=2)
+    for i, route in enumerate(geometry.routes()):
+        np.testing.assert_array_equal(route, coords[offsets[i]:offsets[i + 1]][ranks[offsets[i]:offsets[i + 1]] >= 2])
+
+def test_cache_evicts_and_compacts(encoded):
+    expected = decoded_routes(encoded)
+    total = sum(len(route) for route in expected.values())
+    cache = RouteCache(max_points=total // 2)
+
+    cache.get(encoded.iloc[:len(encoded) // 2])
+    cache.get(encoded.iloc[len(encoded) // 2:])
+    assert cache.points <= total // 2
+    assert cache._used == cache.points
+    assert encoded.index[0] not in cache and encoded.index[-1] in cache
+
+    # Evicted routes are decoded again and everything still lines up
+    assert_routes(cache.get(encoded.iloc[:5]), expected, encoded.index[:5])
+    assert_routes(cache.get(encoded.iloc[-5:]), expected, encoded.index[-5:])
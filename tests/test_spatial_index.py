@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import make_athlete
+from utils import spatial_index
+from utils.route_utils import decode_polylines_e5, COORD_SCALE
+
+@pytest.fixture
+def encoded():
+    activities = make_athlete(60, seed=3)
+    return pd.Series(
+        [a["map"]["summary_polyline"] for a in activities], index=[a["id"] for a in activities], name="polyline",
+    )
+
+@pytest.fixture(autouse=True)
+def empty_indexes(monkeypatch):
+    monkeypatch.setattr(spatial_index, "_indexes", spatial_index.OrderedDict())
+    monkeypatch.setattr(spatial_index, "_indexes_bytes", 0)
+
+def test_index_built_once_per_data_version(encoded):
+    index = spatial_index.get_route_index(1, "v1", encoded)
+    assert spatial_index.get_route_index(1, "v1", encoded) is index
+    assert spatial_index.get_route_index(1, "v2", encoded) is not index
+    assert spatial_index.get_route_index(2, "v1", encoded) is not index
+
+def test_index_matches_decoded_routes(encoded):
+    index = spatial_index.get_route_index(1, "v1", encoded)
+    coords, offsets = decode_polylines_e5(encoded)
+    assert len(index) == len(encoded)
+    assert len(index.coords) == len(coords)
+
+    # Every route passes within a few metres of its own first point
+    for position in np.flatnonzero(np.diff(offsets))[:10]:
+        lon, lat = coords[offsets[position]] / COORD_SCALE
+        assert encoded.index[position] in index.near(lat, lon, 0.01)
+
+def test_oldest_indexes_evicted(encoded, monkeypatch):
+    first = spatial_index.get_route_index(1, "v1", encoded)
+    monkeypatch.setattr(spatial_index, "MAX_INDEX_BYTES", first.nbytes)
+    spatial_index.get_route_index(1, "v2", encoded)
+    assert list(spatial_index._indexes) == [(1, "v2")]
+    assert spatial_index._indexes_bytes == first.nbytes
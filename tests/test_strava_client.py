@@ -0,0 +1,83 @@
+import pickle
+import pytest
+import requests
+from utils import strava_client
+from utils.strava_client import RateLimiter, StravaAPIError
+
+def rate_headers(short_usage, short_limit=100, daily_usage=None, daily_limit=1000):
+    daily_usage = short_usage if daily_usage is None else daily_usage
+    return {
+        "X-RateLimit-Limit": f"{short_limit},{daily_limit}",
+        "X-RateLimit-Usage": f"{short_usage},{daily_usage}",
+    }
+
+def test_error_pickles():
+    for error in (StravaAPIError(429, "Rate Limit Exceeded", url="/x"), StravaAPIError(None, "reset")):
+        restored = pickle.loads(pickle.dumps(error))
+        assert (restored.status_code, restored.message, restored.url) == (error.status_code, error.message, error.url)
+        assert str(restored) == str(error)
+
+def test_retries_429_then_succeeds(fake_strava):
+    fake_strava.throttle_next = 1
+    page = strava_client.get("/athlete/activities", "token", params={"page": 1, "per_page": 10})
+    assert len(page) == 10
+    assert fake_strava.stats["throttled"] == 1
+
+def test_429_updates_rate_limiter(fake_strava):
+    fake_strava.throttle_next = 1
+    strava_client.get("/athlete/activities", "token", params={"page": 1})
+    assert strava_client.rate_limiter.short_limit == fake_strava.rate_limit[0]
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(strava_client, "RATE_LIMIT_BACKOFF_S", 0.5)
+    delays = [strava_client._backoff(attempt) for attempt in range(10)]
+    assert delays[:3] == [0.5, 1.0, 2.0]
+    assert max(delays) == strava_client.RATE_LIMIT_MAX_BACKOFF_S
+    # Retry-After can only lengthen the wait
+    assert strava_client._backoff(0, "5") == 5.0
+    assert strava_client._backoff(3, "0") == 4.0
+    assert strava_client._backoff(0, "soon") == 0.5
+
+def test_network_errors_raise_api_error(monkeypatch):
+    class Unreachable:
+        def request(self, *args, **kwargs):
+            raise requests.ConnectionError("connection reset")
+
+    monkeypatch.setattr(strava_client, "get_session", lambda: Unreachable())
+    with pytest.raises(StravaAPIError) as error:
+        strava_client.get("/athlete", "token")
+    assert error.value.status_code is None
+    assert "connection reset" in str(error.value)
+
+def test_rate_limiter_paces_from_headers():
+    limiter = RateLimiter(soft_limit=0.75, hard_limit=0.95)
+    assert limiter.delay() == 0.0
+
+    limiter.update(rate_headers(50))
+    assert limiter.delay() == 0.0
+
+    # Past the soft limit, each caller gets its own later slot
+    limiter.update(rate_headers(80))
+    now = limiter.window_start + 60
+    first, second = limiter.delay(now), limiter.delay(now)
+    assert 0.0 <= first < second
+
+    # Past the hard limit, callers wait for the quota to reset
+    limiter.update(rate_headers(96))
+    assert limiter.delay(now) == pytest.approx(strava_client.RATE_LIMIT_WINDOW_S - 60)
+
+def test_rate_limiter_tracks_read_quota():
+    limiter = RateLimiter()
+    headers = dict(rate_headers(10), **{
+        "X-ReadRateLimit-Limit": "100,1000",
+        "X-ReadRateLimit-Usage": "90,90",
+    })
+    limiter.update(headers)
+    assert limiter.short_usage == 90
+
+def test_rate_limiter_daily_quota_exhausted():
+    limiter = RateLimiter()
+    limiter.update(rate_headers(10, daily_usage=1000))
+    with pytest.raises(StravaAPIError) as error:
+        limiter.delay()
+    assert error.value.status_code == 429
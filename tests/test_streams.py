@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from utils import streams as ustreams
+from utils import strava_client
+from utils.strava_client import StravaAPIError
+
+def recorded(fake_strava, **fields):
+    """
+    First activity with streams matching the given field predicates
+    """
+    for activity in fake_strava.activities:
+        if not activity.get("manual") and all(check(activity.get(name)) for name, check in fields.items()):
+            return activity
+    pytest.skip("no matching synthetic activity")
+
+@pytest.fixture
+def streams_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACTIVEDATA_STREAMS_DIR", str(tmp_path))
+    return tmp_path
+
+def test_fetch_streams_types_and_gaps(fake_strava):
+    activity = recorded(fake_strava, average_watts=lambda w: w is not None)
+    streams = ustreams.fetch_streams(activity["id"], "token")
+
+    assert set(streams) >= {"time", "distance", "latlng", "watts"}
+    for stream_type, data in streams.items():
+        assert data.dtype == ustreams.STREAM_DTYPES[stream_type]
+    assert streams["latlng"].shape == (len(streams["time"]), 2)
+    # The null gap in power is kept as NaN
+    assert np.isnan(streams["watts"]).sum() == 5
+
+def test_fetch_streams_key_selection(fake_strava):
+    activity = recorded(fake_strava, average_heartrate=lambda hr: hr is not None)
+    streams = ustreams.fetch_streams(activity["id"], "token", keys=("time", "heartrate"))
+    assert set(streams) == {"time", "heartrate"}
+
+def test_fetch_streams_missing_activity(fake_strava):
+    assert ustreams.fetch_streams(1, "token") == {}
+    manual = [a for a in fake_strava.activities if a.get("manual")]
+    if manual:
+        assert ustreams.fetch_streams(manual[0]["id"], "token") == {}
+
+def test_fetch_streams_retries_transient_429(fake_strava):
+    fake_strava.throttle_next = 2
+    streams = ustreams.fetch_streams(recorded(fake_strava)["id"], "token")
+    assert "time" in streams
+    assert fake_strava.stats["throttled"] == 2
+
+def test_fetch_streams_rate_limited(fake_strava):
+    fake_strava.throttle_rate = 1.0
+    with pytest.raises(StravaAPIError) as error:
+        ustreams.fetch_streams(recorded(fake_strava)["id"], "token")
+    assert error.value.status_code == 429
+    assert fake_strava.stats["throttled"] == strava_client.RATE_LIMIT_RETRIES + 1
+
+def test_store_round_trip(streams_dir):
+    store = ustreams.StreamStore(1)
+    saved = {
+        "time": np.arange(10, dtype=np.int32),
+        "watts": np.array([1, np.nan] * 5, dtype=np.float32),
+    }
+    store.save(5, saved)
+    store.save(6, {})
+
+    assert 5 in store and 6 in store and 7 not in store
+    loaded = store.load(5)
+    assert sorted(loaded.keys()) == ["time", "watts"]
+    assert loaded["time"].dtype == np.int32
+    np.testing.assert_array_equal(loaded["watts"], saved["watts"])
+    assert len(loaded) == 10
+    assert len(store.load(6)) == 0
+    assert store.load(7) is None
+
+def test_get_streams_fetches_each_activity_once(fake_strava, streams_dir):
+    ids = [a["id"] for a in fake_strava.activities[:10]]
+    missing = 1
+
+    stats = {}
+    streams = ustreams.get_streams("token", 1, ids + [missing], stats=stats)
+    assert stats == {"cached": 0, "fetched": 11, "failed": 0}
+    assert list(streams) == ids + [missing]
+    assert len(streams[missing]) == 0
+
+    before = fake_strava.snapshot()["streams"]
+    stats = {}
+    again = ustreams.get_streams("token", 1, ids + [missing], stats=stats)
+    assert stats == {"cached": 11, "fetched": 0, "failed": 0}
+    assert fake_strava.snapshot()["streams"] == before
+    np.testing.assert_array_equal(again[ids[0]]["time"], streams[ids[0]]["time"])
+
+def test_get_streams_does_not_cache_failures(fake_strava, streams_dir):
+    ids = [a["id"] for a in fake_strava.activities[:3]]
+    fake_strava.throttle_rate = 1.0
+    stats = {}
+    assert ustreams.get_streams("token", 1, ids, stats=stats) == {}
+    assert stats["failed"] == 3
+
+    fake_strava.throttle_rate = 0.0
+    stats = {}
+    assert len(ustreams.get_streams("token", 1, ids, stats=stats)) == 3
+    assert stats["fetched"] == 3
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from benchmarks.synthetic import make_athlete
+from utils import data_utils as dutil
+from utils.activity_index import ActivityIndex
+from utils.activity_table import ActivityTable
+from utils.telemetry import estimate_bytes
+
+def formatted(n=500):
+    return dutil.format_data(pd.DataFrame(make_athlete(n, seed=2)))
+
+def test_counts_arrays_inside_indexes():
+    df = formatted()
+    index = ActivityIndex(df)
+    arrays = index.order.nbytes + index.sorted_dates.nbytes + index.sport_codes.nbytes
+    assert estimate_bytes(index) >= estimate_bytes(df) + arrays
+
+def test_counts_cached_arrow_pages():
+    df = formatted()
+    table = ActivityTable(df)
+    before = estimate_bytes(table)
+    rows = table.rows("all", np.arange(len(df)))
+    page = table.page("all", rows, 0, 100)
+    assert isinstance(page, pa.Table)
+    assert estimate_bytes(table) >= before + rows.nbytes + page.nbytes
+
+def test_shared_objects_counted_once():
+    df = formatted()
+    index, table = ActivityIndex(df), ActivityTable(df)
+    seen = set()
+    shared = estimate_bytes(df, seen) + estimate_bytes(index, seen) + estimate_bytes(table, seen)
+    separate = estimate_bytes(df) + estimate_bytes(index) + estimate_bytes(table)
+    assert separate - shared == 2 * estimate_bytes(df)
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+class ActivityIndex:
+    """
+    Sorted date and sport type indexes over a formatted activity frame, built once
+    per data version so sidebar filters resolve through lookups instead of
+    boolean masks over the whole frame
+
+    Parameters:
+        df: DataFrame from format_data
+    """
+    def __init__(self, df):
+        self.df = df
+        dates = pd.to_datetime(df['Start Date']).to_numpy(dtype='datetime64[D]')
+        self.order = np.argsort(dates, kind='stable')
+        self.sorted_dates = dates[self.order]
+
+        codes, sport_types = pd.factorize(df['Sport Type'])
+        self.sport_codes = codes
+        self.sport_types = sport_types.tolist()
+
+        # Earliest date per sport type, used for the default start date
+        self.first_dates = {
+            sport_type: dates[codes == code].min()
+            for code, sport_type in enumerate(self.sport_types)
+        }
+        self._filtered = {}
+
+    def first_date(self, sport_types=None):
+        """
+        Earliest activity date for the given sport types (all by default)
+
+        Parameters:
+            sport_types: List of String
+
+        Returns:
+            first_date: datetime.date or None
+        """
+        if not sport_types:
+            dates = list(self.first_dates.values())
+        else:
+            dates = [self.first_dates[s] for s in sport_types if s in self.first_dates]
+        return pd.Timestamp(min(dates)).date() if dates else None
+
+    def positions(self, sport_types=None, start_date=None, end_date=None):
+        """
+        Row positions matching the filters, in the frame's original order
+
+        Parameters:
+            sport_types: List of String
+            start_date: datetime.date, inclusive
+            end_date: datetime.date, inclusive
+
+        Returns:
+            positions: int array
+        """
+        lo = 0 if start_date is None else np.searchsorted(self.sorted_dates, np.datetime64(start_date, 'D'), side='left')
+        hi = len(self.sorted_dates) if end_date is None else np.searchsorted(self.sorted_dates, np.datetime64(end_date, 'D'), side='right')
+        positions = self.order[lo:hi]
+
+        if sport_types:
+            codes = [self.sport_types.index(s) for s in sport_types if s in self.sport_types]
+            positions = positions[np.isin(self.sport_codes[positions], codes)]
+
+        return np.sort(positions)
+
+    def filter(self, sport_types=None, start_date=None, end_date=None):
+        """
+        Filtered view of the frame; recent filters are memoized
+
+        Parameters:
+            sport_types: List of String
+            start_date: datetime.date, inclusive
+            end_date: datetime.date, inclusive
+
+        Returns:
+            filtered_df: DataFrame
+        """
+        key = (tuple(sport_types or ()), start_date, end_date)
+        if key not in self._filtered:
+            if len(self._filtered) >= 16:
+                self._filtered.pop(next(iter(self._filtered)))
+            self._filtered[key] = self.df.iloc[self.positions(sport_types, start_date, end_date)]
+        return self._filtered[key]
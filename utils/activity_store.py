@@ -0,0 +1,138 @@
+import os
+import json
+import sqlite3
+import datetime
+
+DEFAULT_STORE_PATH = os.path.join(".activedata", "activities.db")
+
+# start_date_local is the athlete's wall clock time with a misleading 'Z' suffix,
+# so the 'after' filter (which Strava applies to UTC start times) is pulled back
+# by a day to cover any timezone offset. Overlap is removed by the upsert.
+WATERMARK_OVERLAP_S = 24 * 60 * 60
+
+def get_store_path():
+    """
+    Location of the SQLite activity store, overridable with ACTIVEDATA_STORE_PATH
+
+    Returns:
+        path: String
+    """
+    return os.environ.get("ACTIVEDATA_STORE_PATH", DEFAULT_STORE_PATH)
+
+def connect(path=None):
+    """
+    Opens the activity store, creating the file and tables if needed
+
+    Parameters:
+        path: String
+
+    Returns:
+        conn: sqlite3 Connection
+    """
+    path = path or get_store_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS activities (
+            athlete_id INTEGER NOT NULL,
+            activity_id INTEGER NOT NULL,
+            start_date_local TEXT,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (athlete_id, activity_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            athlete_id INTEGER PRIMARY KEY,
+            watermark TEXT,
+            synced_at TEXT
+        )
+    """)
+    return conn
+
+def get_watermark(athlete_id, path=None):
+    """
+    Newest start_date_local stored for an athlete
+
+    Parameters:
+        athlete_id: int
+        path: String
+
+    Returns:
+        watermark: String or None
+    """
+    with connect(path) as conn:
+        row = conn.execute("SELECT watermark FROM sync_state WHERE athlete_id = ?", (athlete_id,)).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def watermark_to_epoch(watermark):
+    """
+    Converts a start_date_local watermark into the epoch used by the 'after' parameter
+
+    Parameters:
+        watermark: String
+
+    Returns:
+        after: int
+    """
+    start = datetime.datetime.fromisoformat(watermark.replace("Z", "+00:00"))
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=datetime.timezone.utc)
+    return int(start.timestamp()) - WATERMARK_OVERLAP_S
+
+def load_activities(athlete_id, path=None):
+    """
+    Loads all stored activities for an athlete, most recent first
+
+    Parameters:
+        athlete_id: int
+        path: String
+
+    Returns:
+        activities: List of Dict
+    """
+    with connect(path) as conn:
+        rows = conn.execute(
+            "SELECT payload FROM activities WHERE athlete_id = ? ORDER BY start_date_local DESC",
+            (athlete_id,)
+        ).fetchall()
+    conn.close()
+    return [json.loads(row[0]) for row in rows]
+
+def save_activities(athlete_id, activities, path=None):
+    """
+    Upserts activities for an athlete and advances the watermark
+
+    Parameters:
+        athlete_id: int
+        activities: List of Dict
+        path: String
+
+    Returns:
+        watermark: String or None
+    """
+    rows = [
+        (athlete_id, activity["id"], activity.get("start_date_local"), json.dumps(activity))
+        for activity in activities
+    ]
+    dates = [row[2] for row in rows if row[2]]
+
+    with connect(path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO activities (athlete_id, activity_id, start_date_local, payload) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        previous = conn.execute("SELECT watermark FROM sync_state WHERE athlete_id = ?", (athlete_id,)).fetchone()
+        candidates = dates + ([previous[0]] if previous and previous[0] else [])
+        watermark = max(candidates) if candidates else None
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_state (athlete_id, watermark, synced_at) VALUES (?, ?, ?)",
+            (athlete_id, watermark, datetime.datetime.now(datetime.timezone.utc).isoformat())
+        )
+    conn.close()
+    return watermark
@@ -0,0 +1,131 @@
+import os
+import tempfile
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.data_utils import add_activity_links
+
+# Columns kept out of the table; the id is shown as a link instead
+HIDDEN_COLUMNS = ['Activity ID', 'Photos']
+EXPORT_CHUNK_ROWS = 10000
+
+class ActivityTable:
+    """
+    Server-side windowed view over a formatted activity frame, built once per
+    data version. Search and sort run here and only the visible page of rows
+    is converted to Arrow and sent to the browser. Recent row orders and page
+    slices are memoized
+
+    Parameters:
+        df: DataFrame from format_data
+        max_pages: int, Arrow page slices kept
+    """
+    def __init__(self, df, max_pages=32):
+        self.df = df
+        self.columns = [c for c in df.columns if c not in HIDDEN_COLUMNS] + ["Activity Link"]
+        self.sort_columns = [c for c in df.columns if c not in HIDDEN_COLUMNS]
+        self._names = df['Name'].str.lower().to_numpy(dtype=object, na_value="")
+        self.max_pages = max_pages
+        self._rows = OrderedDict()
+        self._pages = OrderedDict()
+
+    def rows(self, filter_key, positions, search="", sort_by="Start Date", ascending=False):
+        """
+        Row positions matching a name search, in display order
+
+        Parameters:
+            filter_key: hashable identifying positions, e.g. the sidebar filter
+            positions: int array from ActivityIndex.positions
+            search: String, case-insensitive substring of the activity name
+            sort_by: String, column name
+            ascending: bool
+
+        Returns:
+            rows: int array of positions into df
+        """
+        key = (filter_key, search.strip().lower(), sort_by, ascending)
+        if key in self._rows:
+            self._rows.move_to_end(key)
+            return self._rows[key]
+
+        rows = np.asarray(positions)
+        if key[1]:
+            matches = pd.Series(self._names[rows]).str.contains(key[1], regex=False)
+            rows = rows[matches.to_numpy()]
+        if sort_by is not None:
+            values = self.df[sort_by].iloc[rows].reset_index(drop=True)
+            order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+            rows = rows[order]
+
+        self._rows[key] = rows
+        while len(self._rows) > 16:
+            self._rows.popitem(last=False)
+        return rows
+
+    def frame(self, rows):
+        """
+        Display columns for the given rows, with Strava links
+        """
+        return add_activity_links(self.df.iloc[rows])[self.columns]
+
+    def page(self, rows_key, rows, page, page_size):
+        """
+        One page of rows as an Arrow table
+
+        Parameters:
+            rows_key: hashable identifying rows, e.g. the arguments to rows()
+            rows: int array from rows()
+            page: int, zero-based
+            page_size: int
+
+        Returns:
+            table: pyarrow Table
+        """
+        key = (rows_key, page, page_size)
+        if key in self._pages:
+            self._pages.move_to_end(key)
+            return self._pages[key]
+
+        window = rows[page * page_size:(page + 1) * page_size]
+        table = pa.Table.from_pandas(self.frame(window), preserve_index=False)
+        self._pages[key] = table
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return table
+
+    def export(self, rows, file_format="csv", chunk_rows=EXPORT_CHUNK_ROWS):
+        """
+        Writes the given rows chunk by chunk to a temporary file, so only one
+        chunk is ever converted at a time, and returns its contents. Only the
+        conversion is chunked: st.download_button holds the whole payload in
+        memory either way, so it is returned as bytes
+
+        Parameters:
+            rows: int array from rows()
+            file_format: String, 'csv' or 'parquet'
+            chunk_rows: int
+
+        Returns:
+            data: bytes
+        """
+        with tempfile.NamedTemporaryFile(suffix=f".{file_format}", delete=False) as output:
+            path = output.name
+            if file_format == "parquet":
+                writer = None
+                for start in range(0, max(len(rows), 1), chunk_rows):
+                    table = pa.Table.from_pandas(self.frame(rows[start:start + chunk_rows]), preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output, table.schema)
+                    writer.write_table(table)
+                writer.close()
+            else:
+                for start in range(0, max(len(rows), 1), chunk_rows):
+                    chunk = self.frame(rows[start:start + chunk_rows])
+                    output.write(chunk.to_csv(index=False, header=start == 0).encode())
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(path)
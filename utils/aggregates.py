@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+# Cube measure -> formatted column; each is stored as a sum plus a count of
+# non-null values so both totals and pandas-style means can be answered
+summed_columns = {
+    "moving_time": "Moving Time (s)",
+    "distance": "Distance (km)",
+    "elevation": "Elevation Gain (m)",
+    "average_speed": "Average Speed (km/h)",
+}
+
+# Cells per block of stored max speeds; a range max scans at most two partial
+# blocks and takes the stored maximum of every whole block between them
+MAX_BLOCK = 64
+
+class ActivityCube:
+    """
+    Precomputed sport type x day aggregates over a formatted activity frame.
+    Only (sport type, day) cells with activities are stored, sorted by sport
+    type then day, so memory grows with the number of activities rather than
+    with the span of days. Sums are stored as prefix sums over the cells and
+    max speed as per-cell maxima with block maxima, so a sport/date-range query
+    costs two binary searches per sport type for the sums
+
+    Parameters:
+        df: DataFrame from format_data
+    """
+    def __init__(self, df):
+        days = pd.to_datetime(df['Start Date']).to_numpy(dtype='datetime64[D]')
+        codes, sport_types = pd.factorize(df['Sport Type'])
+        self.sport_types = sport_types.tolist()
+
+        self.first_day = days.min() if len(days) else np.datetime64('today', 'D')
+        n_days = int((days.max() - self.first_day).astype(int)) + 1 if len(days) else 1
+        self.n_days = n_days
+
+        # Cell key sport * n_days + day; keys are sorted, so each sport's days are contiguous
+        day_index = (days - self.first_day).astype(np.int64)
+        self.keys, cell = np.unique(codes * n_days + day_index, return_inverse=True)
+        n_cells = len(self.keys)
+
+        def prefix(weights=None, dtype=np.float64):
+            daily = np.bincount(cell, weights=weights, minlength=n_cells)
+            return np.concatenate(([0], np.cumsum(daily))).astype(dtype)
+
+        self.prefix = {"count": prefix(dtype=np.int32)}
+        for measure, column in summed_columns.items():
+            values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            present = ~np.isnan(values)
+            self.prefix[measure] = prefix(np.where(present, values, 0.0))
+            # Columns without gaps share the activity counts
+            self.prefix[measure + "_count"] = self.prefix["count"] if present.all() else prefix(present, dtype=np.int32)
+
+        max_speed = df['Max Speed (km/h)'].to_numpy(dtype=np.float64, na_value=np.nan)
+        present = ~np.isnan(max_speed)
+        self.cell_max = np.full(n_cells, -np.inf)
+        np.maximum.at(self.cell_max, cell[present], max_speed[present])
+        self.block_max = np.maximum.reduceat(self.cell_max, np.arange(0, n_cells, MAX_BLOCK)) if n_cells else self.cell_max
+
+    def _sport_rows(self, sport_types):
+        if sport_types is None:
+            return np.arange(len(self.sport_types))
+        return np.array([self.sport_types.index(s) for s in sport_types if s in self.sport_types], dtype=np.int64)
+
+    def _day_range(self, start_date, end_date):
+        lo = 0 if start_date is None else int((np.datetime64(start_date, 'D') - self.first_day).astype(int))
+        hi = self.n_days if end_date is None else int((np.datetime64(end_date, 'D') - self.first_day).astype(int)) + 1
+        return max(lo, 0), min(hi, self.n_days)
+
+    def _cells(self, rows, lo, hi):
+        """
+        Cell ranges [start, end) holding days [lo, hi) of each sport row
+        """
+        starts = np.searchsorted(self.keys, rows * self.n_days + lo, side="left")
+        ends = np.searchsorted(self.keys, rows * self.n_days + hi, side="left")
+        return starts, ends
+
+    def _range_max(self, start, end):
+        first_block, last_block = -(-start // MAX_BLOCK), end // MAX_BLOCK
+        if first_block >= last_block:
+            return self.cell_max[start:end].max(initial=-np.inf)
+        return max(
+            self.cell_max[start:first_block * MAX_BLOCK].max(initial=-np.inf),
+            self.block_max[first_block:last_block].max(),
+            self.cell_max[last_block * MAX_BLOCK:end].max(initial=-np.inf),
+        )
+
+    def query(self, sport_types=None, start_date=None, end_date=None):
+        """
+        Totals for the given sport types between two dates, inclusive
+
+        Parameters:
+            sport_types: List of String, or None for all sport types
+            start_date: datetime.date
+            end_date: datetime.date
+
+        Returns:
+            totals: Dict with 'count', '<measure>' sums, '<measure>_mean' and 'max_speed'
+        """
+        rows = self._sport_rows(sport_types)
+        lo, hi = self._day_range(start_date, end_date)
+        empty = hi <= lo or len(rows) == 0
+        starts, ends = self._cells(rows, lo, hi) if not empty else (rows[:0], rows[:0])
+
+        def range_sum(measure):
+            if empty:
+                return 0.0
+            table = self.prefix[measure]
+            return float(table[ends].sum() - table[starts].sum())
+
+        totals = {"count": int(range_sum("count"))}
+        for measure in summed_columns:
+            total, count = range_sum(measure), range_sum(measure + "_count")
+            totals[measure] = total
+            totals[measure + "_mean"] = total / count if count else np.nan
+
+        max_speed = max((self._range_max(start, end) for start, end in zip(starts.tolist(), ends.tolist())), default=-np.inf)
+        totals["max_speed"] = float(max_speed) if np.isfinite(max_speed) else np.nan
+
+        return totals
+
+    def daily(self, measure, sport_types=None, start_date=None, end_date=None):
+        """
+        Per-day totals of a measure for the given sport types between two dates,
+        inclusive, for the days with activities
+
+        Parameters:
+            measure: String, 'count' or a key of summed_columns
+            sport_types: List of String, or None for all sport types
+            start_date: datetime.date
+            end_date: datetime.date
+
+        Returns:
+            days: datetime64[D] array
+            values: float array
+        """
+        rows = self._sport_rows(sport_types)
+        lo, hi = self._day_range(start_date, end_date)
+        if hi <= lo or len(rows) == 0:
+            return np.array([], dtype='datetime64[D]'), np.array([])
+
+        starts, ends = self._cells(rows, lo, hi)
+        cells = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        per_cell = np.diff(self.prefix[measure].astype(np.float64))[cells]
+        day_index, inverse = np.unique(self.keys[cells] % self.n_days, return_inverse=True)
+        values = np.bincount(inverse, weights=per_cell, minlength=len(day_index))
+        return self.first_day + day_index, values
+
+def calendar_grid(days, values, year):
+    """
+    Scatters daily values into a month x day-of-month grid for one year
+
+    Parameters:
+        days: datetime64[D] array
+        values: float array
+        year: int
+
+    Returns:
+        grid: float array of shape (12, 31); days that don't exist are 0
+    """
+    in_year = days.astype('datetime64[Y]').astype(int) + 1970 == year
+    days, values = days[in_year], values[in_year]
+
+    months = days.astype('datetime64[M]')
+    month_index = months.astype(int) % 12
+    day_index = (days - months.astype('datetime64[D]')).astype(int)
+
+    grid = np.zeros((12, 31))
+    np.add.at(grid, (month_index, day_index), values)
+    return grid
@@ -0,0 +1,32 @@
+import base64
+import functools
+
+# Static files never change while the app runs, so each is read and encoded
+# once per process and shared by every session
+
+@functools.lru_cache(maxsize=None)
+def read_asset(path):
+    """
+    Contents of a static asset
+
+    Parameters:
+        path: String, e.g. 'assets/logo.png'
+
+    Returns:
+        data: bytes
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+@functools.lru_cache(maxsize=None)
+def get_base64_image(image_path):
+    """
+    Base64 encoding of an image, for embedding in HTML
+
+    Parameters:
+        image_path: String
+
+    Returns:
+        encoded: String
+    """
+    return base64.b64encode(read_asset(image_path)).decode()
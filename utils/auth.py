@@ -1,9 +1,7 @@
 import urllib
-import urllib3
-import requests
 import os
-
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from utils import strava_client
+from utils.telemetry import traced
 
 def get_authorization_url(app_url, client_id):
     """
@@ -24,10 +22,11 @@ def get_authorization_url(app_url, client_id):
         "approval_prompt": "force"
     }
     values_url = urllib.parse.urlencode(params)
-    base_url = 'https://www.strava.com/oauth/authorize'
+    base_url = strava_client.OAUTH_URL + '/authorize'
     auth_url = base_url + '?' + values_url
     return auth_url
 
+@traced("auth.request_access_token")
 def request_access_token(client_id, client_secret, auth_code):
     """
     Post request to refresh and get new API access token
@@ -40,7 +39,7 @@ def request_access_token(client_id, client_secret, auth_code):
     Returns:
         access_token: Dict
     """
-    auth_url = "https://www.strava.com/oauth/token"
+    auth_url = strava_client.OAUTH_URL + "/token"
     payload = {
         'client_id': client_id,
         'client_secret': client_secret,
@@ -49,10 +48,11 @@ def request_access_token(client_id, client_secret, auth_code):
         'f': 'json'
     }
     os.write(1, "\nRequesting Access Token...".encode())
-    res = requests.post(auth_url, data=payload, verify=False)
+    res = strava_client.request("POST", auth_url, check=False, data=payload)
     access_token = res.json()
     return access_token
 
+@traced("auth.refresh_access_token")
 def refresh_access_token(client_id, client_secret, refresh_token):
     """
     Post request to refresh and get new API access token
@@ -65,7 +65,7 @@ def refresh_access_token(client_id, client_secret, refresh_token):
     Returns:
         access_token: Dict
     """
-    auth_url = "https://www.strava.com/oauth/token"
+    auth_url = strava_client.OAUTH_URL + "/token"
     payload = {
         'client_id': client_id,
         'client_secret': client_secret,
@@ -74,6 +74,6 @@ def refresh_access_token(client_id, client_secret, refresh_token):
         'f': 'json'
     }
     os.write(1, "\nRefreshing Access Token...".encode())
-    res = requests.post(auth_url, data=payload, verify=False)
+    res = strava_client.request("POST", auth_url, check=False, data=payload)
     access_token = res.json()
     return access_token
\ No newline at end of file
@@ -0,0 +1,268 @@
+import io
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+DEFAULT_CACHE_DIR = os.path.join(".activedata", "cache")
+
+class MemoryCache:
+    """
+    In-process LRU of serialized payloads with a time-to-live and a total size cap
+
+    Parameters:
+        max_bytes: int
+        ttl: float, seconds
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=60 * 60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                self._entries.pop(key)
+                self.nbytes -= len(value)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous[1])
+            self._entries[key] = (time.time() + (ttl or self.ttl), value)
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+class DiskCache:
+    """
+    Payloads stored as files in a local directory, expired by modification time.
+    Expired entries are deleted when read, and once the directory passes
+    max_bytes the expired and then the oldest entries are removed. Replicas
+    sharing a volume share the cache
+
+    Parameters:
+        directory: String
+        ttl: float, seconds
+        max_bytes: int
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=24 * 60 * 60, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Approximate, since other replicas may write too; recounted on every cleanup
+        self.nbytes = sum(size for _, _, size in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _entries(self):
+        """
+        Yields (path, modified time, size) for every stored payload
+        """
+        for entry in os.scandir(self.directory):
+            if "." in entry.name:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield entry.path, stat.st_mtime, stat.st_size
+
+    def _remove(self, path):
+        """
+        Deletes an entry, returning the payload bytes freed
+        """
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            size = 0
+        try:
+            os.remove(path + ".expires")
+        except FileNotFoundError:
+            pass
+        return size
+
+    def _read_expires(self, path):
+        try:
+            with open(path + ".expires") as f:
+                return float(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get(self, key):
+        path = self._path(key)
+        expires = self._read_expires(path)
+        if expires is None:
+            return None
+        if expires < time.time():
+            removed = self._remove(path)
+            with self._lock:
+                self.nbytes -= removed
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            previous = os.path.getsize(path)
+        except FileNotFoundError:
+            previous = 0
+        # Write then rename so concurrent readers never see a partial file
+        for target, content in ((path, value), (path + ".expires", str(time.time() + (ttl or self.ttl)).encode())):
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, target)
+        with self._lock:
+            self.nbytes += len(value) - previous
+            over = self.nbytes > self.max_bytes
+        if over:
+            self.cleanup()
+
+    def cleanup(self):
+        """
+        Deletes expired entries, then the oldest written until the directory is
+        back under 90% of max_bytes
+
+        Returns:
+            removed: int, entries deleted
+        """
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        kept = []
+        for path, _, size in entries:
+            expires = self._read_expires(path)
+            if expires is not None and expires < now:
+                total -= self._remove(path)
+                removed += 1
+            else:
+                kept.append((path, size))
+        for path, size in kept:
+            if total <= target:
+                break
+            total -= self._remove(path)
+            removed += 1
+        with self._lock:
+            self.nbytes = total
+        return removed
+
+class RedisCache:
+    """
+    Payloads stored in Redis, shared by every replica pointing at the same server
+
+    Parameters:
+        url: String, e.g. redis://localhost:6379/0
+        ttl: float, seconds
+    """
+    def __init__(self, url, ttl=24 * 60 * 60):
+        if redis is None:
+            raise ImportError("The redis package is required for a redis:// cache URL")
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        try:
+            return self.client.get("activedata:" + key)
+        except redis.RedisError as e:
+            print(f"\nError reading from cache: {e}")
+            return None
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.client.set("activedata:" + key, value, ex=int(ttl or self.ttl))
+        except redis.RedisError as e:
+            print(f"\nError writing to cache: {e}")
+
+class TieredCache:
+    """
+    Checks each tier in order and backfills faster tiers on a hit
+
+    Parameters:
+        tiers: List of caches, fastest first
+    """
+    def __init__(self, tiers):
+        self.tiers = tiers
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value, ttl=None):
+        for tier in self.tiers:
+            tier.set(key, value, ttl=ttl)
+
+    def get_frame(self, key):
+        """
+        Returns a cached DataFrame, or None on a miss
+        """
+        value = self.get(key)
+        return None if value is None else pd.read_parquet(io.BytesIO(value))
+
+    def set_frame(self, key, df, ttl=None):
+        """
+        Caches a DataFrame serialized as Parquet
+        """
+        buffer = io.BytesIO()
+        df.to_parquet(buffer)
+        self.set(key, buffer.getvalue(), ttl=ttl)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """
+    Process-wide cache: in-memory LRU in front of Redis when ACTIVEDATA_CACHE_URL
+    is a redis:// URL, otherwise in front of a disk cache in ACTIVEDATA_CACHE_DIR
+
+    Returns:
+        cache: TieredCache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            url = os.environ.get("ACTIVEDATA_CACHE_URL", "")
+            if url.startswith("redis://") or url.startswith("rediss://"):
+                shared = RedisCache(url)
+            else:
+                shared = DiskCache(os.environ.get("ACTIVEDATA_CACHE_DIR", DEFAULT_CACHE_DIR))
+            _cache = TieredCache([MemoryCache(), shared])
+    return _cache
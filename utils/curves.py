@@ -0,0 +1,209 @@
+import io
+import os
+import warnings
+import threading
+import multiprocessing
+import concurrent.futures
+import numpy as np
+from utils.cache import get_cache
+from utils.streams import ActivityStreams
+
+# Best-effort durations in seconds, log spaced from 1 s to 2 h
+DURATIONS = np.unique(np.round(np.geomspace(1, 2 * 60 * 60, 48)).astype(np.int64))
+CURVE_KINDS = ("power", "speed")
+
+# Bump when the computation changes so cached curves are recomputed
+CURVE_VERSION = 1
+CURVE_TTL_S = 90 * 24 * 60 * 60
+
+# Pace curves only make sense for running; rides and skiing would dominate them
+PACE_SPORT_TYPES = ("Run", "TrailRun", "VirtualRun")
+
+# Longer gaps than this are treated as the end of the recording
+MAX_SECONDS = 24 * 60 * 60
+
+def mean_max(values, durations=DURATIONS):
+    """
+    Best average of a 1 Hz series over every duration. Each duration is one
+    vectorized pass over the cumulative sum, so the cost is O(n) per duration
+    rather than O(n * d) for a sliding window
+
+    Parameters:
+        values: float array sampled at 1 Hz
+        durations: int array, seconds
+
+    Returns:
+        curve: float array, NaN for durations longer than the series
+    """
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    curve = np.full(len(durations), np.nan)
+    for i, duration in enumerate(durations):
+        if duration >= len(cumulative):
+            break
+        curve[i] = (cumulative[duration:] - cumulative[:-duration]).max() / duration
+    return curve
+
+def _seconds(time):
+    time = np.asarray(time, dtype=np.int64)
+    seconds = time - time[0]
+    keep = seconds <= MAX_SECONDS
+    return seconds[keep], keep
+
+def compute_curves(streams, durations=DURATIONS):
+    """
+    Power and speed curves for one activity
+
+    Parameters:
+        streams: Mapping of stream type -> array, e.g. ActivityStreams
+        durations: int array, seconds
+
+    Returns:
+        curves: float array of shape (2, len(durations)), rows in CURVE_KINDS order
+    """
+    curves = np.full((len(CURVE_KINDS), len(durations)), np.nan)
+    if "time" not in streams or len(streams["time"]) < 2:
+        return curves
+    seconds, keep = _seconds(streams["time"])
+
+    if "watts" in streams:
+        # Gaps in the recording count as zero power
+        power = np.zeros(seconds[-1] + 1)
+        power[seconds] = np.nan_to_num(streams["watts"][keep])
+        curves[0] = mean_max(power, durations)
+
+    if "distance" in streams:
+        # Distance is interpolated across gaps, so speed is taken over elapsed time
+        distance = np.interp(np.arange(seconds[-1] + 1), seconds, streams["distance"][keep])
+        curves[1] = mean_max(np.diff(distance, prepend=distance[0]), durations)
+
+    return curves
+
+def _compute_chunk(paths):
+    """
+    Worker entry point: computes curves for a chunk of cached stream files
+    """
+    results = []
+    for path in paths:
+        streams = ActivityStreams(path)
+        try:
+            results.append(compute_curves(streams))
+        finally:
+            streams.close()
+    return results
+
+_pool = None
+_pool_lock = threading.Lock()
+POOL_START_TIMEOUT_S = 60
+
+def start_pool(max_workers=None):
+    """
+    Starts the process-wide worker pool and all of its workers. Called once at
+    app startup, before Streamlit runs any script: a spawned worker first
+    re-runs __main__ from its file, and during a script run that is the app.
+    Nothing starts workers later, so reruns never do
+
+    Parameters:
+        max_workers: int, defaults to the CPU count
+
+    Returns:
+        pool: ProcessPoolExecutor
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = max_workers or os.cpu_count() or 1
+            # Forking the threaded Streamlit server can deadlock in the child
+            context = multiprocessing.get_context("spawn")
+            # Workers are otherwise spawned one per submit as needed; each
+            # waits here until all have started
+            started = context.Barrier(max_workers + 1)
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=context,
+                initializer=started.wait, initargs=(POOL_START_TIMEOUT_S,),
+            )
+            for _ in range(max_workers):
+                pool.submit(int)
+            started.wait(POOL_START_TIMEOUT_S)
+            _pool = pool
+        return _pool
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _curve_key(athlete_id, activity_id):
+    return f"curve:{CURVE_VERSION}:{athlete_id}:{activity_id}"
+
+def activity_curves(athlete_id, streams, chunk_size=32):
+    """
+    Per-activity curves, computing only those not already in the shared cache.
+    Curves never change once an activity is recorded, so a new activity costs
+    one computation. Large batches are split into chunks across the shared
+    process pool when one was started, and computed inline otherwise
+
+    Parameters:
+        athlete_id: int
+        streams: Dict of activity id -> ActivityStreams from get_streams
+        chunk_size: int, activities per worker task
+
+    Returns:
+        curves: Dict of activity id -> float array of shape (2, len(DURATIONS))
+    """
+    cache = get_cache()
+    curves = {}
+    missing = []
+    for activity_id in streams:
+        cached = cache.get(_curve_key(athlete_id, activity_id))
+        if cached is None:
+            missing.append(activity_id)
+        else:
+            curves[activity_id] = np.load(io.BytesIO(cached))
+
+    if not missing:
+        return curves
+
+    print(f"\nComputing best-effort curves for {len(missing)} activities...")
+    paths = [streams[a].path for a in missing]
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    pool = _pool
+    if len(chunks) == 1 or pool is None:
+        results = _compute_chunk(paths)
+    else:
+        try:
+            chunk_results = pool.map(_compute_chunk, chunks)
+            results = [curve for chunk in chunk_results for curve in chunk]
+        except concurrent.futures.process.BrokenProcessPool as e:
+            # A worker died (e.g. killed for memory); compute inline from now on
+            print(f"\nError computing curves in worker processes: {e}")
+            _discard_pool(pool)
+            results = _compute_chunk(paths)
+
+    for activity_id, curve in zip(missing, results):
+        buffer = io.BytesIO()
+        np.save(buffer, curve)
+        cache.set(_curve_key(athlete_id, activity_id), buffer.getvalue(), ttl=CURVE_TTL_S)
+        curves[activity_id] = curve
+    return curves
+
+def best_curve(curves, kind):
+    """
+    Best effort at each duration across activities
+
+    Parameters:
+        curves: Dict from activity_curves
+        kind: String, one of CURVE_KINDS
+
+    Returns:
+        durations: int array, seconds
+        values: float array, watts or m/s; NaN where no activity is long enough
+    """
+    if not curves:
+        return DURATIONS, np.full(len(DURATIONS), np.nan)
+    stacked = np.stack([curve[CURVE_KINDS.index(kind)] for curve in curves.values()])
+    with warnings.catch_warnings():
+        # All-NaN columns are expected for durations longer than every activity
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return DURATIONS, np.nanmax(stacked, axis=0)
@@ -17,6 +17,29 @@ column_rename_map = {
         "max_heartrate": "Max Heart Rate (bpm)",
         "elev_high": "Max Elevation (m)",
         "elev_low": "Min Elevation (m)",
-        "map": "Map",
         "total_photo_count": "Photos"
-    }
\ No newline at end of file
+    }
+
+column_dtype_map = {
+        "Activity ID": "int64",
+        "Name": "string",
+        "Distance (km)": "float32",
+        "Moving Time (s)": "Int32",
+        "Elapsed Time (s)": "Int32",
+        "Elevation Gain (m)": "float32",
+        "Sport Type": "category",
+        "Start Date": "datetime64[s]",
+        "Average Speed (km/h)": "float32",
+        "Max Speed (km/h)": "float32",
+        "Average Cadence (rpm)": "float32",
+        "Average Watts": "float32",
+        "Max Watts": "Int32",
+        "Energy (kJ)": "float32",
+        "Average Heart Rate (bpm)": "float32",
+        "Max Heart Rate (bpm)": "float32",
+        "Max Elevation (m)": "float32",
+        "Min Elevation (m)": "float32",
+        "Photos": "Int32"
+    }
+
+activity_link_prefix = "https://www.strava.com/activities/"
\ No newline at end of file
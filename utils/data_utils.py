@@ -1,52 +1,24 @@
+import io
 import base64
+import hashlib
 import streamlit as st
+import numpy as np
 import pandas as pd
-import requests
-import polyline
-import matplotlib.pyplot as plt
-import seaborn as sns
-import concurrent.futures
-from utils.data_mappings import column_rename_map
+from utils import activity_store
+from utils import strava_client
+from utils.cache import get_cache
+from utils.telemetry import span, traced
+from utils.pagination import fetch_pages
+from utils.route_utils import choose_level, rasterize_routes
+from utils.data_mappings import column_rename_map, column_dtype_map, activity_link_prefix
 
-def connect_to_db(client, database_name="activedata", collection_name="signins"):
-    """
-    Connects to a MongoDB database and collection
-    
-    Parameters:
-        client: pymongo MongoClient
-        database_name: string
-        collection_name: string 
-    Returns:
-        collection: pymongo Collection
-    """
-    try:
-        db = client.get_database(database_name)
-        collection = db.get_collection(collection_name)
-        print(f"\nConnected to {db.name} database.")
-    except Exception as e:
-        print(f"\nError connecting to database: {e}")
-        collection = None
-
-    return collection
-
-def add_to_db(collection, data):
-    """
-    Adds a document to the specified MongoDB collection
-
-    Parameters:
-        collection: pymongo Collection
-        data: Dict
-    
-    Returns:
-        result: InsertOneResult
-    """
-    try:
-        result = collection.insert_one(data)
-        print(f"\nDocument inserted with id: {result.inserted_id}")
-    except Exception as e:
-        print(f"\nError inserting document: {e}")
+# How long a sync is trusted before a new session checks Strava for new activities
+SYNC_TTL_S = 5 * 60
+# Raw fields derived data is built from; a change to any of them changes the data version
+version_columns = list(column_rename_map) + ['commute']
 
 @st.cache_data(show_spinner=False)
+@traced("get_athlete")
 def get_athlete(access_token):
     """
     Get request for athlete stats
@@ -57,65 +29,146 @@ def get_athlete(access_token):
     Returns:
         athlete: Dict
     """
-    auth_url = "https://www.strava.com/api/v3/athlete"
-    header = {'Authorization': 'Bearer ' + access_token}
     print("\nGetting Athlete...")
-    res = requests.get(auth_url, headers=header, verify=False)
-    athlete = res.json()
+    athlete = strava_client.get("/athlete", access_token)
     return athlete
 
-def fetch_page(page_num, activities_url, header):
+def fetch_page(page_num, access_token, after=None):
     """
     Fetch a single page of activities
     """
     param = {'per_page': 200, 'page': page_num}
-    response = requests.get(activities_url, headers=header, params=param)
-    return response.json()
+    if after is not None:
+        param['after'] = after
+    with span("fetch_page", page=page_num, incremental=after is not None) as attrs:
+        activities = strava_client.get("/athlete/activities", access_token, params=param)
+        attrs['activities'] = len(activities)
+    return activities
 
-@st.cache_data(show_spinner=False)
-def get_activity_data(access_token):
+def stream_activities(access_token, after=None, status_placeholder=None):
     """
-    Get request for Strava user activity data 
+    Generator of activity pages, in page order, as they arrive. Optionally only
+    activities started after an epoch
 
     Parameters:
         access_token: String
-    
+        after: int
+        status_placeholder: Streamlit placeholder
+
+    Yields:
+        page: List of Dict
+    """
+    total = 0
+    stats = {}
+    # An incremental sync is usually a single short page, so don't probe ahead
+    initial_window = 1 if after is not None else 2
+    fetch = lambda page_num: fetch_page(page_num, access_token, after=after)
+
+    for page_num, result in fetch_pages(fetch, per_page=200, initial_window=initial_window, stats=stats):
+        total += len(result)
+        if status_placeholder is not None:
+            status_placeholder.write(f'Fetched {total} activities so far...')
+        print(f'\n\t- Fetched page {page_num}, total activities: {total}')
+        yield result
+
+    print(f"\n\t- Activity requests: {stats['requests']} ({stats['pages']} non-empty pages)")
+
+def stream_activity_data(access_token, athlete_id, status_placeholder=None):
+    """
+    Generator form of get_activity_data: yields each page of newly fetched 
+    activities as it arrives, then saves them to the store and returns the full 
+    activity frame as the generator's return value
+
+    Parameters:
+        access_token: String
+        athlete_id: int
+        status_placeholder: Streamlit placeholder for progress messages
+
+    Yields:
+        page: List of Dict
+
     Returns:
         all_activities_df: DataFrame
     """
     print("\nGetting Activity Data...")
-    activities_url = "https://www.strava.com/api/v3/athlete/activities"
-    header = {'Authorization': 'Bearer ' + access_token}
-    all_activities_list = []
-
-    status_placeholder = st.empty()
-
-    # Fetch up to 10 pages in parallel (assuming max ~2000 activities)
-    max_pages = 10
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(fetch_page, page_num, activities_url, header) for page_num in range(1, max_pages + 1)]
-        for i, future in enumerate(concurrent.futures.as_completed(futures)):
-            result = future.result()
-            if len(result) > 0:
-                all_activities_list.extend(result)
-                status_placeholder.write(f'Fetched {len(all_activities_list)} activities so far...')
-                print(f'\n\t- Fetched page {i+1}, total activities: {len(all_activities_list)}')
-            else:
-                # If a page is empty, we can stop, but since concurrent, we continue
-                pass
-
-    # Sort activities by start_date_local descending (most recent first)
-    all_activities_list.sort(key=lambda x: x.get('start_date_local', ''), reverse=True)
-
-    status_placeholder.empty()
-    print("\nFinished Getting Data")
-    all_activities_df = pd.DataFrame(all_activities_list)
-    return all_activities_df
 
-@st.cache_data(show_spinner=False)
+    after = None
+    watermark = activity_store.get_watermark(athlete_id)
+    if watermark is not None:
+        print(f'\n\t- Syncing activities after {watermark}')
+        after = activity_store.watermark_to_epoch(watermark)
+
+    new_activities = []
+    for page in stream_activities(access_token, after=after, status_placeholder=status_placeholder):
+        new_activities.extend(page)
+        yield page
+
+    activity_store.save_activities(athlete_id, new_activities)
+    # The store returns activities sorted by start_date_local descending (most recent first)
+    all_activities_list = activity_store.load_activities(athlete_id)
+
+    if status_placeholder is not None:
+        status_placeholder.empty()
+    print(f"\nFinished Getting Data ({len(new_activities)} fetched, {len(all_activities_list)} total)")
+    return pd.DataFrame(all_activities_list)
+
+def get_activity_data(access_token, athlete_id, status_placeholder=None):
+    """
+    Get request for Strava user activity data. Activities are kept in a persistent
+    per-athlete store, so after the first login only newer activities are fetched
+
+    Parameters:
+        access_token: String
+        athlete_id: int
+        status_placeholder: Streamlit placeholder for progress messages
+    
+    Returns:
+        all_activities_df: DataFrame
+    """
+    return _drain(stream_activity_data(access_token, athlete_id, status_placeholder=status_placeholder))
+
+def _drain(stream, on_item=None):
+    """
+    Runs a generator to completion, passing each yielded item to on_item, and
+    returns its return value
+    """
+    while True:
+        try:
+            item = next(stream)
+        except StopIteration as done:
+            return done.value
+        if on_item is not None:
+            on_item(item)
+
+def get_data_version(df):
+    """
+    Fingerprint of the raw activity data, used to key anything derived from it.
+    Covers the activity ids and every field that format_data and get_route_info
+    read, so an edited activity (renamed, new sport type, cropped route) gets a
+    new version even though the set of ids is unchanged
+
+    Parameters:
+        df: DataFrame
+    
+    Returns:
+        data_version: String
+    """
+    if df.empty:
+        return "0"
+    fields = df.reindex(columns=version_columns)
+    if 'map' in df.columns:
+        fields['polyline'] = df['map'].str.get('summary_polyline')
+    # Hashed per row and ordered by id, so the version doesn't depend on row order
+    row_hashes = pd.util.hash_pandas_object(fields, index=False).to_numpy()
+    order = np.argsort(df['id'].to_numpy(dtype=np.int64), kind='stable')
+    digest = hashlib.sha1(row_hashes[order].tobytes()).hexdigest()
+    return f"{len(df)}-{digest[:12]}"
+
+@traced("format_data")
 def format_data(df):
     """
-    Formats activity data into clean standardized form 
+    Formats activity data into clean standardized form. Run once per data 
+    version rather than on every rerun
 
     Parameters:
         df: DataFrame
@@ -123,131 +176,228 @@ def format_data(df):
     Returns:
         df: DataFrame
     """
-    # Change sport type for all commute rides
-    df.loc[df['commute'] == True, 'sport_type'] = 'Commute'
-    
-    # Ensure all required columns exist
-    for col in column_rename_map.keys():
-        if col not in df.columns:
-            df[col] = None
-    
+    commute = (df['commute'] == True) if 'commute' in df.columns else pd.Series(False, index=df.index)
+
+    # Keep only mapped columns, adding any that are missing
     columns_to_keep = column_rename_map.keys()
-    df = df[list(columns_to_keep)]
+    df = df.reindex(columns=list(columns_to_keep))
+
+    # Change sport type for all commute rides
+    df.loc[commute, 'sport_type'] = 'Commute'
+
     df = df.rename(columns=column_rename_map)
 
     # Convert units
-    df['Distance (km)'] = df['Distance (km)'] / 1000
-    df['Average Speed (km/h)'] = df['Average Speed (km/h)'] * 3.6
-    df['Max Speed (km/h)'] = df['Max Speed (km/h)'] * 3.6
-    df['Start Date'] = pd.to_datetime(df['Start Date']).dt.date
+    df['Distance (km)'] = pd.to_numeric(df['Distance (km)']) / 1000
+    df['Average Speed (km/h)'] = pd.to_numeric(df['Average Speed (km/h)']) * 3.6
+    df['Max Speed (km/h)'] = pd.to_numeric(df['Max Speed (km/h)']) * 3.6
+    df['Start Date'] = pd.to_datetime(df['Start Date'], utc=True).dt.tz_localize(None).dt.normalize()
 
-    df['Activity Link'] = "https://www.strava.com/activities/" + df['Activity ID'].astype(str)
+    df = df.astype(column_dtype_map)
 
     return df
 
-def get_polylines(df):
+def add_activity_links(df):
     """
-    Decodes polylines and formats into DataFrame usable with PyDeck PathLayer
+    Adds Strava links for the rows about to be displayed, rather than storing 
+    a link string for every activity
 
     Parameters:
         df: DataFrame
     
     Returns:
-        polylines_df: DataFrame with 'name', 'description', 'path'
+        df: DataFrame
     """
-    print('Getting polylines...')
-    rows = []
-    for index, row in df.iterrows():
-        map_data = pd.DataFrame([row['map']])
-        polylines = map_data["summary_polyline"].values
-        if pd.isna(polylines[0]) or polylines[0] == '':
-            continue  # Skip if no polyline
-        coordinates = polyline.decode(polylines[0])
-        activity_name = row["name"]
-        distance = round(row["distance"] / 1000, 1)
-        elevation = round(row["total_elevation_gain"])
-        description = f"{activity_name}\n{distance} km\n{elevation} m"
-        
-        # Path as list of [lon, lat]
-        path = [[coord[1], coord[0]] for coord in coordinates] 
-        rows.append({
-            "name": map_data["id"].values[0],
-            "description": description,
-            "path": path
-        })
+    return df.assign(**{"Activity Link": activity_link_prefix + df['Activity ID'].astype(str)})
 
-    polylines_df = pd.DataFrame(rows)
-    return polylines_df if not polylines_df.empty else None
+def stream_athlete_data(access_token, athlete_id, force=False, status_placeholder=None):
+    """
+    Generator form of load_athlete_data: while syncing with Strava, yields each
+    page of new activities as a formatted chunk so callers can show partial 
+    results after the first round-trip. Nothing is yielded on a cache hit. The
+    full result is the generator's return value
 
-@st.cache_data(show_spinner=False)
-def plot_histogram(df, column_name, bins):
+    Parameters:
+        access_token: String
+        athlete_id: int
+        force: bool, sync with Strava even if a recent sync is cached
+        status_placeholder: Streamlit placeholder for progress messages
+
+    Yields:
+        formatted_chunk: DataFrame from format_data
+        route_chunk: DataFrame from get_route_info
+        incremental: bool, True when the chunks are only the activities newer
+            than those already stored, rather than the whole history
+
+    Returns:
+        data_version: String
+        formatted_df: DataFrame
+        route_info: DataFrame
     """
-    Plots user activity stats in a histogram 
+    cache = get_cache()
+    version_key = f"version:{athlete_id}"
+    with span("athlete_cache.lookup", athlete_id=athlete_id, force=force) as attrs:
+        cached_version = cache.get(version_key)
+        attrs['hit'] = False
+        if cached_version is not None and not force:
+            data_version = cached_version.decode()
+            formatted_df = cache.get_frame(f"formatted:{athlete_id}:{data_version}")
+            route_info = cache.get_frame(f"routes:{athlete_id}:{data_version}")
+            attrs['hit'] = formatted_df is not None and route_info is not None
+    if attrs['hit']:
+        print(f"\nLoaded cached data for athlete {athlete_id} (version {data_version})")
+        return data_version, formatted_df, route_info
+
+    incremental = activity_store.get_watermark(athlete_id) is not None
+    pages = stream_activity_data(access_token, athlete_id, status_placeholder=status_placeholder)
+    while True:
+        try:
+            page = next(pages)
+        except StopIteration as done:
+            raw_df = done.value
+            break
+        page_df = pd.DataFrame(page)
+        yield format_data(page_df), get_route_info(page_df), incremental
+
+    data_version = get_data_version(raw_df)
+
+    # Nothing new since the last sync still reuses the formatted payloads
+    formatted_key = f"formatted:{athlete_id}:{data_version}"
+    formatted_df = cache.get_frame(formatted_key)
+    if formatted_df is None:
+        formatted_df = format_data(raw_df)
+        cache.set_frame(formatted_key, formatted_df)
+
+    routes_key = f"routes:{athlete_id}:{data_version}"
+    route_info = cache.get_frame(routes_key)
+    if route_info is None:
+        route_info = get_route_info(raw_df)
+        cache.set_frame(routes_key, route_info)
+
+    cache.set(version_key, data_version.encode(), ttl=SYNC_TTL_S)
+    return data_version, formatted_df, route_info
+
+def load_athlete_data(access_token, athlete_id, force=False, status_placeholder=None, on_chunk=None):
+    """
+    Formatted activities and route info for an athlete, served from the shared 
+    cache tier when another session or replica synced the athlete recently.
+    Cache entries are keyed by athlete and data version, not by access token
 
     Parameters:
-        df: DataFrame
-        column_name: String
-        bins: int
+        access_token: String
+        athlete_id: int
+        force: bool, sync with Strava even if a recent sync is cached
+        status_placeholder: Streamlit placeholder for progress messages
+        on_chunk: Callable taking (formatted_chunk, route_chunk, incremental) for each page as it arrives
     
     Returns:
-        none
+        data_version: String
+        formatted_df: DataFrame
+        route_info: DataFrame
     """
-    plt.figure(figsize=(5, 3))
-    sns.histplot(df[column_name], bins=bins, kde=True, color="blue")
-    plt.xlabel(column_name)
-    plt.ylabel("")
-    plt.gca().axes.get_yaxis().set_visible(False)
-    st.pyplot(plt.gcf())
+    stream = stream_athlete_data(access_token, athlete_id, force=force, status_placeholder=status_placeholder)
+    return _drain(stream, None if on_chunk is None else lambda chunk: on_chunk(*chunk))
 
-@st.cache_data(show_spinner=False)
-def plot_calendar_heatmap(df, year):
+def get_route_info(df):
     """
-    Plots a calendar heatmap of activities over time
+    Extracts encoded polylines and tooltip descriptions without decoding them
 
     Parameters:
         df: DataFrame
-        year: int
     
     Returns:
-        none
+        route_info: DataFrame indexed by activity id with 'polyline' and 'description'
     """
-    # Group by date and sum distances
-    df['Start Date'] = pd.to_datetime(df['Start Date'])
-    activity_counts = df.groupby(df['Start Date'].dt.date)['Distance (km)'].sum().reset_index(name='Total Distance')
-    
-    # Create full date range for the year
-    start_date = pd.Timestamp(year, 1, 1)
-    end_date = pd.Timestamp(year, 12, 31)
-    full_dates = pd.date_range(start_date, end_date, freq='D')
-    full_df = pd.DataFrame({'Start Date': full_dates, 'Total Distance': 0.0})
-    full_df['Start Date'] = full_df['Start Date'].dt.date
-    
-    # Merge with actual sums
-    merged = pd.merge(full_df, activity_counts, on='Start Date', how='left', suffixes=('', '_actual'))
-    merged['Total Distance'] = merged['Total Distance_actual'].fillna(0.0)
-    merged = merged[['Start Date', 'Total Distance']]
-    
-    # Create pivot table for heatmap
-    merged['Start Date'] = pd.to_datetime(merged['Start Date'])
-    merged['Year'] = merged['Start Date'].dt.year
-    merged['Month'] = merged['Start Date'].dt.month
-    merged['Day'] = merged['Start Date'].dt.day
+    if df.empty or 'map' not in df.columns:
+        return pd.DataFrame(columns=['polyline', 'description'])
+
+    encoded = df['map'].str.get('summary_polyline')
+    df = df[encoded.notna() & (encoded != '')]
+
+    distance = (df['distance'] / 1000).round(1).astype(str)
+    elevation = df['total_elevation_gain'].fillna(0).round().astype(int).astype(str)
+    route_info = pd.DataFrame({
+        "polyline": df['map'].str.get('summary_polyline').to_numpy(),
+        "description": (df['name'] + "\n" + distance + " km\n" + elevation + " m").to_numpy(),
+    }, index=df['id'].to_numpy())
+    return route_info
+
+def get_polylines(route_info, activity_ids, route_cache, zoom=None, latitude=0.0):
+    """
+    Decodes polylines for the given activities and formats into DataFrame usable 
+    with PyDeck PathLayer. Decoded routes are memoized in route_cache. When a zoom
+    is given, routes are simplified to a level of detail chosen from the number
+    of routes and the zoom
+
+    Parameters:
+        route_info: DataFrame from get_route_info
+        activity_ids: iterable of int
+        route_cache: RouteCache
+        zoom: float
+        latitude: float
     
-    pivot_table = merged.pivot_table(index='Month', columns='Day', values='Total Distance', aggfunc='sum', fill_value=0)
+    Returns:
+        polylines_df: DataFrame with 'name', 'description', 'path'
+    """
+    selected = route_info[route_info.index.isin(activity_ids)]
+    if selected.empty:
+        return None
+
+    level = 0 if zoom is None else choose_level(len(selected), zoom, latitude)
+    print(f'Getting polylines ({len(selected)} routes, detail level {level})...')
+    with span("get_polylines", routes=len(selected), level=level) as attrs:
+        attrs['cached'] = sum(activity_id in route_cache for activity_id in selected.index)
+        geometry = route_cache.get(selected['polyline'], level=level)
+        polylines_df = pd.DataFrame({
+            "name": selected.index,
+            "description": selected['description'].to_numpy(),
+            "path": geometry.to_paths(),
+        })
+        attrs['points'] = len(geometry.coords)
+    return polylines_df
+
+def get_density_map(route_info, activity_ids, route_cache, density_cache, max_entries=8):
+    """
+    Rasterizes the given activities' routes into a PNG heatmap for a PyDeck
+    BitmapLayer, so the payload size doesn't grow with the number of routes.
+    Images are memoized per set of activities in density_cache
+
+    Parameters:
+        route_info: DataFrame from get_route_info
+        activity_ids: iterable of int
+        route_cache: RouteCache
+        density_cache: OrderedDict
+        max_entries: int
     
-    plt.figure(figsize=(12, 4))
-    sns.heatmap(
-        pivot_table, 
-        cmap="Oranges", 
-        linewidths=5, 
-        annot=False, 
-        cbar=True, 
-        cbar_kws={'label': 'Total Distance (km)'},
-        yticklabels=[ 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
-    plt.xlabel("")
-    plt.ylabel("")
-    st.pyplot(plt.gcf()) 
-
-def get_base64_image(image_path):
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
\ No newline at end of file
+    Returns:
+        density_map: Dict with 'image' (PNG data URL) and 'bounds', or None
+    """
+    selected = route_info[route_info.index.isin(activity_ids)]
+    if selected.empty:
+        return None
+
+    key = hashlib.sha1(np.sort(selected.index.to_numpy(dtype=np.int64)).tobytes()).hexdigest()
+    if key in density_cache:
+        density_cache.move_to_end(key)
+        return density_cache[key]
+
+    print(f'Rasterizing density map ({len(selected)} routes)...')
+    geometry = route_cache.get(selected['polyline'])
+    grid, bounds = rasterize_routes(geometry)
+
+    # Log scale so a handful of passes still shows up next to a daily commute
+    intensity = np.log1p(grid) / np.log1p(max(grid.max(), 1))
+    # Only needed once a density map is drawn, so kept off the import path
+    import matplotlib
+    import matplotlib.image
+    rgba = matplotlib.colormaps["autumn_r"](intensity)
+    rgba[..., 3] = np.where(grid > 0, 0.35 + 0.65 * intensity, 0)
+
+    buffer = io.BytesIO()
+    matplotlib.image.imsave(buffer, rgba, format="png")
+    image = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    density_cache[key] = {"image": image, "bounds": bounds}
+    while len(density_cache) > max_entries:
+        density_cache.popitem(last=False)
+    return density_cache[key]
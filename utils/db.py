@@ -0,0 +1,212 @@
+import time
+import queue
+import atexit
+import threading
+import pymongo
+from utils.telemetry import span, telemetry
+
+DATABASE_NAME = "activedata"
+DUPLICATE_KEY_ERROR = 11000
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(connection_string):
+    """
+    Process-wide MongoClient per connection string. MongoClient keeps its own
+    connection pool and is thread-safe, so every session shares one
+
+    Parameters:
+        connection_string: String
+
+    Returns:
+        client: pymongo MongoClient
+    """
+    with _clients_lock:
+        if connection_string not in _clients:
+            _clients[connection_string] = pymongo.MongoClient(connection_string)
+        return _clients[connection_string]
+
+def connect_to_db(client, database_name=DATABASE_NAME, collection_name="signins"):
+    """
+    Connects to a MongoDB database and collection
+
+    Parameters:
+        client: pymongo MongoClient
+        database_name: string
+        collection_name: string
+    Returns:
+        collection: pymongo Collection
+    """
+    try:
+        db = client.get_database(database_name)
+        collection = db.get_collection(collection_name)
+        print(f"\nConnected to {db.name} database.")
+    except Exception as e:
+        print(f"\nError connecting to database: {e}")
+        collection = None
+
+    return collection
+
+class BatchWriter:
+    """
+    Write-behind queue for a MongoDB collection. add() returns immediately and a
+    background thread inserts queued documents with insert_many once batch_size
+    are waiting or flush_interval has passed. Whatever is still queued is
+    written at interpreter exit. Queue depth, flush latency and document counts
+    are registered as telemetry gauges labelled with the collection name
+
+    Works with any object that has insert_many, e.g. a mongomock collection
+
+    Parameters:
+        collection: pymongo Collection
+        batch_size: int
+        flush_interval: float, seconds
+        max_queue: int, documents beyond this are dropped rather than blocking the caller
+    """
+    def __init__(self, collection, batch_size=50, flush_interval=5.0, max_queue=10000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Counters are updated from caller threads and the writer thread
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "queued": 0,
+            "inserted": 0,
+            "dropped": 0,
+            "failed": 0,
+            "flushes": 0,
+            "last_flush_s": 0.0,
+            "max_flush_s": 0.0,
+        }
+        labels = {"collection": getattr(collection, "name", type(collection).__name__)}
+        telemetry.register_gauge("mongo_queue_depth", lambda: self.depth, **labels)
+        telemetry.register_gauge("mongo_last_flush_seconds", lambda: self.stats["last_flush_s"], **labels)
+        telemetry.register_gauge("mongo_max_flush_seconds", lambda: self.stats["max_flush_s"], **labels)
+        for state in ("queued", "inserted", "dropped", "failed"):
+            telemetry.register_gauge("mongo_documents", lambda state=state: self.stats[state], state=state, **labels)
+        self._thread = threading.Thread(target=self._run, name="mongo-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def depth(self):
+        """
+        Number of documents waiting to be written
+        """
+        return self._queue.qsize()
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for stat, amount in increments.items():
+                self.stats[stat] += amount
+
+    def add(self, document):
+        """
+        Queues a document for insertion
+
+        Parameters:
+            document: Dict
+
+        Returns:
+            queued: bool, False if the queue was full or the writer is closed
+        """
+        if self._stopped.is_set():
+            self._count(dropped=1)
+            return False
+        try:
+            self._queue.put_nowait(document)
+        except queue.Full:
+            self._count(dropped=1)
+            print("\nError queueing document: write queue is full")
+            return False
+        self._count(queued=1)
+        return True
+
+    def flush(self):
+        """
+        Writes everything currently queued, in batches of batch_size
+
+        Returns:
+            inserted: int
+        """
+        inserted = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return inserted
+
+                start = time.perf_counter()
+                try:
+                    with span("mongo.insert_many", documents=len(batch), depth=self.depth):
+                        # Unordered so one bad document doesn't stop the rest of the batch
+                        result = self.collection.insert_many(batch, ordered=False)
+                    inserted += len(result.inserted_ids)
+                    self._count(inserted=len(result.inserted_ids))
+                except pymongo.errors.BulkWriteError as e:
+                    # The rest of an unordered batch is still written. A duplicate key
+                    # means the document was written before, e.g. by a retried flush
+                    write_errors = e.details.get("writeErrors", [])
+                    errors = [error for error in write_errors if error.get("code") != DUPLICATE_KEY_ERROR]
+                    written = e.details.get("nInserted", 0) + len(write_errors) - len(errors)
+                    if errors:
+                        print(f"\nError inserting {len(batch) - written} of {len(batch)} documents: {errors[0].get('errmsg')}")
+                    inserted += written
+                    self._count(inserted=written, failed=len(batch) - written)
+                except Exception as e:
+                    print(f"\nError inserting {len(batch)} documents: {e}")
+                    self._count(failed=len(batch))
+                elapsed = time.perf_counter() - start
+                with self._stats_lock:
+                    self.stats["flushes"] += 1
+                    self.stats["last_flush_s"] = elapsed
+                    self.stats["max_flush_s"] = max(self.stats["max_flush_s"], elapsed)
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stopped.is_set():
+            # Wake early once a full batch is waiting
+            if self.depth >= self.batch_size or time.monotonic() >= deadline:
+                self.flush()
+                deadline = time.monotonic() + self.flush_interval
+            self._stopped.wait(min(0.1, self.flush_interval))
+
+    def close(self, timeout=10.0):
+        """
+        Stops the background thread and drains the queue
+        """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join(timeout)
+        self.flush()
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(connection_string, collection_name="signins"):
+    """
+    Process-wide write-behind queue for a collection
+
+    Parameters:
+        connection_string: String
+        collection_name: String
+
+    Returns:
+        writer: BatchWriter
+    """
+    key = (connection_string, collection_name)
+    with _writers_lock:
+        if key not in _writers:
+            collection = connect_to_db(get_client(connection_string), collection_name=collection_name)
+            _writers[key] = BatchWriter(collection)
+        return _writers[key]
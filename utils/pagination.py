@@ -0,0 +1,53 @@
+import threading
+import concurrent.futures
+from utils.strava_client import PAGE_WORKERS
+
+def fetch_pages(fetch, per_page=200, initial_window=2, max_window=16, max_workers=PAGE_WORKERS, stats=None):
+    """
+    Fetches pages in parallel windows and yields them in page order. The window
+    doubles while pages come back full and fetching stops at the first short page,
+    so small accounts make few requests and large accounts are never cut off
+
+    Parameters:
+        fetch: Callable taking a page number and returning a List
+        per_page: int
+        initial_window: int
+        max_window: int
+        max_workers: int
+        stats: Dict, updated in place with 'requests' and 'pages'
+
+    Returns:
+        generator of (page_num, results) tuples
+    """
+    stats = {} if stats is None else stats
+    stats.update(requests=0, pages=0)
+    lock = threading.Lock()
+
+    def counted_fetch(page_num):
+        with lock:
+            stats['requests'] += 1
+        return fetch(page_num)
+
+    next_page = 1
+    window = initial_window
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            page_nums = range(next_page, next_page + window)
+            futures = [executor.submit(counted_fetch, page_num) for page_num in page_nums]
+
+            finished = False
+            for page_num, future in zip(page_nums, futures):
+                if finished:
+                    future.cancel()
+                    continue
+                result = future.result()
+                if len(result) > 0:
+                    stats['pages'] += 1
+                    yield page_num, result
+                if len(result) < per_page:
+                    finished = True
+
+            if finished:
+                return
+            next_page += window
+            window = min(window * 2, max_window)
@@ -0,0 +1,161 @@
+import io
+import threading
+import concurrent.futures
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+MONTH_LABELS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# matplotlib and seaborn are imported inside the render functions, on the plot
+# threads, so importing this module doesn't pay for them
+
+# Rendered PNGs are shared by every session in the process; keys include the
+# data version and filter, so entries never go stale, they just age out
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="plot")
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+def _to_png(fig):
+    """
+    Renders a figure to PNG bytes and releases it
+    """
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+def render_histogram(values, column_name, bins):
+    """
+    Renders a histogram with KDE of activity stats
+
+    Parameters:
+        values: float array
+        column_name: String
+        bins: int
+
+    Returns:
+        png: bytes
+    """
+    import seaborn as sns
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(5, 3))
+    ax = fig.subplots()
+    sns.histplot(values, bins=bins, kde=True, color="blue", ax=ax)
+    ax.set_xlabel(column_name)
+    ax.set_ylabel("")
+    ax.get_yaxis().set_visible(False)
+    return _to_png(fig)
+
+def render_calendar_heatmap(grid):
+    """
+    Renders a calendar heatmap of distance per day
+
+    Parameters:
+        grid: float array of shape (12, 31) from calendar_grid
+
+    Returns:
+        png: bytes
+    """
+    import seaborn as sns
+    from matplotlib.figure import Figure
+    calendar = pd.DataFrame(grid, index=range(1, 13), columns=range(1, 32))
+    fig = Figure(figsize=(12, 4))
+    ax = fig.subplots()
+    sns.heatmap(
+        calendar,
+        cmap="Oranges",
+        linewidths=5,
+        annot=False,
+        cbar=True,
+        cbar_kws={'label': 'Total Distance (km)'},
+        yticklabels=MONTH_LABELS,
+        ax=ax)
+    ax.set_xlabel("")
+    ax.set_ylabel("")
+    return _to_png(fig)
+
+def _duration_label(seconds):
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 60 * 60:
+        return f"{seconds // 60}m"
+    return f"{seconds // (60 * 60)}h"
+
+def render_curve(durations, values, kind):
+    """
+    Renders a best-effort curve on a log duration axis
+
+    Parameters:
+        durations: int array, seconds
+        values: float array, watts for 'power' or m/s for 'speed'
+        kind: String, 'power' or 'speed'
+
+    Returns:
+        png: bytes
+    """
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(12, 4))
+    ax = fig.subplots()
+    if kind == "power":
+        ax.plot(durations, values, color="#FC4C02")
+        ax.set_ylabel("Power (W)")
+    else:
+        # Shown as pace, faster at the top
+        with np.errstate(divide="ignore"):
+            pace = 1000 / (values * 60)
+        ax.plot(durations, pace, color="#FC4C02")
+        ax.set_ylabel("Pace (min/km)")
+        ax.invert_yaxis()
+    ax.set_xscale("log")
+    ticks = [t for t in (1, 5, 15, 30, 60, 300, 600, 1200, 3600, 7200) if t <= durations.max()]
+    ax.set_xticks(ticks, [_duration_label(t) for t in ticks])
+    ax.grid(True, which="major", alpha=0.3)
+    return _to_png(fig)
+
+def _store(key, future):
+    global _cache_bytes
+    with _cache_lock:
+        if future.exception() is not None:
+            _cache.pop(key, None)
+            return
+        _cache_bytes += len(future.result())
+        while _cache_bytes > MAX_CACHE_BYTES and len(_cache) > 1:
+            oldest_key, oldest = next(iter(_cache.items()))
+            if not oldest.done():
+                break
+            _cache.pop(oldest_key)
+            _cache_bytes -= len(oldest.result())
+
+def get_png(key, render, *args):
+    """
+    Returns a future for a rendered PNG, submitting the render to the worker
+    pool only if the key isn't already cached or in flight
+
+    Parameters:
+        key: hashable, e.g. (plot type, column, bins, filter fingerprint)
+        render: Callable returning PNG bytes
+        args: arguments for render
+
+    Returns:
+        future: Future resolving to bytes
+    """
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+        future = _executor.submit(render, *args)
+        _cache[key] = future
+    future.add_done_callback(lambda f: _store(key, f))
+    return future
+
+def histogram_values(df, column_name):
+    """
+    Column values as a plain float array, safe to hand to a worker thread
+    """
+    return df[column_name].to_numpy(dtype=np.float64, na_value=np.nan)
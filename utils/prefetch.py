@@ -0,0 +1,160 @@
+import time
+import threading
+import concurrent.futures
+import utils.auth as auth
+from utils.strava_client import SYNC_WORKERS
+
+# Refresh athletes seen in the last day, every 15 minutes
+REFRESH_INTERVAL_S = 15 * 60
+ACTIVE_WINDOW_S = 24 * 60 * 60
+# Prefetched results nobody collected are dropped after this long
+PENDING_TTL_S = 10 * 60
+
+def _load_athlete_data(*args, **kwargs):
+    # data_utils (pandas, the Strava client, the caches) is imported on the worker
+    # thread, so the login page that starts a prefetch doesn't pay for it
+    from utils import data_utils as dutil
+    return dutil.load_athlete_data(*args, **kwargs)
+
+class Prefetcher:
+    """
+    Process-wide background worker that starts loading an athlete's data as soon
+    as the OAuth code is exchanged, and keeps recently active athletes warm by
+    refreshing their tokens and syncing on a schedule
+
+    Parameters:
+        max_workers: int
+        refresh_interval: float, seconds
+    """
+    def __init__(self, max_workers=SYNC_WORKERS, refresh_interval=REFRESH_INTERVAL_S):
+        self.refresh_interval = refresh_interval
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._athletes = {}
+        self._credentials = None
+        self._scheduler = threading.Thread(target=self._run_schedule, name="prefetch-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def start(self, access_token, client_id, client_secret):
+        """
+        Starts loading an athlete's data in the background and registers them
+        for scheduled refreshes
+
+        Parameters:
+            access_token: Dict from auth.request_access_token
+            client_id: String
+            client_secret: String
+        """
+        athlete_id = access_token['athlete']['id']
+        with self._lock:
+            self._credentials = (client_id, client_secret)
+            self._athletes[athlete_id] = {
+                "access_token": access_token['access_token'],
+                "refresh_token": access_token.get('refresh_token'),
+                "expires_at": access_token.get('expires_at', 0),
+                "last_seen": time.time(),
+            }
+            if athlete_id not in self._pending:
+                print(f"\nPrefetching data for athlete {athlete_id}...")
+                # Chunks are only appended by the worker, so the page can read them without the lock
+                chunks = []
+                future = self._executor.submit(
+                    _load_athlete_data, access_token['access_token'], athlete_id,
+                    on_chunk=lambda *chunk: chunks.append(chunk),
+                )
+                self._pending[athlete_id] = (time.time(), future, chunks)
+
+    def result(self, athlete_id, on_chunk=None, poll_interval=0.25):
+        """
+        Waits for and returns a prefetched result, if one was started. While
+        waiting, each page fetched so far is passed to on_chunk on the calling
+        thread, so a page can render partial results
+
+        Parameters:
+            athlete_id: int
+            on_chunk: Callable taking (formatted_chunk, route_chunk, incremental)
+            poll_interval: float, seconds
+
+        Returns:
+            result: (data_version, formatted_df, route_info) or None
+        """
+        with self._lock:
+            pending = self._pending.pop(athlete_id, None)
+            if athlete_id in self._athletes:
+                self._athletes[athlete_id]["last_seen"] = time.time()
+        if pending is None:
+            return None
+
+        _, future, chunks = pending
+        shown = 0
+        while True:
+            # Checked before reading chunks so the last ones aren't missed
+            done = future.done()
+            if on_chunk is not None:
+                while shown < len(chunks):
+                    on_chunk(*chunks[shown])
+                    shown += 1
+            if done:
+                return future.result()
+            concurrent.futures.wait([future], timeout=poll_interval)
+
+    def _refresh(self, athlete_id):
+        with self._lock:
+            athlete = dict(self._athletes[athlete_id])
+            client_id, client_secret = self._credentials
+
+        access_token = athlete["access_token"]
+        if athlete["refresh_token"] and athlete["expires_at"] - 60 < time.time():
+            token = auth.refresh_access_token(client_id, client_secret, athlete["refresh_token"])
+            if 'access_token' not in token:
+                print(f"\nError refreshing token for athlete {athlete_id}: {token}")
+                return
+            access_token = token['access_token']
+            with self._lock:
+                self._athletes[athlete_id].update(
+                    access_token=access_token,
+                    refresh_token=token.get('refresh_token', athlete["refresh_token"]),
+                    expires_at=token.get('expires_at', 0),
+                )
+
+        _load_athlete_data(access_token, athlete_id, force=True)
+
+    def refresh_active(self):
+        """
+        Syncs every athlete seen within ACTIVE_WINDOW_S and forgets the rest
+        """
+        now = time.time()
+        with self._lock:
+            for athlete_id in [a for a, info in self._athletes.items() if now - info["last_seen"] > ACTIVE_WINDOW_S]:
+                del self._athletes[athlete_id]
+            for athlete_id in [a for a, (started, _, _) in self._pending.items() if now - started > PENDING_TTL_S]:
+                del self._pending[athlete_id]
+            athlete_ids = list(self._athletes)
+
+        futures = {self._executor.submit(self._refresh, athlete_id): athlete_id for athlete_id in athlete_ids}
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception() is not None:
+                print(f"\nError refreshing athlete {futures[future]}: {future.exception()}")
+
+    def _run_schedule(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh_active()
+            except Exception as e:
+                print(f"\nError in scheduled refresh: {e}")
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher():
+    """
+    Returns:
+        prefetcher: the process-wide Prefetcher
+    """
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+    return _prefetcher
@@ -0,0 +1,430 @@
+import numpy as np
+from collections import OrderedDict
+
+# Route geometry is held as int32 [lon, lat] in units of 1e-5 degrees, the
+# precision of Strava's summary polylines (8 bytes per point, ~1 m resolution)
+COORD_SCALE = 10 ** 5
+
+def decode_polylines_e5(encoded):
+    """
+    Decodes a batch of Google encoded polylines (precision 5) in one vectorized pass
+    into integer coordinates
+
+    Parameters:
+        encoded: iterable of String (None or '' for activities without a route)
+
+    Returns:
+        coords: contiguous int32 array of shape (n_points, 2) holding [lon, lat] * 1e5
+        offsets: int64 array of length n_polylines + 1; polyline i spans coords[offsets[i]:offsets[i+1]]
+    """
+    encoded = [s if isinstance(s, str) else '' for s in encoded]
+    byte_lengths = np.fromiter((len(s) for s in encoded), dtype=np.int64, count=len(encoded))
+    byte_offsets = np.concatenate(([0], np.cumsum(byte_lengths)))
+
+    chunks = np.frombuffer(''.join(encoded).encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+
+    # Each value is a little-endian run of 5-bit chunks; a clear 0x20 bit ends the run
+    is_end = (chunks & 0x20) == 0
+    ends = np.flatnonzero(is_end)
+    if ends.size == 0:
+        return np.empty((0, 2), dtype=np.int32), np.zeros(len(encoded) + 1, dtype=np.int64)
+    chunks = chunks[:ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = np.arange(chunks.size) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((chunks & 0x1f) << (5 * shift), starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+
+    # Count complete values inside each polyline's byte range to get point offsets
+    ends_before = np.concatenate(([0], np.cumsum(is_end)))
+    n_points = (ends_before[byte_offsets[1:]] - ends_before[byte_offsets[:-1]]) // 2
+    offsets = np.concatenate(([0], np.cumsum(n_points)))
+
+    # Deltas accumulate within a polyline, so subtract the running total at each start
+    totals = np.cumsum(deltas[:offsets[-1] * 2].reshape(-1, 2), axis=0)
+    base = np.vstack(([0, 0], totals))[offsets[:-1]]
+    coords = totals - np.repeat(base, n_points, axis=0)
+
+    return np.ascontiguousarray(coords[:, ::-1], dtype=np.int32), offsets
+
+def split_paths(coords, offsets):
+    """
+    Splits a flat coordinate buffer into per-activity paths for PyDeck PathLayer
+
+    Parameters:
+        coords: array of shape (n_points, 2)
+        offsets: int array of length n_paths + 1
+
+    Returns:
+        paths: List of List of [lon, lat]
+    """
+    flat = coords.tolist()
+    bounds = offsets.tolist()
+    return [flat[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+# Douglas-Peucker tolerances for each level of detail, in 1e-5 degree units:
+# full resolution, then roughly 4 m, 18 m and 70 m
+LOD_TOLERANCES = (0, 4, 16, 64)
+
+# Route counts above which the next coarser level is used
+LOD_ROUTE_COUNTS = (200, 1000, 3000)
+
+def simplification_ranks(coords, offsets, tolerances=LOD_TOLERANCES):
+    """
+    Runs Douglas-Peucker over every route at once, splitting all open segments
+    of all routes in each vectorized step, and ranks each point by the coarsest
+    level of detail that keeps it
+
+    Parameters:
+        coords: int32 array of shape (n_points, 2)
+        offsets: int64 array of length n_routes + 1
+        tolerances: tuple of increasing tolerances, starting with 0
+
+    Returns:
+        ranks: uint8 array of length n_points; level L keeps points with rank >= L
+    """
+    x, y = coords[:, 0].astype(np.float64), coords[:, 1].astype(np.float64)
+    importance = np.zeros(len(coords))
+
+    starts, ends = offsets[:-1], offsets[1:] - 1
+    nonempty = ends >= starts
+    importance[starts[nonempty]] = np.inf
+    importance[ends[nonempty]] = np.inf
+
+    seg_start, seg_end = starts[nonempty], ends[nonempty]
+    seg_parent = np.full(len(seg_start), np.inf)
+    min_tolerance = tolerances[1]
+
+    while len(seg_start) > 0:
+        inner = seg_end - seg_start - 1
+        has_inner = inner > 0
+        seg_start, seg_end, seg_parent, inner = seg_start[has_inner], seg_end[has_inner], seg_parent[has_inner], inner[has_inner]
+        if len(seg_start) == 0:
+            break
+
+        # Distance from every interior point to its segment's chord
+        seg_of = np.repeat(np.arange(len(seg_start)), inner)
+        first = np.concatenate(([0], np.cumsum(inner)[:-1]))
+        points = seg_start[seg_of] + 1 + np.arange(inner.sum()) - first[seg_of]
+        ax, ay = x[seg_start][seg_of], y[seg_start][seg_of]
+        abx, aby = (x[seg_end] - x[seg_start])[seg_of], (y[seg_end] - y[seg_start])[seg_of]
+        apx, apy = x[points] - ax, y[points] - ay
+        length_sq = abx * abx + aby * aby
+        t = np.clip((apx * abx + apy * aby) / np.where(length_sq > 0, length_sq, 1), 0, 1)
+        dist = np.hypot(apx - t * abx, apy - t * aby)
+
+        max_dist = np.maximum.reduceat(dist, first)
+        # seg_of is sorted, so the first maximum of each segment starts a new run
+        candidates = np.flatnonzero(dist == max_dist[seg_of])
+        first_candidate = np.concatenate(([True], np.diff(seg_of[candidates]) != 0))
+        split_at = points[candidates[first_candidate]]
+
+        split = max_dist > min_tolerance
+        split_at, seg_start, seg_end = split_at[split], seg_start[split], seg_end[split]
+        # A point only survives a level if the split that exposed it did too
+        importance[split_at] = np.minimum(max_dist[split], seg_parent[split])
+
+        seg_parent = np.concatenate((importance[split_at], importance[split_at]))
+        seg_start, seg_end = np.concatenate((seg_start, split_at)), np.concatenate((split_at, seg_end))
+
+    return np.searchsorted(np.asarray(tolerances[1:], dtype=np.float64), importance, side="left").astype(np.uint8)
+
+def choose_level(n_routes, zoom, latitude=0.0):
+    """
+    Picks a level of detail from the number of routes, never dropping detail
+    that would be wider than half a pixel at the given zoom
+
+    Parameters:
+        n_routes: int
+        zoom: float
+        latitude: float
+
+    Returns:
+        level: int index into LOD_TOLERANCES
+    """
+    level = int(np.searchsorted(LOD_ROUTE_COUNTS, n_routes, side="left"))
+    # Web Mercator ground resolution, converted from metres to 1e-5 degree units
+    pixel = 156543.03 * np.cos(np.radians(latitude)) / 2 ** zoom / 1.11
+    visible_level = int(np.searchsorted(LOD_TOLERANCES, pixel / 2, side="right")) - 1
+    return max(min(level, visible_level), 0)
+
+def gather_ranges(starts, ends):
+    """
+    Positions covering several [start, end) ranges of a buffer, in order, so
+    all of them can be taken with one fancy index
+
+    Parameters:
+        starts: int array
+        ends: int array
+
+    Returns:
+        positions: int64 array
+        offsets: int64 array of length len(starts) + 1 into positions
+    """
+    lengths = np.asarray(ends, dtype=np.int64) - np.asarray(starts, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    positions = np.repeat(np.asarray(starts, dtype=np.int64) - offsets[:-1], lengths) + np.arange(offsets[-1])
+    return positions, offsets
+
+def take_points(coords, positions):
+    """
+    Gathers [lon, lat] points by position. Each int32 pair is read as one int64,
+    which makes the take several times faster than indexing rows of the 2-D array
+    """
+    pairs = np.ascontiguousarray(coords).view(np.int64).reshape(-1)
+    return pairs[positions].view(np.int32).reshape(-1, 2)
+
+class RouteGeometry:
+    """
+    Routes for a set of activities stored in one contiguous int32 coordinate
+    buffer with an offsets array, indexed by activity id. Single routes are
+    zero-copy views of the buffer
+
+    Parameters:
+        ids: array of activity ids
+        coords: int32 array of shape (n_points, 2) holding [lon, lat] * 1e5
+        offsets: int64 array of length len(ids) + 1
+    """
+    def __init__(self, ids, coords, offsets):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.coords = coords
+        self.offsets = offsets
+        self._order = np.argsort(self.ids, kind="stable")
+        self._sorted_ids = self.ids[self._order]
+
+    @classmethod
+    def from_encoded(cls, encoded):
+        """
+        Parameters:
+            encoded: Series of encoded polylines indexed by activity id
+        """
+        coords, offsets = decode_polylines_e5(encoded)
+        return cls(encoded.index, coords, offsets)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.offsets.nbytes + self.ids.nbytes * 2 + self._order.nbytes
+
+    def positions(self, activity_ids):
+        """
+        Positions of the given activities in this geometry, skipping unknown ids
+
+        Parameters:
+            activity_ids: iterable of int
+
+        Returns:
+            positions: int array
+        """
+        activity_ids = np.asarray(activity_ids, dtype=np.int64)
+        found = np.searchsorted(self._sorted_ids, activity_ids)
+        found = np.clip(found, 0, max(len(self._sorted_ids) - 1, 0))
+        valid = self._sorted_ids[found] == activity_ids if len(self._sorted_ids) else np.zeros(len(activity_ids), dtype=bool)
+        return self._order[found[valid]]
+
+    def route(self, activity_id):
+        """
+        Zero-copy view of one activity's route
+
+        Returns:
+            route: int32 array of shape (n, 2) or None
+        """
+        positions = self.positions([activity_id])
+        if len(positions) == 0:
+            return None
+        position = positions[0]
+        return self.coords[self.offsets[position]:self.offsets[position + 1]]
+
+    def routes(self, activity_ids=None):
+        """
+        Zero-copy views of the routes for the given activities (all by default)
+
+        Returns:
+            routes: List of int32 arrays
+        """
+        positions = range(len(self)) if activity_ids is None else self.positions(activity_ids)
+        return [self.coords[self.offsets[p]:self.offsets[p + 1]] for p in positions]
+
+    def take(self, activity_ids):
+        """
+        Geometry holding only the given activities, in the given order. A run
+        of consecutive routes shares this geometry's buffer; any other subset is
+        gathered with one vectorized take
+
+        Returns:
+            geometry: RouteGeometry
+        """
+        positions = self.positions(activity_ids)
+        starts, ends = self.offsets[positions], self.offsets[positions + 1]
+        if len(positions) and np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+            return RouteGeometry(self.ids[positions], self.coords[starts[0]:ends[-1]], self.offsets[positions[0]:positions[-1] + 2] - starts[0])
+        points, offsets = gather_ranges(starts, ends)
+        return RouteGeometry(self.ids[positions], take_points(self.coords, points), offsets)
+
+    def to_paths(self):
+        """
+        Serializes to the [lon, lat] float lists expected by PyDeck PathLayer
+
+        Returns:
+            paths: List of List of [lon, lat]
+        """
+        return split_paths(self.coords / COORD_SCALE, self.offsets)
+
+class RouteCache:
+    """
+    Bounded LRU of decoded routes keyed by activity id. Routes are decoded on
+    first use, in one batch per call, and appended to one contiguous int32
+    buffer along with their level-of-detail ranks, with an index from activity
+    id to the route's range in it. Once more than max_points live points are
+    cached, the least recently used routes are dropped and the buffer is
+    compacted
+
+    Parameters:
+        max_points: int
+    """
+    def __init__(self, max_points=2_000_000):
+        self.max_points = max_points
+        self.points = 0
+        self._coords = np.empty((0, 2), dtype=np.int32)
+        self._ranks = np.empty(0, dtype=np.uint8)
+        self._used = 0
+        self._routes = OrderedDict()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, activity_id):
+        return activity_id in self._routes
+
+    @property
+    def nbytes(self):
+        return self._coords.nbytes + self._ranks.nbytes
+
+    def _append(self, coords, ranks):
+        """
+        Copies points onto the end of the buffer, growing it geometrically
+
+        Returns:
+            start: int, buffer position of the first point
+        """
+        start, end = self._used, self._used + len(coords)
+        if end > len(self._coords):
+            capacity = max(end, 2 * len(self._coords))
+            # New arrays, so geometries returned earlier keep viewing the old ones
+            grown_coords = np.empty((capacity, 2), dtype=np.int32)
+            grown_ranks = np.empty(capacity, dtype=np.uint8)
+            grown_coords[:start], grown_ranks[:start] = self._coords[:start], self._ranks[:start]
+            self._coords, self._ranks = grown_coords, grown_ranks
+        self._coords[start:end], self._ranks[start:end] = coords, ranks
+        self._used = end
+        return start
+
+    def _compact(self):
+        """
+        Rewrites the live routes, in LRU order, into a new buffer
+        """
+        ranges = np.array(list(self._routes.values()), dtype=np.int64).reshape(-1, 2)
+        points, offsets = gather_ranges(ranges[:, 0], ranges[:, 1])
+        self._coords, self._ranks = take_points(self._coords, points), self._ranks[points]
+        self._used = len(points)
+        for activity_id, start, end in zip(self._routes, offsets[:-1].tolist(), offsets[1:].tolist()):
+            self._routes[activity_id] = (start, end)
+
+    def get(self, encoded, level=0):
+        """
+        Returns decoded routes, decoding only those not already cached
+
+        Parameters:
+            encoded: Series of encoded polylines indexed by activity id
+            level: int index into LOD_TOLERANCES
+
+        Returns:
+            geometry: RouteGeometry in the order of encoded. At full detail, routes
+                stored next to each other are a view of the cache's buffer
+        """
+        missing = encoded[~encoded.index.isin(list(self._routes))]
+        if not missing.empty:
+            coords, offsets = decode_polylines_e5(missing)
+            base = self._append(coords, simplification_ranks(coords, offsets))
+            for activity_id, start, end in zip(missing.index.tolist(), offsets[:-1].tolist(), offsets[1:].tolist()):
+                self._routes[activity_id] = (base + start, base + end)
+            self.points += int(offsets[-1])
+
+        for activity_id in encoded.index:
+            self._routes.move_to_end(activity_id)
+        ranges = np.array([self._routes[activity_id] for activity_id in encoded.index], dtype=np.int64).reshape(-1, 2)
+        starts, ends = ranges[:, 0], ranges[:, 1]
+
+        if level == 0 and len(ranges) and np.array_equal(starts[1:], ends[:-1]):
+            geometry = RouteGeometry(encoded.index, self._coords[starts[0]:ends[-1]], np.concatenate((starts, ends[-1:])) - starts[0])
+        else:
+            points, offsets = gather_ranges(starts, ends)
+            if level > 0:
+                keep = self._ranks[points] >= level
+                route_of = np.repeat(np.arange(len(ranges)), np.diff(offsets))
+                offsets = np.concatenate(([0], np.cumsum(np.bincount(route_of[keep], minlength=len(ranges)))))
+                points = points[keep]
+            geometry = RouteGeometry(encoded.index, take_points(self._coords, points), offsets)
+
+        if self.points > self.max_points:
+            while self.points > self.max_points and len(self._routes) > 0:
+                _, (start, end) = self._routes.popitem(last=False)
+                self.points -= end - start
+            self._compact()
+
+        return geometry
+
+def _mercator_y(lat):
+    return np.log(np.tan(np.pi / 4 + np.radians(np.clip(lat, -85.0, 85.0)) / 2))
+
+def rasterize_routes(geometry, width=1024, max_height=1024):
+    """
+    Rasterizes routes into a grid of pass counts in Web Mercator space, drawing
+    every segment of every route in one vectorized pass
+
+    Parameters:
+        geometry: RouteGeometry
+        width: int
+        max_height: int
+
+    Returns:
+        grid: int array of shape (height, width), row 0 at the north edge
+        bounds: [west, south, east, north] in degrees
+    """
+    lon = geometry.coords[:, 0] / COORD_SCALE
+    lat = geometry.coords[:, 1] / COORD_SCALE
+    x, y = np.radians(lon), _mercator_y(lat)
+
+    # Pad the bounding box so routes on the edge aren't clipped
+    pad = max(x.max() - x.min(), y.max() - y.min(), 1e-4) * 0.02
+    x_min, x_max = x.min() - pad, x.max() + pad
+    y_min, y_max = y.min() - pad, y.max() + pad
+    height = int(np.clip(round(width * (y_max - y_min) / (x_max - x_min)), 16, max_height))
+
+    px = (x - x_min) / (x_max - x_min) * (width - 1)
+    py = (y_max - y) / (y_max - y_min) * (height - 1)
+
+    # Segments join consecutive points of the same route
+    is_last = np.zeros(len(px), dtype=bool)
+    is_last[geometry.offsets[1:][geometry.offsets[1:] > 0] - 1] = True
+    seg = np.flatnonzero(~is_last[:-1]) if len(px) > 1 else np.empty(0, dtype=np.int64)
+    dx, dy = px[seg + 1] - px[seg], py[seg + 1] - py[seg]
+
+    # Sample each segment about once per pixel along its longer axis
+    samples = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64) + 1
+    seg_of = np.repeat(np.arange(len(seg)), samples)
+    first = np.concatenate(([0], np.cumsum(samples)[:-1]))
+    t = (np.arange(samples.sum()) - first[seg_of]) / np.maximum(samples - 1, 1)[seg_of]
+    cols = np.rint(px[seg][seg_of] + t * dx[seg_of]).astype(np.int64)
+    rows = np.rint(py[seg][seg_of] + t * dy[seg_of]).astype(np.int64)
+
+    # Single-point routes still leave a mark
+    single = np.flatnonzero(np.diff(geometry.offsets) == 1)
+    cols = np.concatenate((cols, np.rint(px[geometry.offsets[single]]).astype(np.int64)))
+    rows = np.concatenate((rows, np.rint(py[geometry.offsets[single]]).astype(np.int64)))
+
+    grid = np.bincount(rows * width + cols, minlength=width * height).reshape(height, width)
+    south, north = np.degrees(2 * np.arctan(np.exp([y_min, y_max])) - np.pi / 2)
+    bounds = [float(np.degrees(x_min)), float(south), float(np.degrees(x_max)), float(north)]
+    return grid, bounds
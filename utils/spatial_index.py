@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils.route_utils import COORD_SCALE, RouteGeometry
+
+# Grid cells are 0.05 degrees on a side (about 5 km north-south)
+DEFAULT_CELL_DEGREES = 0.05
+
+KM_PER_DEGREE = 111.32
+TILE_SIZE = 256
+
+_KEY_STRIDE = 1 << 24
+_KEY_OFFSET = _KEY_STRIDE // 2
+
+# Indexes are shared by every session in the process; keys include the data
+# version, so entries never go stale, they just age out
+MAX_INDEX_BYTES = 256 * 1024 * 1024
+
+_indexes = OrderedDict()
+_indexes_bytes = 0
+_indexes_lock = threading.Lock()
+
+def viewport_bounds(latitude, longitude, zoom, width=1200, height=600, margin=0.5):
+    """
+    Approximate [west, south, east, north] of a Web Mercator map view, padded
+    on every side by a fraction of its size so small pans stay covered
+
+    Parameters:
+        latitude: float
+        longitude: float
+        zoom: float
+        width: int, map width in pixels
+        height: int, map height in pixels
+        margin: float
+
+    Returns:
+        bounds: List of float
+    """
+    degrees_per_pixel = 360 / (TILE_SIZE * 2 ** zoom)
+    half_width = width * degrees_per_pixel * (0.5 + margin)
+    # Mercator stretches latitude by 1 / cos(latitude)
+    half_height = height * degrees_per_pixel * np.cos(np.radians(latitude)) * (0.5 + margin)
+    return [
+        float(max(longitude - half_width, -180.0)),
+        float(max(latitude - half_height, -90.0)),
+        float(min(longitude + half_width, 180.0)),
+        float(min(latitude + half_height, 90.0)),
+    ]
+
+class RouteIndex:
+    """
+    Uniform grid over route points. Points are sorted by grid cell, so a query
+    only touches the cells overlapping it: each column of cells is one contiguous
+    range found by binary search, instead of a scan over every path
+
+    Distances are measured to route vertices, which in summary polylines are a
+    few hundred metres apart at most
+
+    Parameters:
+        geometry: RouteGeometry
+        cell_degrees: float
+    """
+    def __init__(self, geometry, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.ids = geometry.ids
+        self.cell = int(round(cell_degrees * COORD_SCALE))
+
+        cx, cy = self._cells(geometry.coords[:, 0], geometry.coords[:, 1])
+        keys = self._key(cx, cy)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.coords = geometry.coords[order]
+        # Route position of each sorted point
+        point_route = np.repeat(np.arange(len(geometry), dtype=np.int32), np.diff(geometry.offsets))
+        self.point_route = point_route[order]
+
+        if len(self.coords):
+            self.extent = [float(v) / COORD_SCALE for v in (*self.coords.min(axis=0), *self.coords.max(axis=0))]
+        else:
+            self.extent = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.coords.nbytes + self.point_route.nbytes + self.ids.nbytes
+
+    def _cells(self, lon_e5, lat_e5):
+        return np.floor_divide(lon_e5, self.cell), np.floor_divide(lat_e5, self.cell)
+
+    @staticmethod
+    def _key(cx, cy):
+        return (np.asarray(cx, dtype=np.int64) + _KEY_OFFSET) * _KEY_STRIDE + (np.asarray(cy, dtype=np.int64) + _KEY_OFFSET)
+
+    def _points_in_cells(self, west, south, east, north):
+        """
+        Sorted point positions in every cell overlapping a bounding box, in degrees
+        """
+        cx0, cy0 = self._cells(int(np.floor(west * COORD_SCALE)), int(np.floor(south * COORD_SCALE)))
+        cx1, cy1 = self._cells(int(np.ceil(east * COORD_SCALE)), int(np.ceil(north * COORD_SCALE)))
+        columns = np.arange(cx0, cx1 + 1)
+        starts = np.searchsorted(self.keys, self._key(columns, cy0), side="left")
+        ends = np.searchsorted(self.keys, self._key(columns, cy1), side="right")
+
+        # Concatenate the per-column ranges without a Python loop
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        column_of = np.repeat(np.arange(len(columns)), lengths)
+        first = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        return starts[column_of] + np.arange(total) - first[column_of]
+
+    def _ids(self, points):
+        return self.ids[np.unique(self.point_route[points])]
+
+    def in_bbox(self, bounds):
+        """
+        Activities with at least one point inside a bounding box
+
+        Parameters:
+            bounds: [west, south, east, north] in degrees
+
+        Returns:
+            activity_ids: int array
+        """
+        west, south, east, north = bounds
+        if self.extent is None:
+            return self.ids[:0]
+        # A zoomed-out view usually covers everything
+        if west <= self.extent[0] and south <= self.extent[1] and east >= self.extent[2] and north >= self.extent[3]:
+            return self.ids
+        points = self._points_in_cells(west, south, east, north)
+        lon = self.coords[points, 0] / COORD_SCALE
+        lat = self.coords[points, 1] / COORD_SCALE
+        inside = (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)
+        return self._ids(points[inside])
+
+    def near(self, latitude, longitude, radius_km):
+        """
+        Activities passing within a distance of a point
+
+        Parameters:
+            latitude: float
+            longitude: float
+            radius_km: float
+
+        Returns:
+            activity_ids: int array
+        """
+        lat_radius = radius_km / KM_PER_DEGREE
+        lon_radius = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(latitude)), 1e-6))
+        points = self._points_in_cells(
+            longitude - lon_radius, latitude - lat_radius, longitude + lon_radius, latitude + lat_radius,
+        )
+
+        # Equirectangular distance is accurate to well under 1% at these ranges
+        dx = (self.coords[points, 0] / COORD_SCALE - longitude) * KM_PER_DEGREE * np.cos(np.radians(latitude))
+        dy = (self.coords[points, 1] / COORD_SCALE - latitude) * KM_PER_DEGREE
+        return self._ids(points[dx * dx + dy * dy <= radius_km * radius_km])
+
+def get_route_index(athlete_id, data_version, encoded):
+    """
+    Returns the route index for an athlete's data version, building it on first
+    use straight from the encoded polylines. Built indexes are kept per process,
+    so every session and rerun for the same data shares one
+
+    Parameters:
+        athlete_id: int
+        data_version: String
+        encoded: Series of encoded polylines indexed by activity id
+
+    Returns:
+        index: RouteIndex
+    """
+    global _indexes_bytes
+    key = (athlete_id, data_version)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+
+    # Built outside the lock so other athletes' lookups aren't held up
+    index = RouteIndex(RouteGeometry.from_encoded(encoded))
+
+    with _indexes_lock:
+        if key in _indexes:
+            return _indexes[key]
+        _indexes[key] = index
+        _indexes_bytes += index.nbytes
+        while _indexes_bytes > MAX_INDEX_BYTES and len(_indexes) > 1:
+            _, oldest = _indexes.popitem(last=False)
+            _indexes_bytes -= oldest.nbytes
+    return index
@@ -0,0 +1,244 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.telemetry import span
+
+STRAVA_BASE_URL = os.environ.get("STRAVA_BASE_URL", "https://www.strava.com")
+API_URL = STRAVA_BASE_URL + "/api/v3"
+OAUTH_URL = STRAVA_BASE_URL + "/oauth"
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+# Strava's short-term quota resets on the quarter hour
+RATE_LIMIT_WINDOW_S = 15 * 60
+
+# A 429 is resent up to this many times, backing off exponentially from
+# RATE_LIMIT_BACKOFF_S up to RATE_LIMIT_MAX_BACKOFF_S (or longer if Strava asks)
+RATE_LIMIT_RETRIES = 4
+RATE_LIMIT_BACKOFF_S = 0.5
+RATE_LIMIT_MAX_BACKOFF_S = 30.0
+
+# Threads that can be fetching at once, which the connection pool is sized for:
+# athletes synced at once, pages fetched at once per sync, and activities whose
+# streams are fetched at once
+SYNC_WORKERS = 4
+PAGE_WORKERS = 5
+STREAM_WORKERS = 4
+
+class StravaAPIError(Exception):
+    """
+    Raised when the Strava API returns an error response after retries, or
+    when the request fails without a response (status_code None)
+    """
+    def __init__(self, status_code, message, url=None):
+        # All arguments go to Exception so the error pickles across process pools
+        super().__init__(status_code, message, url)
+        self.status_code = status_code
+        self.message = message
+        self.url = url
+
+    def __str__(self):
+        if self.status_code is None:
+            return f"Strava request failed: {self.message}"
+        return f"Strava API error {self.status_code}: {self.message}"
+
+class RateLimiter:
+    """
+    Tracks Strava's X-RateLimit headers and paces every thread sharing the
+    client so the 15-minute quota is spread out instead of exhausted
+
+    Parameters:
+        soft_limit: float, fraction of the quota after which requests are spaced out
+        hard_limit: float, fraction of the quota after which requests wait for the reset
+    """
+    def __init__(self, soft_limit=0.75, hard_limit=0.95):
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.short_usage = 0
+        self.short_limit = None
+        self.daily_usage = 0
+        self.daily_limit = None
+        self.window_start = None
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    @staticmethod
+    def _parse(value):
+        try:
+            short, daily = (int(v) for v in value.split(","))
+        except (AttributeError, ValueError):
+            return None
+        return short, daily
+
+    def update(self, headers):
+        """
+        Records usage from a response. Both the overall and the read quota are
+        reported by Strava; the one closest to running out is tracked
+        """
+        readings = []
+        for prefix in ("X-RateLimit", "X-ReadRateLimit"):
+            usage = self._parse(headers.get(f"{prefix}-Usage"))
+            limit = self._parse(headers.get(f"{prefix}-Limit"))
+            if usage and limit and limit[0] > 0 and limit[1] > 0:
+                readings.append((usage, limit))
+        if not readings:
+            return
+
+        usage, limit = max(readings, key=lambda r: r[0][0] / r[1][0])
+        with self._lock:
+            self.short_usage, self.daily_usage = usage
+            self.short_limit, self.daily_limit = limit
+            self.window_start = self._current_window_start()
+
+    @staticmethod
+    def _current_window_start(now=None):
+        now = time.time() if now is None else now
+        return now - (now % RATE_LIMIT_WINDOW_S)
+
+    def delay(self, now=None):
+        """
+        Seconds the caller should wait before sending its next request
+
+        Returns:
+            delay: float
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.short_limit is None or self._current_window_start(now) != self.window_start:
+                return 0.0
+
+            if self.daily_usage >= self.daily_limit:
+                raise StravaAPIError(429, "Daily rate limit exhausted")
+
+            window_end = self.window_start + RATE_LIMIT_WINDOW_S
+            used = self.short_usage / self.short_limit
+            if used >= self.hard_limit:
+                return window_end - now
+            if used < self.soft_limit:
+                return 0.0
+
+            # Space the remaining requests evenly over what is left of the window,
+            # handing each thread its own slot
+            remaining = max(self.short_limit * self.hard_limit - self.short_usage, 1)
+            interval = (window_end - now) / remaining
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + interval
+            self.short_usage += 1
+            return slot - now
+
+    def wait(self):
+        delay = self.delay()
+        if delay > 0:
+            print(f"\nRate limit {self.short_usage}/{self.short_limit}, waiting {delay:.1f}s")
+            time.sleep(delay)
+
+_session = None
+_session_lock = threading.Lock()
+rate_limiter = RateLimiter()
+
+def get_session():
+    """
+    Process-wide requests Session with connection pooling, keep-alive and retries
+    with exponential backoff on 5xx responses. 429s are retried by request(),
+    so the rate limiter sees every one. The pool keeps a connection for every
+    thread that can be fetching at once: each sync worker, and a page syncing
+    in the foreground, paginates on its own threads, and stream fetches run
+    alongside
+
+    Returns:
+        session: requests Session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=4,
+                backoff_factor=0.5,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                # urllib3 would otherwise retry a 429 that carries Retry-After itself
+                respect_retry_after_header=False,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=(SYNC_WORKERS + 1) * PAGE_WORKERS + STREAM_WORKERS,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+def _backoff(attempt, retry_after=None):
+    """
+    Seconds to wait before resending a rate limited request: exponential in the
+    attempt and capped, but never shorter than a Retry-After header asks for
+    """
+    delay = min(RATE_LIMIT_BACKOFF_S * 2 ** attempt, RATE_LIMIT_MAX_BACKOFF_S)
+    try:
+        return max(delay, float(retry_after))
+    except (TypeError, ValueError):
+        return delay
+
+def request(method, url, access_token=None, check=True, **kwargs):
+    """
+    Sends a request through the shared session, respecting the rate limiter.
+    A 429 updates the rate limiter and is resent after a backoff, at most
+    RATE_LIMIT_RETRIES times
+
+    Parameters:
+        method: String
+        url: String
+        access_token: String
+        check: bool, raise StravaAPIError on error responses
+
+    Returns:
+        response: requests Response
+    """
+    if access_token is not None:
+        kwargs.setdefault("headers", {})["Authorization"] = "Bearer " + access_token
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        with span("strava.request", method=method, path=url.replace(STRAVA_BASE_URL, ""), attempt=attempt) as attrs:
+            rate_limiter.wait()
+            try:
+                response = get_session().request(method, url, **kwargs)
+            except requests.RequestException as e:
+                # Connection errors, timeouts and exhausted 5xx retries
+                raise StravaAPIError(None, str(e), url=url) from e
+            rate_limiter.update(response.headers)
+            attrs.update(status=response.status_code, bytes=len(response.content))
+        if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            break
+        delay = _backoff(attempt, response.headers.get("Retry-After"))
+        print(f"\nRate limited on {url.replace(STRAVA_BASE_URL, '')}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+    if check and not response.ok:
+        try:
+            message = response.json().get("message", response.reason)
+        except ValueError:
+            message = response.reason
+        raise StravaAPIError(response.status_code, message, url=url)
+    return response
+
+def get(path, access_token, params=None):
+    """
+    GET request against the Strava API
+
+    Parameters:
+        path: String, relative to /api/v3
+        access_token: String
+        params: Dict
+
+    Returns:
+        data: Dict or List
+    """
+    return request("GET", API_URL + path, access_token=access_token, params=params).json()
@@ -0,0 +1,207 @@
+import os
+import tempfile
+import threading
+import concurrent.futures
+import numpy as np
+from utils import strava_client
+from utils.strava_client import StravaAPIError, STREAM_WORKERS
+
+DEFAULT_STREAMS_DIR = os.path.join(".activedata", "streams")
+
+# Stream type -> stored dtype. Heart rate and power can have gaps, so they are
+# floats with NaN rather than ints
+STREAM_DTYPES = {
+    "time": np.int32,
+    "distance": np.float32,
+    "latlng": np.float64,
+    "heartrate": np.float32,
+    "watts": np.float32,
+}
+
+def get_streams_dir():
+    """
+    Location of the persistent stream cache, overridable with ACTIVEDATA_STREAMS_DIR
+
+    Returns:
+        directory: String
+    """
+    return os.environ.get("ACTIVEDATA_STREAMS_DIR", DEFAULT_STREAMS_DIR)
+
+def fetch_streams(activity_id, access_token, keys=tuple(STREAM_DTYPES)):
+    """
+    Get request for an activity's streams
+
+    Parameters:
+        activity_id: int
+        access_token: String
+        keys: iterable of String, stream types
+
+    Returns:
+        streams: Dict of stream type -> array. Empty for activities without streams
+    """
+    params = {"keys": ",".join(keys), "key_by_type": "true"}
+    try:
+        response = strava_client.get(f"/activities/{activity_id}/streams", access_token, params=params)
+    except StravaAPIError as e:
+        # Manual activities have no streams
+        if e.status_code == 404:
+            return {}
+        raise
+
+    streams = {}
+    for stream_type, stream in response.items():
+        if stream_type not in STREAM_DTYPES:
+            continue
+        # Gaps come back as null, which NumPy can only hold in a float array
+        data = np.array(stream["data"], dtype=np.float64)
+        if np.issubdtype(STREAM_DTYPES[stream_type], np.integer):
+            data = np.nan_to_num(data)
+        streams[stream_type] = data.astype(STREAM_DTYPES[stream_type])
+    return streams
+
+class ActivityStreams:
+    """
+    Streams for one activity, backed by a compressed .npz file. Each array is
+    only read and decompressed the first time it's accessed
+
+    Parameters:
+        path: String
+    """
+    def __init__(self, path):
+        self.path = path
+        self._npz = None
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def _file(self):
+        if self._npz is None:
+            self._npz = np.load(self.path)
+        return self._npz
+
+    def keys(self):
+        with self._lock:
+            return list(self._file().files)
+
+    def __contains__(self, stream_type):
+        return stream_type in self.keys()
+
+    def __getitem__(self, stream_type):
+        with self._lock:
+            if stream_type not in self._arrays:
+                self._arrays[stream_type] = self._file()[stream_type]
+            return self._arrays[stream_type]
+
+    def get(self, stream_type, default=None):
+        return self[stream_type] if stream_type in self else default
+
+    def __len__(self):
+        return len(self["time"]) if "time" in self else 0
+
+    def close(self):
+        with self._lock:
+            if self._npz is not None:
+                self._npz.close()
+                self._npz = None
+
+class StreamStore:
+    """
+    Persistent per-athlete cache of activity streams, one compressed .npz per
+    activity, so each activity's streams are fetched from Strava only once
+
+    Parameters:
+        athlete_id: int
+        directory: String
+    """
+    def __init__(self, athlete_id, directory=None):
+        self.directory = os.path.join(directory or get_streams_dir(), str(athlete_id))
+
+    def path(self, activity_id):
+        return os.path.join(self.directory, f"{activity_id}.npz")
+
+    def __contains__(self, activity_id):
+        return os.path.exists(self.path(activity_id))
+
+    def ids(self):
+        """
+        Returns:
+            activity_ids: Set of int, activities with cached streams
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return set()
+        return {int(name[:-4]) for name in names if name.endswith(".npz") and name[:-4].isdigit()}
+
+    def version(self):
+        """
+        Changes whenever streams are saved, since each save renames a file into
+        the directory; a single stat, so cheap enough to check on every rerun
+
+        Returns:
+            version: int, or None if nothing was saved yet
+        """
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self, activity_id):
+        """
+        Returns:
+            streams: ActivityStreams, or None if not cached
+        """
+        return ActivityStreams(self.path(activity_id)) if activity_id in self else None
+
+    def save(self, activity_id, streams):
+        """
+        Writes an activity's streams. Empty streams are saved too, so activities
+        without streams aren't requested again
+
+        Parameters:
+            activity_id: int
+            streams: Dict of stream type -> array
+        """
+        # Write then rename so concurrent readers never see a partial file
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **streams)
+        os.replace(tmp, self.path(activity_id))
+
+def get_streams(access_token, athlete_id, activity_ids, max_workers=STREAM_WORKERS, stats=None):
+    """
+    Streams for the given activities, fetching only those not already cached.
+    Fetches run on a bounded worker pool and go through the shared client, so
+    they are paced by its rate limiter
+
+    Parameters:
+        access_token: String
+        athlete_id: int
+        activity_ids: iterable of int
+        max_workers: int
+        stats: Dict, updated in place with 'cached', 'fetched' and 'failed'
+
+    Returns:
+        streams: Dict of activity id -> ActivityStreams, in the order given
+    """
+    store = StreamStore(athlete_id)
+    activity_ids = [int(a) for a in activity_ids]
+    missing = [a for a in activity_ids if a not in store]
+
+    stats = {} if stats is None else stats
+    stats.update(cached=len(activity_ids) - len(missing), fetched=0, failed=0)
+
+    if missing:
+        print(f"\nFetching streams for {len(missing)} activities...")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="streams") as executor:
+            futures = {executor.submit(fetch_streams, a, access_token): a for a in missing}
+            for future in concurrent.futures.as_completed(futures):
+                activity_id = futures[future]
+                try:
+                    store.save(activity_id, future.result())
+                    stats['fetched'] += 1
+                except StravaAPIError as e:
+                    print(f"\nError fetching streams for activity {activity_id}: {e}")
+                    stats['failed'] += 1
+
+    return {a: store.load(a) for a in activity_ids if a in store}
@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+import contextlib
+from collections import deque, defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Recent spans kept for the admin page, and recent durations kept per span name
+# for percentiles
+MAX_SPANS = 5000
+MAX_SAMPLES = 2000
+# Sessions not seen for this long drop off the memory table
+SESSION_TTL_S = 60 * 60
+
+logger = logging.getLogger("activedata.telemetry")
+
+class Telemetry:
+    """
+    Process-wide span recorder. Every finished span goes to an in-memory ring
+    buffer, per-name duration samples and counters, and the
+    'activedata.telemetry' logger as one JSON line. Set ACTIVEDATA_TELEMETRY_LOG
+    to a path to write that log to a file
+    """
+    def __init__(self):
+        self.spans = deque(maxlen=MAX_SPANS)
+        self.durations = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self.counts = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.totals = defaultdict(float)
+        self.sessions = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def set_session(self, session_id):
+        """
+        Tags spans recorded on this thread with a session until changed
+        """
+        self._local.session = session_id
+
+    def start_span(self, name, **attrs):
+        """
+        Starts a span that's finished explicitly, for code that can't be wrapped
+        in a with block, like a whole Streamlit script
+
+        Returns:
+            span: Dict, pass to finish_span
+        """
+        return {
+            "name": name,
+            "start": time.time(),
+            "session": getattr(self._local, "session", None),
+            "thread": threading.current_thread().name,
+            "attrs": attrs,
+            "_perf": time.perf_counter(),
+        }
+
+    def finish_span(self, span, error=None):
+        span["duration_ms"] = round((time.perf_counter() - span.pop("_perf")) * 1000, 3)
+        if error is not None:
+            span["error"] = f"{type(error).__name__}: {error}"
+
+        name = span["name"]
+        with self._lock:
+            self.spans.append(span)
+            self.durations[name].append(span["duration_ms"])
+            self.counts[name] += 1
+            self.totals[name] += span["duration_ms"]
+            if error is not None:
+                self.errors[name] += 1
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(span, default=str))
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """
+        Times the enclosed block. The yielded attribute dict can be filled in
+        along the way, e.g. with an HTTP status or cache hit
+
+        Yields:
+            attrs: Dict
+        """
+        span = self.start_span(name, **attrs)
+        try:
+            yield span["attrs"]
+        except BaseException as e:
+            self.finish_span(span, error=e)
+            raise
+        self.finish_span(span)
+
+    def record_session(self, session_id, nbytes):
+        """
+        Records the approximate memory held by a session's state
+        """
+        now = time.time()
+        with self._lock:
+            self.sessions[session_id] = {"bytes": nbytes, "last_seen": now}
+            for stale in [s for s, info in self.sessions.items() if now - info["last_seen"] > SESSION_TTL_S]:
+                del self.sessions[stale]
+
+    def session_memory(self):
+        """
+        Returns:
+            sessions: Dict of session id -> {'bytes', 'last_seen'}
+        """
+        with self._lock:
+            return {session_id: dict(info) for session_id, info in self.sessions.items()}
+
+    def register_gauge(self, name, read, **labels):
+        """
+        Registers a value sampled whenever metrics are read, like a queue depth.
+        Registering the same name and labels again replaces the previous one
+
+        Parameters:
+            name: String
+            read: Callable returning a number
+            labels: String label values
+        """
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = read
+
+    def gauges(self):
+        """
+        Returns:
+            gauges: List of Dict with 'name', 'labels' and 'value'
+        """
+        with self._lock:
+            registered = list(self._gauges.items())
+        values = []
+        for (name, labels), read in sorted(registered, key=lambda item: item[0]):
+            try:
+                value = read()
+            except Exception as e:
+                print(f"\nError reading gauge {name}: {e}")
+                continue
+            values.append({"name": name, "labels": dict(labels), "value": value})
+        return values
+
+    def summary(self):
+        """
+        Per span name statistics
+
+        Returns:
+            summary: List of Dict with count, errors, mean and p50/p95/p99/max in ms
+        """
+        with self._lock:
+            samples = {name: sorted(durations) for name, durations in self.durations.items()}
+            counts, errors, totals = dict(self.counts), dict(self.errors), dict(self.totals)
+
+        def percentile(values, q):
+            return values[min(int(q * len(values)), len(values) - 1)]
+
+        return [
+            {
+                "name": name,
+                "count": counts[name],
+                "errors": errors.get(name, 0),
+                "mean_ms": round(totals[name] / counts[name], 3),
+                "p50_ms": percentile(values, 0.50),
+                "p95_ms": percentile(values, 0.95),
+                "p99_ms": percentile(values, 0.99),
+                "max_ms": values[-1],
+            }
+            for name, values in sorted(samples.items())
+        ]
+
+    def recent(self, limit=200):
+        with self._lock:
+            return list(self.spans)[-limit:]
+
+    def prometheus(self):
+        """
+        Span statistics in the Prometheus text exposition format
+        """
+        lines = ["# TYPE activedata_span_duration_ms summary"]
+        for stats in self.summary():
+            label = f'name="{stats["name"]}"'
+            for q in ("50", "95", "99"):
+                lines.append(f'activedata_span_duration_ms{{{label},quantile="0.{q}"}} {stats[f"p{q}_ms"]}')
+            lines.append(f"activedata_span_duration_ms_count{{{label}}} {stats['count']}")
+            lines.append(f"activedata_span_duration_ms_sum{{{label}}} {stats['mean_ms'] * stats['count']:.3f}")
+            lines.append(f"activedata_span_errors_total{{{label}}} {stats['errors']}")
+        sessions = self.session_memory()
+        lines.append("# TYPE activedata_session_bytes gauge")
+        lines.append(f"activedata_session_bytes {sum(s['bytes'] for s in sessions.values())}")
+        lines.append("# TYPE activedata_sessions gauge")
+        lines.append(f"activedata_sessions {len(sessions)}")
+        typed = set()
+        for gauge in self.gauges():
+            metric = f"activedata_{gauge['name']}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            labels = ",".join(f'{key}="{value}"' for key, value in gauge["labels"].items())
+            lines.append(f"{metric}{{{labels}}} {gauge['value']}" if labels else f"{metric} {gauge['value']}")
+        rss = peak_rss_bytes()
+        if rss is not None:
+            lines.append("# TYPE activedata_peak_rss_bytes gauge")
+            lines.append(f"activedata_peak_rss_bytes {rss}")
+        return "\n".join(lines) + "\n"
+
+def estimate_bytes(value, seen=None):
+    """
+    Rough memory held by an object: deep usage for DataFrames, nbytes for NumPy
+    arrays, Arrow tables and anything else reporting it, and the contents of
+    containers and of objects' attributes, so indexes and tables holding arrays
+    are counted in full. Objects already in seen are not counted again; pass
+    one set across calls when objects may be shared between them
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if hasattr(value, "nbytes") and hasattr(value, "dtype") and value.dtype == object:
+        # Object arrays hold pointers; the objects themselves live elsewhere
+        return int(value.nbytes) + sum(sys.getsizeof(v) for v in value.flat)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple, set, frozenset, deque)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v, seen) for v in value)
+    if hasattr(value, "__dict__") and not callable(value):
+        return sys.getsizeof(value) + estimate_bytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of the process, or None where unsupported
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def serve_metrics(port, host="127.0.0.1"):
+    """
+    Serves /metrics (Prometheus text) and /spans (recent spans as JSON) from a
+    background thread
+
+    Returns:
+        server: ThreadingHTTPServer
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = telemetry.prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/spans":
+                body, content_type = json.dumps(telemetry.recent(), default=str).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"\nServing metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+def traced(name=None):
+    """
+    Decorator recording a span around every call of a function
+    """
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with telemetry.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _configure():
+    log_path = os.environ.get("ACTIVEDATA_TELEMETRY_LOG")
+    if log_path:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    port = os.environ.get("ACTIVEDATA_METRICS_PORT")
+    if port:
+        try:
+            serve_metrics(int(port))
+        except OSError as e:
+            # Another process (e.g. a second Streamlit worker) already has the port
+            print(f"\nError starting metrics endpoint: {e}")
+
+telemetry = Telemetry()
+_configure()
+span = telemetry.span